@@ -0,0 +1,172 @@
+# analytics.py — сглаживание, недели/месяцы и тренд по дневным рядам (NumPy)
+#
+# Строки timeseries_daily один раз перекладываются в массивы (DailySeries):
+# календарные дни подряд, дни без тренировок — нули. Дальше всё векторно:
+# скользящее среднее — разность кумулятивных сумм, недели и месяцы —
+# np.add.reduceat по границам периодов, тренд — МНК в замкнутой форме.
+# Используется и хэндлерами бота (импорт ленивый — numpy не нужен на старте),
+# и воркерами графиков для наложений.
+from datetime import date
+from typing import Optional, Sequence
+
+import numpy as np
+
+DAY = np.timedelta64(1, "D")
+PERIODS = ("week", "month")
+
+
+class DailySeries:
+    """Дневной ряд без пропусков: days — datetime64[D], остальное — float64 той же длины."""
+
+    __slots__ = ("days", "reps", "volume", "sets")
+
+    def __init__(self, days: np.ndarray, reps: np.ndarray, volume: np.ndarray, sets: np.ndarray):
+        self.days = days
+        self.reps = reps
+        self.volume = volume
+        self.sets = sets
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[tuple], start: Optional[date] = None,
+                  end: Optional[date] = None) -> "DailySeries":
+        """rows: (день 'YYYY-MM-DD', повторы, объём, подходы) по возрастанию дня."""
+        if not rows and (start is None or end is None):
+            empty = np.zeros(0)
+            return cls(np.zeros(0, dtype="datetime64[D]"), empty, empty.copy(), empty.copy())
+        data = np.array([(r[1] or 0, r[2] or 0, r[3] or 0) for r in rows], dtype=np.float64).reshape(-1, 3)
+        dates = np.array([r[0] for r in rows], dtype="datetime64[D]")
+        first = np.datetime64(start, "D") if start is not None else dates[0]
+        last = np.datetime64(end, "D") if end is not None else dates[-1]
+        days = np.arange(first, last + DAY, DAY)
+        dense = np.zeros((len(days), 3))
+        idx = (dates - first).astype(np.int64)
+        inside = (idx >= 0) & (idx < len(days))
+        dense[idx[inside]] = data[inside]
+        return cls(days, dense[:, 0], dense[:, 1], dense[:, 2])
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def values(self, metric: str) -> np.ndarray:
+        return getattr(self, metric)
+
+    @property
+    def trained(self) -> np.ndarray:
+        """Маска дней с подходами."""
+        return self.sets > 0
+
+    @property
+    def has_volume(self) -> bool:
+        return bool(np.any(self.volume > 0))
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Скользящее среднее за ``window`` дней; в начале ряда — по тем дням, что есть."""
+    n = len(values)
+    if n == 0:
+        return np.zeros(0)
+    window = max(1, min(window, n))
+    csum = np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+    out = np.empty(n)
+    out[window - 1:] = (csum[window:] - csum[:-window]) / window
+    out[:window - 1] = csum[1:window] / np.arange(1, window)
+    return out
+
+
+def rolling_session_mean(series: DailySeries, metric: str, window: int) -> np.ndarray:
+    """Среднее за тренировку по последним ``window`` дням (дни отдыха не тянут вниз)."""
+    n = len(series)
+    if n == 0:
+        return np.zeros(0)
+    window = max(1, min(window, n))
+    totals = rolling_mean(series.values(metric), window)
+    sessions = rolling_mean(series.trained.astype(np.float64), window)
+    out = np.zeros(n)
+    np.divide(totals, sessions, out=out, where=sessions > 0)
+    return out
+
+
+def _period_starts(days: np.ndarray, period: str) -> np.ndarray:
+    """Первый день недели (понедельник) или месяца для каждого дня."""
+    if period == "week":
+        # 1970-01-01 — четверг: сдвиг 3 делает понедельник нулём
+        weekday = (days.astype(np.int64) + 3) % 7
+        return days - weekday.astype("timedelta64[D]")
+    if period == "month":
+        return days.astype("datetime64[M]").astype("datetime64[D]")
+    raise ValueError(f"Неизвестный период: {period}")
+
+
+def resample(series: DailySeries, metric: str, period: str) -> tuple:
+    """Суммы по неделям/месяцам: (начала периодов, суммы, период целиком внутри ряда)."""
+    if not len(series):
+        return np.zeros(0, dtype="datetime64[D]"), np.zeros(0), np.zeros(0, dtype=bool)
+    keys = _period_starts(series.days, period)
+    bounds = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    sums = np.add.reduceat(series.values(metric), bounds)
+    starts = keys[bounds]
+    lengths = np.diff(np.append(bounds, len(series)))
+    if period == "week":
+        full = np.full(len(starts), 7)
+    else:
+        full = ((starts.astype("datetime64[M]") + 1).astype("datetime64[D]") - starts).astype(np.int64)
+    return starts, sums, lengths == full
+
+
+def trend(series: DailySeries, metric: str) -> Optional[tuple]:
+    """Линейный тренд по дням с тренировками: (наклон в день, значение в первый день ряда, R²).
+
+    None — меньше двух тренировочных дней.
+    """
+    mask = series.trained
+    if np.count_nonzero(mask) < 2:
+        return None
+    x = np.flatnonzero(mask).astype(np.float64)
+    y = series.values(metric)[mask]
+    dx = x - x.mean()
+    sxx = np.dot(dx, dx)
+    slope = np.dot(dx, y - y.mean()) / sxx
+    intercept = y.mean() - slope * x.mean()
+    ss_tot = np.dot(y - y.mean(), y - y.mean())
+    resid = y - (intercept + slope * x)
+    r2 = 1.0 - np.dot(resid, resid) / ss_tot if ss_tot > 0 else 1.0
+    return float(slope), float(intercept), float(r2)
+
+
+def volume_progression(series: DailySeries, period: str = "week", metric: str = "volume") -> list:
+    """[(начало периода 'YYYY-MM-DD', сумма, изменение к прошлому периоду в %, период полный)].
+
+    Изменение считается только между полными периодами, иначе None.
+    """
+    starts, sums, complete = resample(series, metric, period)
+    change = np.full(len(sums), np.nan)
+    if len(sums) > 1:
+        prev, cur = sums[:-1], sums[1:]
+        ok = (prev > 0) & complete[:-1] & complete[1:]
+        np.divide(cur - prev, prev, out=change[1:], where=ok)
+        change[1:][ok] *= 100.0
+    return [
+        (str(s), float(v), None if np.isnan(c) else float(c), bool(f))
+        for s, v, c, f in zip(starts, sums, change, complete)
+    ]
+
+
+def overlay_lines(rows: Sequence[tuple], overlays: Sequence[str], window: int = 7) -> dict:
+    """Линии для графика в точках строк timeseries_daily: {имя: (по повторам[, по объёму])}.
+
+    avg — среднее за тренировку по последним ``window`` дням, trend — линейный тренд.
+    """
+    series = DailySeries.from_rows(rows)
+    # Позиции строк в плотном ряду: на графике точки только в дни из rows
+    at = (np.array([r[0] for r in rows], dtype="datetime64[D]") - series.days[0]).astype(np.int64) if rows else []
+    metrics = ("reps", "volume") if series.has_volume else ("reps",)
+    lines = {}
+    if "avg" in overlays:
+        lines["avg"] = tuple(rolling_session_mean(series, m, window)[at].tolist() for m in metrics)
+    if "trend" in overlays:
+        fitted = []
+        for m in metrics:
+            t = trend(series, m)
+            fitted.append(None if t is None else (t[1] + t[0] * np.asarray(at, dtype=np.float64)).tolist())
+        lines["trend"] = tuple(fitted)
+    return lines
@@ -0,0 +1,22 @@
+# bench/common.py — общие функции для отчётов бенчмарков
+import statistics
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def latency_summary(latencies: list) -> dict:
+    """Перцентили задержки в миллисекундах — формат для сравнения между прогонами."""
+    if not latencies:
+        return {}
+    return {
+        "p50": round(percentile(latencies, 50) * 1000, 3),
+        "p90": round(percentile(latencies, 90) * 1000, 3),
+        "p99": round(percentile(latencies, 99) * 1000, 3),
+        "max": round(max(latencies) * 1000, 3),
+        "mean": round(statistics.mean(latencies) * 1000, 3),
+    }
@@ -0,0 +1,109 @@
+# bench/fake_bot.py — Bot без сети: запросы к Telegram API отвечаются локально
+import asyncio
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, AsyncGenerator, Optional
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.types import Chat, Message, PhotoSize, Document, User
+
+FAKE_TOKEN = "123456:FAKE-benchmark-token"
+
+
+class FakeSession(BaseSession):
+    """Сессия, которая запоминает вызовы API и возвращает правдоподобные ответы.
+
+    ``latency`` имитирует задержку Telegram, чтобы не мерить нереальный ноль.
+    ``chat_limit`` включает флуд-контроль: больше стольких сообщений в чат за
+    секунду — ответ 429 (TelegramRetryAfter) с ``retry_after`` секундами.
+    """
+
+    def __init__(self, latency: float = 0.0, chat_limit: Optional[int] = None, retry_after: int = 1):
+        super().__init__()
+        self.latency = latency
+        self.chat_limit = chat_limit
+        self.retry_after = retry_after
+        self.calls: list = []  # (время, имя метода, chat_id)
+        self.flood_errors = 0
+        self._recent: dict = {}  # chat_id -> deque(время отправки)
+        self._message_id = 0
+
+    def _check_flood(self, method: TelegramMethod[Any]):
+        chat_id = getattr(method, "chat_id", None)
+        if self.chat_limit is None or chat_id is None or type(method).__name__.startswith("Answer"):
+            return
+        now = time.monotonic()
+        recent = self._recent.setdefault(chat_id, deque())
+        while recent and now - recent[0] >= 1.0:
+            recent.popleft()
+        if len(recent) >= self.chat_limit:
+            self.flood_errors += 1
+            raise TelegramRetryAfter(method=method, message="Flood control exceeded", retry_after=self.retry_after)
+        recent.append(now)
+
+    async def make_request(self, bot: Bot, method: TelegramMethod[Any], timeout: Optional[int] = None) -> Any:
+        self._check_flood(method)
+        self.calls.append((time.perf_counter(), type(method).__name__, getattr(method, "chat_id", None)))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        returning = method.__returning__
+        if returning is Message:
+            return self._message(bot, method)
+        if returning is User:
+            return User(id=bot.id, is_bot=True, first_name="bench")
+        # bool и прочее: для нагрузочных прогонов достаточно «успешно»
+        return True
+
+    def _message(self, bot: Bot, method: TelegramMethod[Any]) -> Message:
+        self._message_id += 1
+        n = self._message_id
+        extra = {}
+        name = type(method).__name__
+        if name == "SendPhoto":
+            extra["photo"] = [PhotoSize(file_id=f"fake-photo-{n}", file_unique_id=f"u{n}", width=1, height=1)]
+        elif name == "SendDocument":
+            extra["document"] = Document(file_id=f"fake-doc-{n}", file_unique_id=f"u{n}")
+        return Message(
+            message_id=n,
+            date=datetime.now(),
+            chat=Chat(id=getattr(method, "chat_id", 0) or 0, type="private"),
+            text=getattr(method, "text", None),
+            **extra,
+        ).as_(bot)
+
+    async def stream_content(self, url: str, headers: Optional[dict] = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+    def count(self, method_name: str) -> int:
+        return sum(1 for _, name, _ in self.calls if name == method_name)
+
+
+def make_fake_bot(latency: float = 0.0, chat_limit: Optional[int] = None, retry_after: int = 1) -> Bot:
+    return Bot(token=FAKE_TOKEN, session=FakeSession(latency=latency, chat_limit=chat_limit, retry_after=retry_after))
+
+
+_update_id = 0
+
+
+def message_update(user_id: int, text: str) -> dict:
+    """JSON синтетического Update с текстовым сообщением от пользователя."""
+    global _update_id
+    _update_id += 1
+    return {
+        "update_id": _update_id,
+        "message": {
+            "message_id": _update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+            "text": text,
+        },
+    }
@@ -0,0 +1,97 @@
+# bench/gen_data.py — синтетическая история тренировок для нагрузочных прогонов
+#
+#   python -m bench.gen_data --db bench.db --users 2000 --days 1095
+#
+# Схема создаётся штатными миграциями (db.init_db), дальше строки пишутся
+# напрямую через sqlite3.executemany большими транзакциями; daily_rollup
+# заполняется тем же триггером, что и в боте.
+import argparse
+import asyncio
+import random
+import sqlite3
+import sys
+import time
+
+import db
+
+CHUNK = 50_000
+
+
+def generate_user(user_id: int, exercise_ids: list, days: int, per_week: float, now: int, rnd: random.Random):
+    """Строки entries для одного пользователя: (user_id, exercise_id, reps, weight, ts)."""
+    favourites = rnd.sample(exercise_ids, k=min(len(exercise_ids), rnd.randint(4, 8)))
+    base_weight = {ex: rnd.choice([None, 10.0, 20.0, 40.0, 60.0]) for ex in favourites}
+    start = now - days * 86400
+    for day in range(days):
+        if rnd.random() > per_week / 7:
+            continue
+        ts = start + day * 86400 + rnd.randint(6, 21) * 3600
+        progress = 1 + day / max(days, 1) * 0.5  # веса растут за период
+        for ex in rnd.sample(favourites, k=min(len(favourites), rnd.randint(3, 5))):
+            w = base_weight[ex]
+            for s in range(rnd.randint(3, 5)):
+                weight = round(w * progress * rnd.uniform(0.9, 1.05) / 2.5) * 2.5 if w else None
+                yield user_id, ex, rnd.randint(6, 15), weight, ts + s * 120
+
+
+def generate_body(user_id: int, days: int, now: int, rnd: random.Random):
+    weight = rnd.uniform(55, 110)
+    height = rnd.uniform(155, 195)
+    for week in range(days // 7):
+        weight += rnd.uniform(-0.5, 0.4)
+        yield user_id, round(height, 1), round(weight, 1), now - (days - week * 7) * 86400
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генерация синтетических данных в БД бота")
+    parser.add_argument("--db", default="bench.db", help="файл БД (осторожно с рабочей workout.db)")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=3 * 365, help="глубина истории в днях")
+    parser.add_argument("--per-week", type=float, default=3.0, help="тренировок в неделю")
+    parser.add_argument("--first-user", type=int, default=1, help="id первого пользователя")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    db.DB_PATH = args.db
+
+    async def prepare():
+        await db.init_db()
+        await db.close_db()
+
+    asyncio.run(prepare())
+
+    rnd = random.Random(args.seed)
+    conn = sqlite3.connect(args.db)
+    conn.execute("PRAGMA synchronous=OFF;")
+    exercise_ids = [r[0] for r in conn.execute("SELECT id FROM exercises WHERE code IS NOT NULL")]
+    now = int(time.time())
+    started = time.perf_counter()
+    total = 0
+    buf = []
+
+    def flush():
+        nonlocal total
+        conn.executemany("INSERT INTO entries (user_id, exercise_id, reps, weight, ts) VALUES (?,?,?,?,?)", buf)
+        conn.commit()
+        total += len(buf)
+        buf.clear()
+        print(f"\rentries: {total:,}  ({total / (time.perf_counter() - started):,.0f}/с)",
+              end="", file=sys.stderr)
+
+    for user_id in range(args.first_user, args.first_user + args.users):
+        buf.extend(generate_user(user_id, exercise_ids, args.days, args.per_week, now, rnd))
+        if len(buf) >= CHUNK:
+            flush()
+        conn.executemany("INSERT INTO body_params (user_id, height_cm, weight_kg, ts) VALUES (?,?,?,?)",
+                         list(generate_body(user_id, args.days, now, rnd)))
+    if buf:
+        flush()
+    conn.execute("ANALYZE;")
+    conn.commit()
+    conn.close()
+    print(f"\nГотово: {total:,} подходов, {args.users} пользователей, "
+          f"{time.perf_counter() - started:.1f} с", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# bench/keyboards.py — сколько стоит клавиатура в ответе: сборка и сериализация
+#
+#   python -m bench.keyboards --replies 20000
+#
+# Сравнивает два пути одного ответа с клавиатурой:
+#   • «каждый раз» — собрать разметку заново, SendMessage, model_dump + prepare_value
+#     (то, что делает AiohttpSession.build_form_data);
+#   • «реестр» — готовая разметка из keyboards и её JSON из MarkupJsonMiddleware.
+# Печатает время на ответ и аллокации (tracemalloc) по каждой клавиатуре и
+# проверяет, что в Telegram уходит байт в байт то же самое.
+import argparse
+import json
+import time
+import tracemalloc
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.methods import SendMessage
+
+from bench.fake_bot import FAKE_TOKEN
+from keyboards import (KeyboardRegistry, build_body_menu, build_categories, build_exercises,
+                       build_main_menu, build_reply_main)
+
+BUILDERS = {
+    "reply_main": build_reply_main,
+    "main_menu": build_main_menu,
+    "categories": build_categories,
+    "exercises:legs": lambda: build_exercises("legs"),
+    "body_menu": build_body_menu,
+}
+
+
+def form_fields(session, bot, method) -> dict:
+    """Поля запроса, как их собрала бы AiohttpSession.build_form_data."""
+    fields = {}
+    for key, value in method.model_dump(warnings=False).items():
+        value = session.prepare_value(value, bot=bot, files={})
+        if value:
+            fields[key] = value
+    return fields
+
+
+def reply_rebuilt(session, bot, name: str) -> dict:
+    method = SendMessage(chat_id=1, text="Готово! Записал подход ✅", reply_markup=BUILDERS[name]())
+    return form_fields(session, bot, method)
+
+
+def reply_prebuilt(session, bot, registry: KeyboardRegistry, name: str) -> dict:
+    method = SendMessage(chat_id=1, text="Готово! Записал подход ✅", reply_markup=registry.get(name))
+    cached = registry.json_for(method.reply_markup, bot)
+    method.reply_markup = cached  # то же, что MarkupJsonMiddleware
+    return form_fields(session, bot, method)
+
+
+def measure(fn, replies: int) -> dict:
+    fn()  # прогрев: схемы pydantic, кэш JSON
+    started = time.perf_counter()
+    for _ in range(replies):
+        fn()
+    per_reply = (time.perf_counter() - started) / replies
+    # Пик памяти за один ответ: сколько временных объектов рождает путь
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"us_per_reply": round(per_reply * 1e6, 2), "peak_alloc_kb": round(peak / 1024, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сборка и сериализация клавиатур: заново и из реестра")
+    parser.add_argument("--replies", type=int, default=20000, help="ответов на каждую клавиатуру")
+    args = parser.parse_args()
+
+    session = AiohttpSession()
+    bot = Bot(token=FAKE_TOKEN, session=session)
+    registry = KeyboardRegistry()
+    registry.build()
+
+    report = {}
+    for name in BUILDERS:
+        same = reply_rebuilt(session, bot, name) == reply_prebuilt(session, bot, registry, name)
+        rebuilt = measure(lambda: reply_rebuilt(session, bot, name), args.replies)
+        prebuilt = measure(lambda: reply_prebuilt(session, bot, registry, name), args.replies)
+        report[name] = {
+            "identical_payload": same,
+            "rebuilt": rebuilt,
+            "prebuilt": prebuilt,
+            "speedup": round(rebuilt["us_per_reply"] / prebuilt["us_per_reply"], 2),
+        }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
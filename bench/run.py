@@ -0,0 +1,189 @@
+# bench/run.py — прогон реальных хэндлеров router через Bot без сети
+#
+#   python -m bench.gen_data --db bench.db          # сначала данные
+#   python -m bench.run --db bench.db --out result.json
+#
+# Отчёт — JSON: пропускная способность и перцентили задержки по сценариям
+# плюс время каждого запроса к БД, чтобы сравнивать прогоны между коммитами.
+import argparse
+import asyncio
+import functools
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+from aiogram.types import Update
+
+from bench.common import latency_summary
+from bench.fake_bot import make_fake_bot, message_update
+from throttling import DEFAULT_LIMITS, ThrottlingMiddleware
+
+# Запросы к БД, которые вызывают хэндлеры (имена в модуле main). Быстрый ввод
+# пишет через add_entries_bulk, /progress читает через progress_snapshot.
+TIMED_QUERIES = ("add_entry", "add_entries_bulk", "progress_snapshot", "timeseries_daily",
+                 "timeseries_compare", "add_body_params", "last_n_body_params")
+
+
+def instrument(module, names, timings: dict):
+    """Обернуть функции БД в модуле хэндлеров, собирая длительность каждого вызова."""
+    for name in names:
+        fn = getattr(module, name, None)
+        if fn is None:
+            # Хэндлеры перестали импортировать функцию — таблица запросов молча опустела бы
+            raise RuntimeError(f"В модуле {module.__name__} нет {name}: обновите TIMED_QUERIES")
+
+        @functools.wraps(fn)
+        async def wrapper(*args, __fn=fn, __name=name, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await __fn(*args, **kwargs)
+            finally:
+                timings.setdefault(__name, []).append(time.perf_counter() - started)
+
+        setattr(module, name, wrapper)
+
+
+async def run_scenario(dp, bot, texts: list, concurrency: int) -> dict:
+    """texts: [(user_id, text)]; обновления подаются с ограничением параллелизма."""
+    latencies = []
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(user_id: int, text: str):
+        update = Update.model_validate(message_update(user_id, text), context={"bot": bot})
+        async with sem:
+            started = time.perf_counter()
+            await dp.feed_update(bot, update)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(u, t) for u, t in texts))
+    elapsed = time.perf_counter() - started
+    return {
+        "updates": len(texts),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(len(texts) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": latency_summary(latencies),
+    }
+
+
+def sample_workload(db_path: str, users: int, rnd: random.Random) -> list:
+    """(user_id, название упражнения) реально существующих пар из БД."""
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("""
+        SELECT r.user_id, x.name FROM daily_rollup r JOIN exercises x ON x.id = r.exercise_id
+        GROUP BY r.user_id, r.exercise_id
+    """).fetchall()
+    conn.close()
+    if not rows:
+        return [(u, "жим ногами") for u in range(1, users + 1)]
+    by_user = {}
+    for user_id, name in rows:
+        by_user.setdefault(user_id, []).append(name)
+    chosen = rnd.sample(sorted(by_user), k=min(users, len(by_user)))
+    return [(u, rnd.choice(by_user[u])) for u in chosen]
+
+
+async def run(args) -> dict:
+    import db
+    import main
+
+    db.DB_PATH = args.db
+    os.environ.setdefault("FSM_STORAGE", "sqlite")
+    if not args.keep_throttling:
+        # Сценарии шлют много запросов от одних и тех же пользователей: с боевыми
+        # лимитами часть /chart молча отбрасывалась бы и выпадала из задержек
+        for kind in DEFAULT_LIMITS:
+            os.environ.setdefault(f"THROTTLE_{kind.upper()}_RATE", "1000000")
+            os.environ.setdefault(f"THROTTLE_{kind.upper()}_BURST", "1000000")
+    rnd = random.Random(args.seed)
+    pairs = sample_workload(args.db, args.users, rnd)
+
+    timings: dict = {}
+    instrument(main, TIMED_QUERIES, timings)
+    await main.setup_services()
+    bot = make_fake_bot(latency=args.api_latency_ms / 1000)
+    dp = main.build_dispatcher()
+    throttling = next(m for m in dp.message.middleware if isinstance(m, ThrottlingMiddleware))
+    results = {}
+    try:
+        # Замеряем работу, а не запуск пула графиков: до прогрева запросы упирались бы в очередь
+        await main.renderer.start_warm_up()
+        scenarios = {
+            "quick_add": [(u, f"{ex} {rnd.randint(5, 15)} {rnd.choice([20, 40, 60])}")
+                          for u, ex in (rnd.choice(pairs) for _ in range(args.sets))],
+            "progress": [(u, f"/progress {ex} 30") for u, ex in (rnd.choice(pairs) for _ in range(args.queries))],
+            "progress_all": [(u, "/progress 90") for u, _ in (rnd.choice(pairs) for _ in range(args.queries))],
+            "chart": [(u, f"/chart {ex} {rnd.choice([30, 90, 365])}")
+                      for u, ex in (rnd.choice(pairs) for _ in range(args.charts))],
+        }
+        for name, texts in scenarios.items():
+            if args.only and name not in args.only:
+                continue
+            print(f"… {name}: {len(texts)} обновлений", file=sys.stderr)
+            throttled, rejected = throttling.throttled, main.renderer.rejected
+            results[name] = await run_scenario(dp, bot, texts, args.concurrency)
+            # Отброшенные запросы тоже попадают в задержки — рядом видно, сколько их
+            results[name]["throttled"] = throttling.throttled - throttled
+            results[name]["chart_rejected"] = main.renderer.rejected - rejected
+        subsystems = {
+            "db_pool": db.pool_stats(),
+            "db_writes": db.write_stats(),
+            "charts": main.renderer.stats(),
+            "chart_cache": main.chart_cache.stats(),
+            "stats_cache": main.stats_cache.stats(),
+        }
+    finally:
+        await dp.storage.close()
+        await main.shutdown_services()
+
+    conn = sqlite3.connect(args.db)
+    (entries,) = conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+    conn.close()
+    return {
+        "meta": {
+            "started_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "db": args.db,
+            "entries": entries,
+            "users_sampled": len(pairs),
+            "concurrency": args.concurrency,
+            "api_latency_ms": args.api_latency_ms,
+        },
+        "scenarios": results,
+        "subsystems": subsystems,
+        "queries": {name: {"calls": len(v), "latency_ms": latency_summary(v)} for name, v in timings.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк хэндлеров бота без Telegram")
+    parser.add_argument("--db", default="bench.db", help="БД с данными (см. bench.gen_data)")
+    parser.add_argument("--users", type=int, default=500, help="сколько пользователей из БД задействовать")
+    parser.add_argument("--sets", type=int, default=5000, help="быстрых вводов подхода")
+    parser.add_argument("--queries", type=int, default=1000, help="запросов /progress")
+    parser.add_argument("--charts", type=int, default=100, help="запросов /chart")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="имитация задержки Telegram API")
+    parser.add_argument("--only", nargs="*", help="запустить только указанные сценарии")
+    parser.add_argument("--keep-throttling", action="store_true",
+                        help="оставить боевые лимиты THROTTLE_* (по умолчанию сняты)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="куда записать JSON (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# bench/send_queue.py — проверка SendScheduler на Bot без сети
+#
+#   python -m bench.send_queue --chats 50 --messages 6
+#
+# Каждый «чат» одновременно получает ответ на callback, несколько текстов и
+# фото. FakeSession включает флуд-контроль как у Telegram (429 при превышении
+# сообщений в чат за секунду). Прогон с планировщиком и без него показывает
+# число 429, пропускную способность, порядок внутри чата и порядок полос.
+import argparse
+import asyncio
+import json
+import time
+
+from aiogram.types import BufferedInputFile
+
+from bench.common import latency_summary
+from bench.fake_bot import make_fake_bot
+from sender import SendScheduler
+from throttling import Limit
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\0" * 64
+
+
+async def chat_burst(bot, chat_id: int, messages: int, latencies: list) -> tuple:
+    """Как хэндлер, который шлёт несколько сообщений подряд, не дожидаясь друг друга.
+
+    Возвращает (доставлено, тексты ушли по порядку).
+    """
+    async def timed(coro):
+        started = time.perf_counter()
+        try:
+            result = await coro
+        except Exception:
+            return None
+        latencies.append(time.perf_counter() - started)
+        return result
+
+    texts = [timed(bot.send_message(chat_id, f"сообщение {i}")) for i in range(messages)]
+    results = await asyncio.gather(
+        timed(bot.send_photo(chat_id, BufferedInputFile(PNG, "chart.png"))),
+        *texts,
+        timed(bot.answer_callback_query(f"cb-{chat_id}")),
+    )
+    # FakeSession нумерует сообщения в момент отправки: порядок id = порядок доставки
+    ids = [m.message_id for m in results[1:-1] if m is not None]
+    return sum(r is not None for r in results), ids == sorted(ids)
+
+
+def max_per_chat_second(calls: list) -> int:
+    worst = 0
+    by_chat: dict = {}
+    for t, name, chat_id in calls:
+        if chat_id is not None and not name.startswith("Answer"):
+            by_chat.setdefault(chat_id, []).append(t)
+    for times in by_chat.values():
+        j = 0
+        for i, t in enumerate(times):
+            while t - times[j] >= 1.0:
+                j += 1
+            worst = max(worst, i - j + 1)
+    return worst
+
+
+async def run(args, scheduled: bool) -> dict:
+    bot = make_fake_bot(latency=args.latency, chat_limit=args.chat_limit, retry_after=1)
+    scheduler = None
+    if scheduled:
+        scheduler = SendScheduler(
+            global_limit=Limit(args.global_rate, int(args.global_rate)),
+            chat_limit=Limit(args.chat_rate, args.chat_burst),
+        )
+        bot.session.middleware(scheduler)
+    latencies = []
+    started = time.perf_counter()
+    outcomes = await asyncio.gather(*(
+        chat_burst(bot, chat_id, args.messages, latencies) for chat_id in range(1, args.chats + 1)
+    ))
+    delivered = sum(n for n, _ in outcomes)
+    elapsed = time.perf_counter() - started
+    calls = bot.session.calls
+    first = {}
+    for i, (_, name, _) in enumerate(calls):
+        first.setdefault(name, i)
+    result = {
+        "scheduled": scheduled,
+        "requested": args.chats * (args.messages + 2),
+        "delivered": delivered,
+        "flood_429": bot.session.flood_errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(calls) / elapsed, 1) if elapsed else None,
+        "max_per_chat_per_s": max_per_chat_second(calls),
+        "chat_order_kept": all(ok for _, ok in outcomes),
+        "first_call_index": first,  # где в потоке впервые встретился каждый метод
+        "latency": latency_summary(latencies),
+    }
+    if scheduler is not None:
+        result["scheduler"] = scheduler.stats()
+        await scheduler.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка очереди исходящих запросов")
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=6, help="текстов на чат (плюс фото и ответ на callback)")
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка фейкового Telegram, с")
+    parser.add_argument("--chat-limit", type=int, default=3, help="429, если в чат больше N сообщений за секунду")
+    parser.add_argument("--global-rate", type=float, default=30.0)
+    parser.add_argument("--chat-rate", type=float, default=1.0)
+    parser.add_argument("--chat-burst", type=int, default=3)
+    args = parser.parse_args()
+
+    async def both():
+        return [await run(args, scheduled=False), await run(args, scheduled=True)]
+
+    print(json.dumps(asyncio.run(both()), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# bench/webhook_load.py — нагрузка на webhook синтетическими Update без Telegram
+#
+#   python -m bench.webhook_load                      # поднять бота в процессе (Bot без сети)
+#   python -m bench.webhook_load --url http://host:8080/webhook --secret S
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+import aiohttp
+
+from bench.common import latency_summary
+from bench.fake_bot import message_update
+
+TEXTS = [
+    "жим ногами 10 60",
+    "приседания 20",
+    "сгибание ног 12 35",
+    "/progress",
+    "/progress жим ногами 30",
+    "/help",
+]
+
+
+async def post_updates(url: str, secret, total: int, concurrency: int, users: int) -> dict:
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(message_update(random.randint(1, users), random.choice(TEXTS)))
+
+    async def worker(session: aiohttp.ClientSession):
+        nonlocal errors
+        while not queue.empty():
+            update = queue.get_nowait()
+            started = time.perf_counter()
+            async with session.post(url, json=update, headers=headers) as resp:
+                await resp.read()
+                if resp.status != 200:
+                    errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "updates": total,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(total / elapsed, 1),
+        "latency_ms": latency_summary(latencies),
+    }
+
+
+async def run_inprocess(args) -> dict:
+    """Бот + aiohttp-сервер в этом же процессе, БД во временном файле."""
+    from aiohttp import web
+
+    import db
+    import main
+    import metrics
+    from bench.fake_bot import make_fake_bot
+    from webhook import build_app
+
+    os.environ.setdefault("FSM_STORAGE", "sqlite")
+    db.DB_PATH = args.db or os.path.join(tempfile.mkdtemp(), "bench.db")
+    await main.setup_services()
+    bot = make_fake_bot()
+    metrics.instrument_bot(bot)
+    dp = main.build_dispatcher()
+    # Ждём обработки, чтобы latency включала хэндлер, а не только приём запроса
+    app = build_app(dp, bot, "/webhook", "bench-secret", handle_in_background=False)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        return await post_updates(f"http://127.0.0.1:{port}/webhook", "bench-secret",
+                                  args.updates, args.concurrency, args.users)
+    finally:
+        await runner.cleanup()
+        await main.shutdown_services()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон webhook-режима")
+    parser.add_argument("--url", help="адрес уже запущенного webhook (иначе бот поднимается в процессе)")
+    parser.add_argument("--secret", help="WEBHOOK_SECRET внешнего сервера")
+    parser.add_argument("--db", help="файл БД для режима в процессе (по умолчанию временный)")
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--users", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.url:
+        result = asyncio.run(post_updates(args.url, args.secret, args.updates, args.concurrency, args.users))
+    else:
+        result = asyncio.run(run_inprocess(args))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
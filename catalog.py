@@ -0,0 +1,78 @@
+# catalog.py — шаблонный каталог упражнений (общий для бота и БД)
+from typing import Optional
+
+# --- Шаблонные категории и упражнения ---
+CATEGORIES = {
+    "arms": "💪 Руки",
+    "legs": "🦵 Ноги",
+    "core": "🧩 Пресс",
+    "backm": "🦴 Спина",
+    "cardio": "🏃 Кардио",
+}
+
+# Для компактного callback_data используем короткие ID
+EXERCISES_BY_CAT = {
+    "legs": [
+        ("leg_press", "Жим ногами"),
+        ("abductor", "Сведение бедер"),
+        ("adductor", "Разведение бедер"),
+        ("leg_curl", "Сгибание ног"),
+        ("leg_ext", "Разгибание ног"),
+        ("multi_hip", "Отведение назад"),
+    ],
+    "arms": [
+        ("hammer_curl", "Молотковый подъём на бицепс"),
+        ("overhead_ext", "Разгибание рук из-за головы"),
+        ("db_press", "Жим гантелей стоя"),
+        ("db_fly", "Разведение гантелей"),
+        ("db_row", "Тяга гантели к поясу в наклоне"),
+    ],
+    "backm": [
+        ("gravitron", "Гравитрон"),
+        ("seated_row", "Горизонтальная тяга в рычажном тренажёре"),
+    ],
+    "cardio": [
+        ("run", "Бег"),
+        ("stair", "Лестница"),
+    ],
+    "core": [
+        ("crunch", "Скручивания"),
+        ("bicycle", "Велосипед"),
+        ("knee_crunch", "Скрутка к колену"),
+        ("russian_twist", "Русские скручивания"),
+    ],
+}
+
+# Быстрый индекс id -> название
+EX_INDEX = {eid: title for pairs in EXERCISES_BY_CAT.values() for eid, title in pairs}
+
+# Синонимы: так упражнения тоже часто пишут в быстром вводе
+EXERCISE_ALIASES = {
+    "leg_press": ["жим ногами в тренажёре", "жим платформы"],
+    "hammer_curl": ["молотки"],
+    "db_press": ["жим гантелей"],
+    "gravitron": ["подтягивания в гравитроне"],
+    "run": ["пробежка"],
+    "russian_twist": ["русский твист"],
+}
+
+
+def normalize_name(name: str) -> str:
+    """Каноническая форма названия, в которой оно хранится в БД."""
+    return name.strip().lower()
+
+
+def category_by_name(text: str) -> Optional[str]:
+    """id категории по вводу пользователя: «ноги», «🦵 Ноги» или «legs»; иначе None."""
+    key = normalize_name(text)
+    for cat_id, label in CATEGORIES.items():
+        if key in (cat_id, normalize_name(label), normalize_name(label.split(maxsplit=1)[-1])):
+            return cat_id
+    return None
+
+
+def catalog_rows():
+    """(код, каноническое имя, категория, синонимы) для каждого упражнения каталога."""
+    for cat_id, pairs in EXERCISES_BY_CAT.items():
+        for eid, title in pairs:
+            yield eid, normalize_name(title), cat_id, [normalize_name(a) for a in EXERCISE_ALIASES.get(eid, [])]
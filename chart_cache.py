@@ -0,0 +1,77 @@
+# chart_cache.py — LRU-кэш готовых графиков
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+
+@dataclass
+class CachedChart:
+    png: bytes
+    caption: str
+    file_id: Optional[str] = None  # появляется после первой отправки в Telegram
+
+
+class ChartCache:
+    """Графики по ключу (пользователь, упражнение, дни, версия данных, дата, наложения).
+
+    Версию данных пользователя увеличивает add_entry, поэтому новый подход
+    делает неактуальными только графики этого пользователя. Дата в ключе
+    нужна, потому что окно «последние N дней» сдвигается каждые сутки
+    (по UTC, как и окна запросов). Вытеснение — LRU с ограничением по
+    числу записей и по суммарному размеру PNG: графики старых версий
+    больше не запрашиваются и сами уходят в хвост очереди.
+    """
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[tuple, CachedChart]" = OrderedDict()
+        self._bytes = 0
+        # Метрики
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(user_id: int, exercise: str, days: int, version: int, overlays: tuple = ()) -> tuple:
+        return user_id, " ".join(exercise.lower().split()), days, version, datetime.utcnow().date().isoformat(), overlays
+
+    def get(self, key: tuple) -> Optional[CachedChart]:
+        item = self._items.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item
+
+    def put(self, key: tuple, chart: CachedChart):
+        if len(chart.png) > self.max_bytes:
+            return
+        old = self._items.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old.png)
+        self._items[key] = chart
+        self._bytes += len(chart.png)
+        while len(self._items) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self._bytes -= len(evicted.png)
+            self.evictions += 1
+
+    def set_file_id(self, key: tuple, file_id: str):
+        item = self._items.get(key)
+        if item is not None:
+            item.file_id = file_id
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._items),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+chart_cache = ChartCache()
@@ -0,0 +1,305 @@
+# charts.py — построение графиков в отдельных процессах
+#
+# Модуль импортируется и ботом, и процессами-воркерами (spawn), поэтому на
+# верхнем уровне здесь только стандартная библиотека: matplotlib, Pillow и
+# всё, что тянет aiogram, подгружаются внутри функций.
+import asyncio
+import io
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Sequence
+
+log = logging.getLogger(__name__)
+
+# Режимы PNG: (dpi, квантование палитры)
+PNG_MODES = {
+    "full": (150, False),
+    "optimized": (150, True),  # палитра 64 цвета — в разы меньше при том же разрешении
+    "lite": (100, True),
+}
+
+
+# Наложения на график: имя -> (подпись, стиль линии); линии считает analytics.overlay_lines
+OVERLAYS = {
+    "avg": ("среднее 7 дн.", ":"),
+    "trend": ("тренд", "-."),
+}
+
+
+class ChartBusyError(RuntimeError):
+    """Очередь на построение графиков переполнена — запрос отклонён."""
+
+
+def optimize_png(png: bytes, colors: int = 64) -> bytes:
+    """Перепаковать PNG в палитровый: графики почти одноцветные, потерь не видно."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(png)) as img:
+        quantized = img.convert("RGB").quantize(colors=colors, method=Image.Quantize.FASTOCTREE)
+    out = io.BytesIO()
+    quantized.save(out, format="PNG", optimize=True)
+    # На очень простых картинках выигрыша может не быть
+    return out.getvalue() if out.tell() < len(png) else png
+
+
+def _load_plotting():
+    """Импорт matplotlib (Agg) и Pillow; при первом вызове строится кэш шрифтов."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from PIL import Image  # noqa: F401 — нужен optimize_png
+
+    return plt
+
+
+def warm_worker():
+    """Initializer воркера: всё тяжёлое грузится до первого запроса на график."""
+    plt = _load_plotting()
+    # Пустая фигура прогревает шрифты и бэкенд Agg
+    fig = plt.figure(figsize=(1, 1))
+    fig.canvas.draw()
+    plt.close(fig)
+
+
+def _ping() -> int:
+    return multiprocessing.current_process().pid
+
+
+def render_chart(title: str, rows: Sequence[tuple], mode: str = "full", overlays: Sequence[str] = ()) -> bytes:
+    """Нарисовать PNG по строкам timeseries_daily: (дата, повторы, объём, подходы).
+
+    ``overlays`` — имена из OVERLAYS: сглаживание и тренд поверх исходных линий.
+
+    Выполняется в процессе-воркере: глобальное состояние pyplot не
+    потокобезопасно, поэтому в event loop бота matplotlib не импортируется.
+    Картинка целиком собирается в памяти, без временных файлов.
+    """
+    dpi, quantize = PNG_MODES[mode]
+    plt = _load_plotting()
+
+    dates = [r[0] for r in rows]  # 'YYYY-MM-DD'
+    reps = [int(r[1]) if r[1] is not None else 0 for r in rows]
+    volume = [float(r[2]) if r[2] is not None else 0.0 for r in rows]
+    has_volume = any(v > 0 for v in volume)
+    lines = {}
+    if overlays:
+        from analytics import overlay_lines  # numpy — только в воркере и только по запросу
+        lines = overlay_lines(rows, overlays)
+
+    fig = plt.figure(figsize=(8, 4.5), dpi=dpi)
+    try:
+        ax1 = plt.gca()
+        reps_line, = ax1.plot(dates, reps, marker="o", label="Повторы/день")
+        ax1.set_xlabel("Дата")
+        ax1.set_ylabel("Повторы")
+
+        ax2 = volume_line = None
+        if has_volume:
+            ax2 = ax1.twinx()
+            volume_line, = ax2.plot(dates, volume, marker="s", linestyle="--", color="tab:orange",
+                                    label="Объём (повт×вес)")
+            ax2.set_ylabel("Объём")
+
+        for name, fitted in lines.items():
+            label, style = OVERLAYS[name]
+            for ax, base, values in zip((ax1, ax2), (reps_line, volume_line), fitted):
+                if ax is not None and values is not None:
+                    ax.plot(dates, values, linestyle=style, linewidth=1.5, color=base.get_color(), alpha=0.8,
+                            label=f"{base.get_label()}: {label}")
+        if lines:
+            handles = ax1.get_lines() + (ax2.get_lines() if ax2 is not None else [])
+            ax1.legend(handles=handles, fontsize="small", loc="upper left")
+
+        plt.title(title)
+        plt.xticks(rotation=45, ha="right")
+        plt.tight_layout()
+
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png")
+    finally:
+        plt.close(fig)
+    png = buf.getvalue()
+    return optimize_png(png) if quantize else png
+
+
+def render_comparison(title: str, series: Sequence[tuple], body: Sequence[tuple] = (), mode: str = "full",
+                      overlays: Sequence[str] = ()) -> bytes:
+    """Несколько упражнений на одной фигуре: series — [(название, строки timeseries_daily)].
+
+    Сверху повторы, снизу объём (если он есть хоть у одного упражнения), ось
+    дат общая — дни разных упражнений не обязаны совпадать. body — [(день, вес
+    тела)] рисуется на второй оси справа от повторов. ``overlays`` — как в
+    render_chart, у каждого упражнения своим цветом.
+    """
+    from datetime import date
+
+    dpi, quantize = PNG_MODES[mode]
+    plt = _load_plotting()
+
+    with_volume = any(has_volume(rows) for _, rows in series)
+    panels = 2 if with_volume else 1
+    fig, axes = plt.subplots(panels, 1, sharex=True, squeeze=False,
+                             figsize=(8, 3.2 * panels + 1.3), dpi=dpi)
+    ax_reps = axes[0][0]
+    ax_volume = axes[1][0] if with_volume else None
+    if overlays:
+        from analytics import overlay_lines  # numpy — только в воркере и только по запросу
+    try:
+        for name, rows in series:
+            days = [date.fromisoformat(r[0]) for r in rows]
+            line, = ax_reps.plot(days, [r[1] or 0 for r in rows], marker="o", markersize=3, label=name)
+            if ax_volume is not None and has_volume(rows):
+                ax_volume.plot(days, [r[2] or 0 for r in rows], marker="s", markersize=3,
+                               linestyle="--", color=line.get_color())
+            if overlays:
+                for overlay, fitted in overlay_lines(rows, overlays).items():
+                    for ax, values in zip((ax_reps, ax_volume), fitted):
+                        if ax is not None and values is not None:
+                            ax.plot(days, values, linestyle=OVERLAYS[overlay][1], linewidth=1.2,
+                                    color=line.get_color(), alpha=0.8)
+        ax_reps.set_ylabel("Повторы/день")
+        handles = [ln for ln in ax_reps.get_lines() if not ln.get_label().startswith("_")]
+        # Наложения в легенде — по одной серой линии на вид, а не на каждое упражнение
+        handles += [ax_reps.plot([], [], color="gray", linestyle=OVERLAYS[o][1], label=OVERLAYS[o][0])[0]
+                    for o in overlays]
+        if body:
+            ax_body = ax_reps.twinx()
+            handles += ax_body.plot([date.fromisoformat(d) for d, _ in body], [w for _, w in body],
+                                    color="gray", linestyle=":", marker=".", label="вес тела")
+            ax_body.set_ylabel("Вес тела, кг")
+        ax_reps.legend(handles=handles, fontsize="small", loc="upper left")
+        ax_reps.set_title(title)
+        if ax_volume is not None:
+            ax_volume.set_ylabel("Объём (повт×вес)")
+        axes[-1][0].set_xlabel("Дата")
+        fig.autofmt_xdate(rotation=45, ha="right")
+        fig.tight_layout()
+
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png")
+    finally:
+        plt.close(fig)
+    png = buf.getvalue()
+    return optimize_png(png) if quantize else png
+
+
+def has_volume(rows: Sequence[tuple]) -> bool:
+    return any(r[2] for r in rows)
+
+
+class ChartRenderer:
+    """Пул процессов для matplotlib с ограниченной глубиной очереди.
+
+    Если в работе уже ``max_pending`` графиков, новый запрос сразу
+    отклоняется с ChartBusyError, а не копится в памяти — так поток
+    /chart не вытесняет запись подходов.
+
+    Воркеры прогреваются в фоне (``warm_up``): бот принимает обновления
+    сразу, а запросы на график до конца прогрева просто ждут в очереди.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 8, png_mode: str = "optimized"):
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.png_mode = png_mode
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self._warm_task: Optional[asyncio.Task] = None
+        self.warm_up_s: Optional[float] = None
+        # Метрики
+        self.rendered = 0
+        self.rejected = 0
+        self.bytes_out = 0
+
+    def start(self):
+        if self._executor is None:
+            # spawn: не наследуем потоки aiosqlite и состояние event loop
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=warm_worker,
+            )
+
+    def start_warm_up(self) -> asyncio.Task:
+        """Запустить прогрев воркеров фоновой задачей и сразу вернуть управление."""
+        if self._warm_task is None:
+            self._warm_task = asyncio.create_task(self.warm_up(), name="charts-warm-up")
+        return self._warm_task
+
+    async def warm_up(self):
+        """Поднять все процессы пула и дождаться их initializer'а."""
+        self.start()
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            # По задаче на воркер: пул запускает процессы, пока есть очередь
+            await asyncio.gather(*(loop.run_in_executor(self._executor, _ping) for _ in range(self.workers)))
+        except Exception:
+            log.exception("Прогрев воркеров графиков не удался")
+            return
+        self.warm_up_s = time.perf_counter() - started
+        log.info("Воркеры графиков готовы за %.2f с", self.warm_up_s)
+
+    @property
+    def ready(self) -> bool:
+        return self.warm_up_s is not None
+
+    def shutdown(self):
+        if self._warm_task is not None:
+            self._warm_task.cancel()
+            self._warm_task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def render(self, title: str, rows: Sequence[tuple], overlays: Sequence[str] = ()) -> bytes:
+        # В воркер уходят только простые данные — кортежи из БД
+        return await self._submit(render_chart, title, [tuple(r) for r in rows], self.png_mode, tuple(overlays))
+
+    async def render_comparison(self, title: str, series: Sequence[tuple], body: Sequence[tuple] = (),
+                                overlays: Sequence[str] = ()) -> bytes:
+        """Одна фигура на несколько упражнений — одно место в очереди и один рендер."""
+        series = [(name, [tuple(r) for r in rows]) for name, rows in series]
+        return await self._submit(render_comparison, title, series, [tuple(r) for r in body], self.png_mode,
+                                  tuple(overlays))
+
+    async def _submit(self, fn, *args) -> bytes:
+        from metrics import CHART_RENDER_SECONDS
+
+        if self._executor is None:
+            self.start()
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise ChartBusyError("Слишком много графиков в очереди")
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            with CHART_RENDER_SECONDS.time():
+                png = await loop.run_in_executor(self._executor, fn, *args)
+        finally:
+            self._pending -= 1
+        self.rendered += 1
+        self.bytes_out += len(png)
+        return png
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "rendered": self.rendered,
+            "rejected": self.rejected,
+            "png_mode": self.png_mode,
+            "ready": self.ready,
+            "warm_up_s": self.warm_up_s or 0.0,
+            "bytes_out": self.bytes_out,
+        }
+
+
+renderer = ChartRenderer()
@@ -1,41 +1,324 @@
-import aiosqlite
-from datetime import datetime, timedelta
+import asyncio
+from collections import Counter
+from datetime import date, datetime, timezone
 from typing import Optional
 
+from catalog import catalog_rows, normalize_name
+from db_pool import ConnectionPool
+from db_writer import WriteBehindQueue
+from metrics import timed_query
+from migrations import migrate
+from records import ExerciseRecords
+from resolver import resolver
+from stats_cache import since_day, stats_cache
+
 DB_PATH = "workout.db"
 
+_pool: Optional[ConnectionPool] = None
+_writes: Optional[WriteBehindQueue] = None
+
+# Версия данных пользователя: растёт с каждым записанным подходом (для кэшей)
+_data_versions: dict = {}
+
+# Справочник упражнений в памяти: имя/синоним -> id и id -> каноническое имя
+_exercise_ids: dict = {}
+_exercise_names: dict = {}
+
+
+def get_pool() -> ConnectionPool:
+    if _pool is None:
+        raise RuntimeError("БД не инициализирована: сначала вызови init_db()")
+    return _pool
+
+
+def get_writes() -> WriteBehindQueue:
+    if _writes is None:
+        raise RuntimeError("БД не инициализирована: сначала вызови init_db()")
+    return _writes
+
+
+async def init_db(
+        readers: int = 4,
+        timeout: float = 5.0,
+        batch_size: int = 200,
+        batch_delay: float = 0.05
+):
+    """Открыть пул соединений, очередь записи и применить миграции. Вызывается один раз при старте."""
+    global _pool, _writes
+    if _pool is None:
+        _pool = ConnectionPool(DB_PATH, readers=readers, timeout=timeout)
+        await _pool.open()
+    if _writes is None:
+        _writes = WriteBehindQueue(_pool, max_batch=batch_size, max_delay=batch_delay)
+        _writes.start()
+    async with _pool.writer() as db:
+        await migrate(db)
+        await _sync_catalog(db)
+        await _load_exercises(db)
+        await _build_resolver(db)
+
+
+async def _sync_catalog(db):
+    """Досеять/обновить упражнения из каталога (catalog.EXERCISES_BY_CAT)."""
+    for code, name, category, aliases in catalog_rows():
+        # Если упражнение каталога переименовали, освобождаем его код у старой строки
+        await db.execute("UPDATE exercises SET code=NULL WHERE code=? AND name<>?", (code, name))
+        await db.execute(
+            "INSERT INTO exercises (name, code, category, aliases) VALUES (?,?,?,?) "
+            "ON CONFLICT (name) DO UPDATE SET code=excluded.code, category=excluded.category, "
+            "aliases=excluded.aliases",
+            (name, code, category, "|".join(aliases))
+        )
+    await db.commit()
+
+
+async def _load_exercises(db):
+    _exercise_ids.clear()
+    _exercise_names.clear()
+    async with db.execute("SELECT id, name, aliases FROM exercises") as cur:
+        rows = await cur.fetchall()
+    for ex_id, name, aliases in rows:
+        _exercise_names[ex_id] = name
+        for alias in filter(None, aliases.split("|")):
+            _exercise_ids.setdefault(alias, ex_id)
+    # Точные имена важнее синонимов
+    for ex_id, name in _exercise_names.items():
+        _exercise_ids[name] = ex_id
+
+
+async def _build_resolver(db):
+    """Индекс для нечёткого поиска: каталог + названия, которые писал каждый пользователь."""
+    async with db.execute("""
+        SELECT DISTINCT r.user_id, x.name
+        FROM daily_rollup r JOIN exercises x ON x.id = r.exercise_id
+    """) as cur:
+        usage = await cur.fetchall()
+    resolver.build(((name, aliases) for _, name, _, aliases in catalog_rows()), usage)
+
+
+async def get_exercise_id(name: str, create: bool = False) -> Optional[int]:
+    """id упражнения по названию или синониму.
+
+    На горячем пути это просто поиск в словаре. При промахе смотрим в БД
+    (его могла добавить другая копия бота), а с ``create=True`` заводим
+    новое упражнение.
+    """
+    key = normalize_name(name)
+    ex_id = _exercise_ids.get(key)
+    if ex_id is not None:
+        return ex_id
+    if create:
+        async with get_pool().writer() as db:
+            await db.execute("INSERT OR IGNORE INTO exercises (name) VALUES (?)", (key,))
+            await db.commit()
+            async with db.execute("SELECT id FROM exercises WHERE name=?", (key,)) as cur:
+                row = await cur.fetchone()
+    else:
+        async with get_pool().reader() as db:
+            async with db.execute("SELECT id FROM exercises WHERE name=?", (key,)) as cur:
+                row = await cur.fetchone()
+    if row is None:
+        return None
+    _exercise_ids[key] = row[0]
+    _exercise_names[row[0]] = key
+    return row[0]
+
+
+def exercise_name(ex_id: int) -> Optional[str]:
+    return _exercise_names.get(ex_id)
+
+
+# Эталонная агрегация сырых записей — для пересчёта и сверки daily_rollup
+ROLLUP_FROM_ENTRIES = """
+SELECT user_id, exercise_id, date(ts, 'unixepoch') AS day,
+       SUM(reps) AS total_reps,
+       SUM(CASE WHEN weight IS NOT NULL THEN reps*weight ELSE 0 END) AS total_volume,
+       COUNT(*) AS sets
+FROM entries
+GROUP BY user_id, exercise_id, day
+"""
+
+
+async def _fill_rollup(db):
+    await db.execute("DELETE FROM daily_rollup;")
+    await db.execute(
+        "INSERT INTO daily_rollup (user_id, exercise_id, day, total_reps, total_volume, sets) "
+        + ROLLUP_FROM_ENTRIES
+    )
 
-async def init_db():
-    async with aiosqlite.connect(DB_PATH) as db:
-        # Тренировочные записи
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS entries (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            exercise TEXT NOT NULL,
-            reps INTEGER NOT NULL,
-            weight REAL,
-            ts TEXT NOT NULL
-        );
-        """)
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_entries_user_ts ON entries(user_id, ts);")
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_entries_exercise_ts ON entries(exercise, ts);")
-
-        # Параметры тела (рост/вес)
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS body_params (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            height_cm REAL,
-            weight_kg REAL,
-            ts TEXT NOT NULL
-        );
-        """)
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_body_user_ts ON body_params(user_id, ts);")
 
+async def backfill_rollup() -> int:
+    """Пересчитать daily_rollup с нуля по entries. Возвращает число дневных строк."""
+    await get_writes().flush()
+    async with get_pool().writer() as db:
+        await _fill_rollup(db)
         await db.commit()
+        async with db.execute("SELECT COUNT(*) FROM daily_rollup") as cur:
+            (count,) = await cur.fetchone()
+    return count
+
+
+async def check_rollup(limit: int = 20) -> list:
+    """Сверить daily_rollup с entries.
+
+    Возвращает до ``limit`` расхождений вида (источник, строка), где источник —
+    "entries" (нет или отличается в агрегате) или "rollup" (лишняя строка).
+    """
+    sql = f"""
+    SELECT 'entries', * FROM (
+        {ROLLUP_FROM_ENTRIES}
+        EXCEPT SELECT user_id, exercise_id, day, total_reps, total_volume, sets FROM daily_rollup
+    )
+    UNION ALL
+    SELECT 'rollup', * FROM (
+        SELECT user_id, exercise_id, day, total_reps, total_volume, sets FROM daily_rollup
+        EXCEPT {ROLLUP_FROM_ENTRIES}
+    )
+    LIMIT ?
+    """
+    async with get_pool().reader() as db:
+        async with db.execute(sql, (limit,)) as cur:
+            return [(r[0], tuple(r[1:])) for r in await cur.fetchall()]
+
+
+# ===== Личные рекорды =====
+
+async def backfill_records(batch_size: int = 5000) -> int:
+    """Пересчитать personal_records и rep_records одним проходом по entries.
+
+    Подходы читаются курсором по индексу (user_id, exercise_id, ts), в памяти
+    только рекорды текущего упражнения; запись — пачками в той же транзакции.
+    Возвращает число пар (пользователь, упражнение).
+    """
+    await get_writes().flush()
+    records, reps = [], []
+    count = 0
+
+    async def flush_batch(db):
+        await db.executemany(
+            "INSERT INTO personal_records (user_id, exercise_id, max_weight, max_weight_reps, max_weight_ts, "
+            "e1rm, e1rm_weight, e1rm_reps, e1rm_ts, best_day, best_day_volume) VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+            records
+        )
+        await db.executemany(
+            "INSERT INTO rep_records (user_id, exercise_id, weight, reps, ts) VALUES (?,?,?,?,?)", reps
+        )
+        records.clear()
+        reps.clear()
+
+    async with get_pool().writer() as db:
+        await db.execute("DELETE FROM personal_records;")
+        await db.execute("DELETE FROM rep_records;")
+        current = None
+        async with db.execute(
+                "SELECT user_id, exercise_id, reps, weight, ts, date(ts, 'unixepoch') FROM entries "
+                "ORDER BY user_id, exercise_id, ts, id"
+        ) as cur:
+            cur.iter_chunk_size = batch_size
+            async for user_id, ex_id, n, weight, ts, day in cur:
+                if current is None or (current.user_id, current.exercise_id) != (user_id, ex_id):
+                    if current is not None:
+                        record, rep_rows = current.finish()
+                        records.append(record)
+                        reps.extend(rep_rows)
+                        count += 1
+                        if len(reps) >= batch_size:
+                            await flush_batch(db)
+                    current = ExerciseRecords(user_id, ex_id)
+                current.add(n, weight, ts, day)
+        if current is not None:
+            record, rep_rows = current.finish()
+            records.append(record)
+            reps.extend(rep_rows)
+            count += 1
+        await flush_batch(db)
+        await db.commit()
+    return count
+
+
+@timed_query
+async def personal_records(user_id: int, exercise: Optional[str] = None) -> list:
+    """Рекорды из personal_records (истории не касается).
+
+    Строки: (упражнение, макс. вес, повторы на нём, когда, e1RM, вес, повторы,
+    лучший день, объём дня, макс. повторов без веса), по упражнениям.
+    """
+    where, params = "p.user_id = ?", [user_id]
+    if exercise:
+        ex_id = await get_exercise_id(exercise)
+        if ex_id is None:
+            return []
+        where += " AND p.exercise_id = ?"
+        params.append(ex_id)
+    sql = f"""
+    SELECT p.exercise_id, p.max_weight, p.max_weight_reps,
+           strftime('%Y-%m-%d', p.max_weight_ts, 'unixepoch'),
+           p.e1rm, p.e1rm_weight, p.e1rm_reps, p.best_day, p.best_day_volume, r.reps
+    FROM personal_records p
+    LEFT JOIN rep_records r ON r.user_id = p.user_id AND r.exercise_id = p.exercise_id AND r.weight = 0
+    WHERE {where}
+    ORDER BY p.e1rm DESC NULLS LAST, r.reps DESC
+    """
+    async with get_pool().reader() as db:
+        async with db.execute(sql, params) as cur:
+            rows = await cur.fetchall()
+    return [(exercise_name(row[0]), *row[1:]) for row in rows]
+
+
+@timed_query
+async def rep_records(user_id: int, exercise: str, n: int = 10) -> list:
+    """Максимум повторов на каждом весе: [(вес, повторы, день)], тяжёлые первыми."""
+    ex_id = await get_exercise_id(exercise)
+    if ex_id is None:
+        return []
+    async with get_pool().reader() as db:
+        async with db.execute(
+                "SELECT weight, reps, strftime('%Y-%m-%d', ts, 'unixepoch') FROM rep_records "
+                "WHERE user_id = ? AND exercise_id = ? AND weight > 0 ORDER BY weight DESC LIMIT ?",
+                (user_id, ex_id, n)
+        ) as cur:
+            return await cur.fetchall()
+
+
+async def close_db():
+    """Дописать очередь записи и закрыть все соединения пула (при остановке бота)."""
+    global _pool, _writes
+    if _writes is not None:
+        await _writes.stop()
+        _writes = None
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
 
+def pool_stats() -> dict:
+    return get_pool().stats() if _pool is not None else {}
 
+
+def write_stats() -> dict:
+    return get_writes().stats() if _writes is not None else {}
+
+
+def to_epoch(ts: datetime) -> int:
+    """Секунды эпохи; наивное время считается UTC (как datetime.utcnow())."""
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return int(ts.timestamp())
+
+
+# Время хранится целым числом, а наружу отдаётся прежней ISO-строкой
+ISO_TS = "strftime('%Y-%m-%dT%H:%M:%S', ts, 'unixepoch')"
+
+
+def data_version(user_id: int) -> int:
+    return _data_versions.get(user_id, 0)
+
+
+def _bump_version(user_id: int):
+    _data_versions[user_id] = _data_versions.get(user_id, 0) + 1
+
+
+@timed_query
 async def add_entry(
         user_id: int,
         exercise: str,
@@ -43,84 +326,258 @@ async def add_entry(
         weight: Optional[float] = None,
         ts: Optional[datetime] = None
 ):
+    """Записать подход. Возвращается после коммита пакета, в который попала строка."""
     if ts is None:
         ts = datetime.utcnow()
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "INSERT INTO entries (user_id, exercise, reps, weight, ts) VALUES (?,?,?,?,?)",
-            (user_id, exercise.strip().lower(), int(reps),
-             float(weight) if weight is not None else None, ts.isoformat())
-        )
-        await db.commit()
+    ex_id = await get_exercise_id(exercise, create=True)
+    await get_writes().submit(
+        "INSERT INTO entries (user_id, exercise_id, reps, weight, ts) VALUES (?,?,?,?,?)",
+        [(user_id, ex_id, int(reps),
+          float(weight) if weight is not None else None, to_epoch(ts))]
+    )
+    _bump_version(user_id)
+    resolver.remember(user_id, exercise)
+    stats_cache.record(user_id, exercise_name(ex_id), int(reps),
+                       float(weight) if weight is not None else None,
+                       datetime.utcfromtimestamp(to_epoch(ts)).strftime("%Y-%m-%dT%H:%M:%S"))
+
+
+@timed_query
+async def add_entries_bulk(user_id: int, rows: list, invalidate: bool = False) -> int:
+    """Массовая запись подходов одной транзакцией (быстрый ввод нескольких подходов, импорт).
+
+    rows: (упражнение, повторы, вес или None, секунды эпохи).
+    invalidate=True — сбросить сводку пользователя в stats_cache вместо
+    обновления на месте (импорт: тысячи строк со старыми датами).
+    """
+    if not rows:
+        return 0
+    ids = {}
+    for exercise, *_ in rows:
+        if exercise not in ids:
+            ids[exercise] = await get_exercise_id(exercise, create=True)
+    await get_writes().submit(
+        "INSERT INTO entries (user_id, exercise_id, reps, weight, ts) VALUES (?,?,?,?,?)",
+        [(user_id, ids[exercise], reps, weight, ts) for exercise, reps, weight, ts in rows]
+    )
+    _bump_version(user_id)
+    if invalidate:
+        stats_cache.invalidate(user_id)
+    else:
+        for exercise, reps, weight, ts in rows:
+            stats_cache.record(user_id, exercise_name(ids[exercise]), int(reps),
+                               float(weight) if weight is not None else None,
+                               datetime.utcfromtimestamp(ts).strftime("%Y-%m-%dT%H:%M:%S"))
+    for exercise in ids:
+        resolver.remember(user_id, exercise)
+    return len(rows)
+
+
+async def add_body_params_bulk(user_id: int, rows: list) -> int:
+    """Массовая запись замеров: (рост или None, вес или None, секунды эпохи)."""
+    if not rows:
+        return 0
+    await get_writes().submit(
+        "INSERT INTO body_params (user_id, height_cm, weight_kg, ts) VALUES (?,?,?,?)",
+        [(user_id, height, weight, ts) for height, weight, ts in rows]
+    )
+    _bump_version(user_id)
+    return len(rows)
+
+
+@timed_query
+async def existing_entries(user_id: int, ts_from: int, ts_to: int) -> Counter:
+    """Сколько раз каждый подход (упражнение, ts, повторы, вес) уже записан за [ts_from, ts_to]."""
+    await get_writes().flush()
+    async with get_pool().reader() as db:
+        async with db.execute(
+                "SELECT exercise_id, ts, reps, weight FROM entries WHERE user_id=? AND ts BETWEEN ? AND ?",
+                (user_id, ts_from, ts_to)
+        ) as cur:
+            return Counter([(exercise_name(ex_id), ts, reps, weight) async for ex_id, ts, reps, weight in cur])
+
+
+@timed_query
+async def existing_body_params(user_id: int, ts_from: int, ts_to: int) -> Counter:
+    """То же для замеров: (ts, рост, вес)."""
+    await get_writes().flush()
+    async with get_pool().reader() as db:
+        async with db.execute(
+                "SELECT ts, height_cm, weight_kg FROM body_params WHERE user_id=? AND ts BETWEEN ? AND ?",
+                (user_id, ts_from, ts_to)
+        ) as cur:
+            return Counter([tuple(row) async for row in cur])
 
 
+@timed_query
 async def recent_summary(user_id: int, exercise: Optional[str] = None, days: int = 7):
-    since = (datetime.utcnow() - timedelta(days=days)).isoformat()
-    async with aiosqlite.connect(DB_PATH) as db:
-        if exercise:
-            sql = """
-            SELECT exercise, SUM(reps) AS total_reps, COUNT(*) AS sets
-            FROM entries
-            WHERE user_id=? AND exercise=? AND ts>=?
-            GROUP BY exercise
-            ORDER BY total_reps DESC
-            """
-            params = (user_id, exercise.strip().lower(), since)
-        else:
-            sql = """
-            SELECT exercise, SUM(reps) AS total_reps, COUNT(*) AS sets
-            FROM entries
-            WHERE user_id=? AND ts>=?
-            GROUP BY exercise
-            ORDER BY total_reps DESC
-            """
-            params = (user_id, since)
+    since = since_day(days)
+    if exercise:
+        ex_id = await get_exercise_id(exercise)
+        if ex_id is None:
+            return []
+        sql = """
+        SELECT x.name, SUM(r.total_reps) AS total_reps, SUM(r.sets) AS sets
+        FROM daily_rollup r JOIN exercises x ON x.id = r.exercise_id
+        WHERE r.user_id=? AND r.exercise_id=? AND r.day>=?
+        GROUP BY r.exercise_id
+        ORDER BY total_reps DESC
+        """
+        params = (user_id, ex_id, since)
+    else:
+        sql = """
+        SELECT x.name, SUM(r.total_reps) AS total_reps, SUM(r.sets) AS sets
+        FROM daily_rollup r JOIN exercises x ON x.id = r.exercise_id
+        WHERE r.user_id=? AND r.day>=?
+        GROUP BY r.exercise_id
+        ORDER BY total_reps DESC
+        """
+        params = (user_id, since)
+    async with get_pool().reader() as db:
         async with db.execute(sql, params) as cur:
             return await cur.fetchall()
 
 
+@timed_query
 async def last_n_entries(user_id: int, exercise: str, n: int = 10):
-    async with aiosqlite.connect(DB_PATH) as db:
+    ex_id = await get_exercise_id(exercise)
+    if ex_id is None:
+        return []
+    async with get_pool().reader() as db:
         async with db.execute(
-                "SELECT ts, reps, weight FROM entries WHERE user_id=? AND exercise=? ORDER BY ts DESC LIMIT ?",
-                (user_id, exercise.strip().lower(), n)
+                f"SELECT {ISO_TS}, reps, weight FROM entries WHERE user_id=? AND exercise_id=? "
+                "ORDER BY ts DESC LIMIT ?",
+                (user_id, ex_id, n)
         ) as cur:
             return await cur.fetchall()
 
 
+async def _load_user_stats(user_id: int):
+    """Сводка пользователя для stats_cache: дни окна из daily_rollup и последние подходы."""
+    since = since_day(stats_cache.window_days)
+    async with get_pool().reader() as db:
+        async with db.execute(
+                "SELECT exercise_id, day, total_reps, sets FROM daily_rollup WHERE user_id=? AND day>=?",
+                (user_id, since)
+        ) as cur:
+            rollup = await cur.fetchall()
+        async with db.execute(f"""
+            SELECT exercise_id, {ISO_TS}, reps, weight FROM (
+                SELECT exercise_id, ts, reps, weight,
+                       ROW_NUMBER() OVER (PARTITION BY exercise_id ORDER BY ts DESC, id DESC) AS rn
+                FROM entries WHERE user_id=?
+            ) WHERE rn <= ?
+            ORDER BY rn DESC
+            """, (user_id, stats_cache.last_n)
+        ) as cur:
+            last = await cur.fetchall()
+    return stats_cache.build(
+        ((exercise_name(ex_id), day, reps, sets) for ex_id, day, reps, sets in rollup),
+        ((exercise_name(ex_id), ts, reps, weight) for ex_id, ts, reps, weight in last),
+    )
+
+
+@timed_query
+async def progress_snapshot(user_id: int, exercise: Optional[str], days: int = 7, n: int = 10) -> tuple:
+    """(recent_summary, last_n_entries) для /progress — из кэша, а при промахе из БД.
+
+    Последние подходы возвращаются только для конкретного упражнения.
+    """
+    if not stats_cache.covers(days) or n > stats_cache.last_n:
+        if not exercise:
+            return await recent_summary(user_id, None, days), []
+        # Независимые чтения — параллельно на разных соединениях пула
+        rows, last = await asyncio.gather(
+            recent_summary(user_id, exercise, days), last_n_entries(user_id, exercise, n)
+        )
+        return rows, last
+    if exercise:
+        ex_id = await get_exercise_id(exercise)
+        if ex_id is None:
+            return [], []
+        exercise = exercise_name(ex_id)
+    stats = stats_cache.get(user_id)
+    if stats is None:
+        version = data_version(user_id)
+        stats = await _load_user_stats(user_id)
+        # Пока читали, мог записаться подход — такую копию не кэшируем
+        if data_version(user_id) == version:
+            stats_cache.put(user_id, stats)
+    rows = stats_cache.summary(stats, exercise, days)
+    last = stats_cache.last_sets(stats, exercise, n) if exercise else []
+    return rows, last
+
+
+@timed_query
 async def timeseries_daily(user_id: int, exercise: Optional[str], days: int = 30):
-    since = (datetime.utcnow() - timedelta(days=days)).isoformat()
-    async with aiosqlite.connect(DB_PATH) as db:
-        if exercise:
-            sql = """
-            SELECT substr(ts, 1, 10) AS d,
-                   SUM(reps) AS total_reps,
-                   SUM(CASE WHEN weight IS NOT NULL THEN reps*weight ELSE 0 END) AS total_volume,
-                   COUNT(*) AS sets
-            FROM entries
-            WHERE user_id = ? AND exercise = ? AND ts >= ?
-            GROUP BY d
-            ORDER BY d
-            """
-            params = (user_id, exercise.strip().lower(), since)
-        else:
-            sql = """
-            SELECT substr(ts, 1, 10) AS d,
-                   SUM(reps) AS total_reps,
-                   SUM(CASE WHEN weight IS NOT NULL THEN reps*weight ELSE 0 END) AS total_volume,
-                   COUNT(*) AS sets
-            FROM entries
-            WHERE user_id = ? AND ts >= ?
-            GROUP BY d
-            ORDER BY d
-            """
-            params = (user_id, since)
+    since = since_day(days)
+    if exercise:
+        ex_id = await get_exercise_id(exercise)
+        if ex_id is None:
+            return []
+        sql = """
+        SELECT day AS d, total_reps, total_volume, sets
+        FROM daily_rollup
+        WHERE user_id = ? AND exercise_id = ? AND day >= ?
+        ORDER BY d
+        """
+        params = (user_id, ex_id, since)
+    else:
+        sql = """
+        SELECT day AS d,
+               SUM(total_reps) AS total_reps,
+               SUM(total_volume) AS total_volume,
+               SUM(sets) AS sets
+        FROM daily_rollup
+        WHERE user_id = ? AND day >= ?
+        GROUP BY d
+        ORDER BY d
+        """
+        params = (user_id, since)
+    async with get_pool().reader() as db:
         async with db.execute(sql, params) as cur:
             return await cur.fetchall()
 
 
+@timed_query
+async def timeseries_compare(user_id: int, exercises: list, days: int = 30) -> tuple:
+    """Дневные ряды нескольких упражнений одним запросом и вес тела за то же окно.
+
+    Возвращает ({упражнение: [(день, повторы, объём, подходы)]}, [(день, вес тела)],
+    [упражнения из запроса без данных в окне]). Ряды идут в порядке запроса.
+    """
+    since = date.fromisoformat(since_day(days))
+    names, requested = {}, {}
+    for exercise in exercises:
+        ex_id = await get_exercise_id(exercise)
+        if ex_id is not None:
+            names.setdefault(ex_id, exercise_name(ex_id))
+        requested[exercise] = ex_id
+    series = {name: [] for name in names.values()}
+    async with get_pool().reader() as db:
+        if names:
+            marks = ",".join("?" * len(names))
+            async with db.execute(
+                    "SELECT exercise_id, day, total_reps, total_volume, sets FROM daily_rollup "
+                    f"WHERE user_id = ? AND day >= ? AND exercise_id IN ({marks}) ORDER BY exercise_id, day",
+                    (user_id, since.isoformat(), *names)
+            ) as cur:
+                for ex_id, day, reps, volume, sets in await cur.fetchall():
+                    series[names[ex_id]].append((day, reps, volume, sets))
+        # Последний замер за день (MAX(ts) выбирает строку, из которой берётся weight_kg)
+        async with db.execute(
+                "SELECT date(ts, 'unixepoch') AS d, weight_kg, MAX(ts) FROM body_params "
+                "WHERE user_id = ? AND ts >= ? AND weight_kg IS NOT NULL GROUP BY d ORDER BY d",
+                (user_id, to_epoch(datetime.combine(since, datetime.min.time())))
+        ) as cur:
+            body = [(day, weight) for day, weight, _ in await cur.fetchall()]
+    missing = [ex for ex, ex_id in requested.items() if ex_id is None or not series[names[ex_id]]]
+    return {name: rows for name, rows in series.items() if rows}, body, missing
+
+
 # ===== Параметры тела =====
 
+@timed_query
 async def add_body_params(
         user_id: int,
         height_cm: Optional[float] = None,
@@ -130,33 +587,78 @@ async def add_body_params(
     """Сохранить замер роста/веса; допускает None для одного из полей."""
     if ts is None:
         ts = datetime.utcnow()
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "INSERT INTO body_params (user_id, height_cm, weight_kg, ts) VALUES (?,?,?,?)",
-            (user_id,
-             float(height_cm) if height_cm is not None else None,
-             float(weight_kg) if weight_kg is not None else None,
-             ts.isoformat())
-        )
-        await db.commit()
+    await get_writes().submit(
+        "INSERT INTO body_params (user_id, height_cm, weight_kg, ts) VALUES (?,?,?,?)",
+        [(user_id,
+          float(height_cm) if height_cm is not None else None,
+          float(weight_kg) if weight_kg is not None else None,
+          to_epoch(ts))]
+    )
+    _bump_version(user_id)  # вес тела рисуется на графиках сравнения
+
+
+# ===== Выгрузка всей истории =====
+
+async def _iter_pages(sql: str, user_id: int, batch_size: int):
+    """Постранично по (ts, id): читатель занят только на время одной страницы.
+
+    Запрос должен возвращать ts и id последними двумя колонками; наружу
+    отдаются строки без них.
+    """
+    last_ts, last_id = -1, -1
+    while True:
+        async with get_pool().reader() as db:
+            async with db.execute(sql, (user_id, last_ts, last_ts, last_id, batch_size)) as cur:
+                rows = await cur.fetchmany(batch_size)
+        if not rows:
+            return
+        last_ts, last_id = rows[-1][-2], rows[-1][-1]
+        yield [tuple(r[:-2]) for r in rows]
+        if len(rows) < batch_size:
+            return
+
+
+async def iter_entries(user_id: int, batch_size: int = 1000):
+    """Все подходы пользователя пачками: (ISO-время, упражнение, повторы, вес)."""
+    await get_writes().flush()
+    sql = f"""
+    SELECT {ISO_TS}, exercise_id, reps, weight, ts, id FROM entries
+    WHERE user_id = ? AND (ts > ? OR (ts = ? AND id > ?))
+    ORDER BY ts, id LIMIT ?
+    """
+    async for rows in _iter_pages(sql, user_id, batch_size):
+        yield [(ts, exercise_name(ex_id), reps, weight) for ts, ex_id, reps, weight in rows]
+
+
+async def iter_body_params(user_id: int, batch_size: int = 1000):
+    """Все замеры тела пачками: (ISO-время, рост, вес)."""
+    await get_writes().flush()
+    sql = f"""
+    SELECT {ISO_TS}, height_cm, weight_kg, ts, id FROM body_params
+    WHERE user_id = ? AND (ts > ? OR (ts = ? AND id > ?))
+    ORDER BY ts, id LIMIT ?
+    """
+    async for rows in _iter_pages(sql, user_id, batch_size):
+        yield rows
 
 
+@timed_query
 async def last_body_params(user_id: int):
     """Последний замер роста/веса пользователя."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_pool().reader() as db:
         async with db.execute(
-                "SELECT height_cm, weight_kg, ts FROM body_params WHERE user_id=? ORDER BY ts DESC LIMIT 1",
+                f"SELECT height_cm, weight_kg, {ISO_TS} FROM body_params WHERE user_id=? ORDER BY ts DESC LIMIT 1",
                 (user_id,)
         ) as cur:
             return await cur.fetchone()
 
 
-# db.py
+@timed_query
 async def last_n_body_params(user_id: int, n: int = 10):
     """Последние n замеров роста/веса."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_pool().reader() as db:
         async with db.execute(
-                "SELECT ts, height_cm, weight_kg FROM body_params WHERE user_id=? ORDER BY ts DESC LIMIT ?",
+                f"SELECT {ISO_TS}, height_cm, weight_kg FROM body_params WHERE user_id=? ORDER BY ts DESC LIMIT ?",
                 (user_id, n)
         ) as cur:
             return await cur.fetchall()
@@ -0,0 +1,149 @@
+# db_pool.py — долгоживущие соединения с SQLite: один писатель + N читателей
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import aiosqlite
+
+# Общие настройки для всех соединений
+PRAGMAS = (
+    "PRAGMA synchronous=NORMAL;",  # в WAL достаточно, fsync только на checkpoint
+    "PRAGMA temp_store=MEMORY;",
+    "PRAGMA cache_size=-16000;",  # ~16 МБ кэша страниц на соединение
+    "PRAGMA mmap_size=67108864;",  # 64 МБ memory-mapped I/O
+    "PRAGMA busy_timeout=5000;",
+)
+
+
+class PoolTimeoutError(RuntimeError):
+    """Не удалось получить соединение из пула за отведённое время."""
+
+
+class ConnectionPool:
+    """Пул соединений: писатель под замком, читатели в очереди.
+
+    SQLite допускает только одного писателя, поэтому все записи идут через
+    единственное соединение. Читатели работают параллельно благодаря WAL.
+    """
+
+    def __init__(self, path: str, readers: int = 4, timeout: float = 5.0):
+        self.path = path
+        self.readers_count = max(1, readers)
+        self.timeout = timeout
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._writer_lock = asyncio.Lock()
+        self._readers: "asyncio.Queue[aiosqlite.Connection]" = asyncio.Queue()
+        self._all_readers: list = []
+        self._closed = True
+        # Метрики
+        self._acquired = {"reader": 0, "writer": 0}
+        self._timeouts = {"reader": 0, "writer": 0}
+        self._wait_total = {"reader": 0.0, "writer": 0.0}
+        self._wait_max = {"reader": 0.0, "writer": 0.0}
+        self._waiting = {"reader": 0, "writer": 0}
+
+    async def _connect(self, readonly: bool) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.path)
+        # PRAGMA возвращают строки — курсоры закрываем сразу, иначе держат блокировку
+        script = "".join(PRAGMAS) + ("PRAGMA query_only=1;" if readonly else "")
+        await conn.executescript(script)
+        return conn
+
+    async def open(self):
+        if not self._closed:
+            return
+        self._writer = await self._connect(readonly=False)
+        try:
+            # WAL переключается один раз и сохраняется в файле БД
+            await self._writer.execute_fetchall("PRAGMA journal_mode=WAL;")
+            for _ in range(self.readers_count):
+                conn = await self._connect(readonly=True)
+                self._all_readers.append(conn)
+                self._readers.put_nowait(conn)
+        except BaseException:
+            # Потоки aiosqlite не демонические — без закрытия процесс не завершится
+            for conn in self._all_readers:
+                await conn.close()
+            self._all_readers.clear()
+            self._readers = asyncio.Queue()
+            await self._writer.close()
+            self._writer = None
+            raise
+        self._closed = False
+
+    async def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        async with self._writer_lock:
+            for conn in self._all_readers:
+                await conn.close()
+            self._all_readers.clear()
+            self._readers = asyncio.Queue()
+            if self._writer is not None:
+                # Сливаем WAL в основной файл, чтобы не оставлять хвостов
+                await self._writer.execute_fetchall("PRAGMA wal_checkpoint(TRUNCATE);")
+                await self._writer.close()
+                self._writer = None
+
+    def _account(self, kind: str, waited: float):
+        self._acquired[kind] += 1
+        self._wait_total[kind] += waited
+        if waited > self._wait_max[kind]:
+            self._wait_max[kind] = waited
+
+    @asynccontextmanager
+    async def reader(self):
+        if self._closed:
+            raise RuntimeError("Пул соединений закрыт")
+        started = time.perf_counter()
+        self._waiting["reader"] += 1
+        try:
+            conn = await asyncio.wait_for(self._readers.get(), self.timeout)
+        except asyncio.TimeoutError:
+            self._timeouts["reader"] += 1
+            raise PoolTimeoutError(f"Нет свободного читателя за {self.timeout} с")
+        finally:
+            self._waiting["reader"] -= 1
+        self._account("reader", time.perf_counter() - started)
+        try:
+            yield conn
+        finally:
+            self._readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def writer(self):
+        """Эксклюзивный доступ к писателю; при исключении транзакция откатывается."""
+        if self._closed:
+            raise RuntimeError("Пул соединений закрыт")
+        started = time.perf_counter()
+        self._waiting["writer"] += 1
+        try:
+            await asyncio.wait_for(self._writer_lock.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self._timeouts["writer"] += 1
+            raise PoolTimeoutError(f"Писатель занят дольше {self.timeout} с")
+        finally:
+            self._waiting["writer"] -= 1
+        self._account("writer", time.perf_counter() - started)
+        try:
+            yield self._writer
+        except BaseException:
+            await self._writer.rollback()
+            raise
+        finally:
+            self._writer_lock.release()
+
+    def stats(self) -> dict:
+        """Снимок метрик пула (размер, занятость, ожидания, таймауты)."""
+        return {
+            "readers_total": self.readers_count,
+            "readers_idle": self._readers.qsize(),
+            "writer_busy": self._writer_lock.locked(),
+            "waiting": dict(self._waiting),
+            "acquired": dict(self._acquired),
+            "timeouts": dict(self._timeouts),
+            "wait_total_s": dict(self._wait_total),
+            "wait_max_s": dict(self._wait_max),
+        }
@@ -0,0 +1,161 @@
+# db_writer.py — отложенная пакетная запись (write-behind) поверх пула соединений
+import asyncio
+import logging
+from typing import Optional, Sequence
+
+from db_pool import ConnectionPool, PoolTimeoutError
+
+log = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class WriteBehindQueue:
+    """Копит INSERT'ы от разных пользователей и пишет их одной транзакцией.
+
+    Пакет сбрасывается, когда набралось ``max_batch`` строк или прошло
+    ``max_delay`` секунд с первой строки пакета. ``submit`` возвращает
+    управление только после COMMIT пакета — подтверждение пользователю
+    отправляется, когда данные уже на диске.
+    """
+
+    def __init__(self, pool: ConnectionPool, max_batch: int = 200, max_delay: float = 0.05):
+        self.pool = pool
+        self.max_batch = max(1, max_batch)
+        self.max_delay = max_delay
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        # Метрики
+        self.batches = 0
+        self.rows = 0
+        self.failed_batches = 0
+        self.split_batches = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="db-write-behind")
+
+    async def submit(self, sql: str, rows: Sequence[tuple]):
+        """Поставить строки в очередь и дождаться коммита.
+
+        Все ``rows`` одного вызова попадают в одну транзакцию.
+        """
+        if self._task is None:
+            raise RuntimeError("Очередь записи не запущена")
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((sql, list(rows), fut))
+        await fut
+
+    async def flush(self):
+        """Дождаться коммита всего, что было поставлено в очередь до вызова."""
+        if self._task is None:
+            return
+        # Пустой маркер: очередь FIFO, значит, к его подтверждению всё предыдущее уже записано
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((None, [], fut))
+        await fut
+
+    async def stop(self):
+        """Дописать всё, что накопилось, и остановить фоновую задачу."""
+        if self._task is None:
+            return
+        self._queue.put_nowait(_STOP)
+        await self._task
+        self._task = None
+
+    async def _collect(self, first) -> tuple:
+        batch = [first]
+        size = len(first[1])
+        stop = False
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_delay
+        while size < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0 and self._queue.empty():
+                break
+            try:
+                item = self._queue.get_nowait() if timeout <= 0 else \
+                    await asyncio.wait_for(self._queue.get(), timeout)
+            except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                break
+            if item is _STOP:
+                stop = True
+                break
+            batch.append(item)
+            size += len(item[1])
+        return batch, stop
+
+    async def _run(self):
+        while True:
+            first = await self._queue.get()
+            if first is _STOP:
+                return
+            batch, stop = await self._collect(first)
+            await self._write(batch)
+            if stop:
+                # Остановка: дописываем хвост, пришедший до сигнала
+                tail = []
+                while not self._queue.empty():
+                    item = self._queue.get_nowait()
+                    if item is not _STOP:
+                        tail.append(item)
+                for i in range(0, len(tail), self.max_batch):
+                    await self._write(tail[i:i + self.max_batch])
+                return
+
+    async def _write(self, batch: list):
+        try:
+            await self._commit(batch)
+        except Exception as e:
+            if len(batch) == 1 or isinstance(e, PoolTimeoutError):
+                self._fail(batch, e)
+                return
+            # Одна плохая строка не должна ронять чужие записи: повторяем
+            # пакет по вызовам, исключение получит только виноватый
+            self.split_batches += 1
+            log.warning("Пакет из %d вызовов не записан (%s), пишем по одному", len(batch), e)
+            for item in batch:
+                try:
+                    await self._commit([item])
+                except Exception as item_error:
+                    self._fail([item], item_error)
+                else:
+                    self._done([item])
+            return
+        self._done(batch)
+
+    async def _commit(self, batch: list):
+        # Группируем по SQL, чтобы каждый запрос ушёл одним executemany
+        grouped = {}
+        for sql, rows, _ in batch:
+            if sql is not None:
+                grouped.setdefault(sql, []).extend(rows)
+        async with self.pool.writer() as db:
+            for sql, rows in grouped.items():
+                await db.executemany(sql, rows)
+            await db.commit()
+
+    def _done(self, batch: list):
+        self.batches += 1
+        self.rows += sum(len(rows) for sql, rows, _ in batch if sql is not None)
+        for _, _, fut in batch:
+            if not fut.done():
+                fut.set_result(None)
+
+    def _fail(self, batch: list, error: Exception):
+        # Вызывается из except — log.exception допишет трассировку
+        self.failed_batches += 1
+        log.exception("Не удалось записать пакет из %d строк", sum(len(r) for _, r, _ in batch))
+        for _, _, fut in batch:
+            if not fut.done():
+                fut.set_exception(error)
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._queue.qsize(),
+            "batches": self.batches,
+            "rows": self.rows,
+            "failed_batches": self.failed_batches,
+            "split_batches": self.split_batches,
+            "avg_batch": (self.rows / self.batches) if self.batches else 0.0,
+        }
@@ -0,0 +1,118 @@
+# export.py — потоковая выгрузка всей истории пользователя в CSV/NDJSON (gzip)
+#
+# Строки читаются из БД пачками и сразу сжимаются: в памяти одновременно
+# лежит только одна пачка и текущая часть архива. Если архив перерастает
+# ``part_bytes``, он закрывается и отдаётся как отдельный файл, а следующая
+# часть начинается со своего заголовка — каждую часть можно открыть отдельно.
+import csv
+import io
+import json
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from db import iter_body_params, iter_entries
+
+FORMATS = ("csv", "ndjson")
+
+# Telegram принимает документы до 50 МБ; значения переопределяются из окружения
+PART_BYTES = 20 * 1024 * 1024
+MAX_PARTS = 5
+
+# Колонки общие для подходов и замеров; лишние поля у строки пустые
+CSV_COLUMNS = ("type", "ts", "exercise", "reps", "weight", "height_cm", "weight_kg")
+
+
+@dataclass
+class ExportPart:
+    filename: str
+    data: bytes
+    rows: int
+    last: bool = False
+    truncated: bool = False  # выгрузка оборвана по лимиту max_parts
+
+
+def _entry_record(row: tuple) -> dict:
+    ts, exercise, reps, weight = row
+    return {"type": "entry", "ts": ts, "exercise": exercise, "reps": reps, "weight": weight}
+
+
+def _body_record(row: tuple) -> dict:
+    ts, height_cm, weight_kg = row
+    return {"type": "body", "ts": ts, "height_cm": height_cm, "weight_kg": weight_kg}
+
+
+class _Encoder:
+    """Текст записей для одного формата; заголовок CSV — в начале каждой части."""
+
+    def __init__(self, fmt: str):
+        self.fmt = fmt
+
+    def header(self) -> str:
+        if self.fmt != "csv":
+            return ""
+        buf = io.StringIO()
+        csv.writer(buf).writerow(CSV_COLUMNS)
+        return buf.getvalue()
+
+    def encode(self, records: list) -> str:
+        if self.fmt == "ndjson":
+            return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, CSV_COLUMNS)
+        writer.writerows(records)
+        return buf.getvalue()
+
+
+async def _records(user_id: int, batch_size: int):
+    async for rows in iter_entries(user_id, batch_size):
+        yield [_entry_record(r) for r in rows]
+    async for rows in iter_body_params(user_id, batch_size):
+        yield [_body_record(r) for r in rows]
+
+
+async def export_parts(
+        user_id: int,
+        fmt: str = "csv",
+        part_bytes: Optional[int] = None,
+        max_parts: Optional[int] = None,
+        batch_size: int = 1000
+):
+    """Асинхронный генератор частей выгрузки (gzip), каждая не больше ~``part_bytes``.
+
+    Ничего не отдаёт, если у пользователя нет данных.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат выгрузки: {fmt}")
+    part_bytes = part_bytes or PART_BYTES
+    max_parts = max_parts or MAX_PARTS
+    encoder = _Encoder(fmt)
+    stamp = datetime.utcnow().strftime("%Y%m%d")
+    ext = "csv" if fmt == "csv" else "ndjson"
+    number = 0
+    compressor, chunks, size, rows = None, [], 0, 0
+
+    def finish(last: bool, truncated: bool = False) -> ExportPart:
+        chunks.append(compressor.flush())
+        return ExportPart(f"workout_{user_id}_{stamp}_{number}.{ext}.gz", b"".join(chunks), rows, last, truncated)
+
+    async for records in _records(user_id, batch_size):
+        if compressor is not None and size >= part_bytes:
+            # Часть заполнена, а данные ещё есть — закрываем её и начинаем следующую
+            if number >= max_parts:
+                yield finish(last=True, truncated=True)
+                return
+            yield finish(last=False)
+            compressor = None
+        if compressor is None:
+            number += 1
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 — gzip-обёртка
+            chunks, size, rows = [], 0, 0
+            chunks.append(compressor.compress(encoder.header().encode()))
+        out = compressor.compress(encoder.encode(records).encode())
+        chunks.append(out)
+        size += len(out)
+        rows += len(records)
+    if compressor is not None:
+        yield finish(last=True)
@@ -0,0 +1,108 @@
+# fsm_storage.py — хранилище состояний FSM в том же файле SQLite
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+
+from db_pool import ConnectionPool
+
+log = logging.getLogger(__name__)
+
+
+def _dumps(data: Mapping[str, Any]) -> Optional[str]:
+    # Компактный JSON без пробелов; пустые данные не храним вовсе
+    if not data:
+        return None
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM-хранилище в таблице fsm_state.
+
+    Незавершённые сценарии (AddEntry, ProgressInput, ...) переживают
+    перезапуск, а несколько процессов бота видят одно и то же состояние.
+    Брошенные состояния истекают через ``ttl`` секунд после последней
+    записи и вычищаются фоновой задачей.
+    """
+
+    def __init__(
+            self,
+            pool: ConnectionPool,
+            ttl: Optional[int] = 24 * 3600,
+            key_builder: Optional[KeyBuilder] = None,
+            purge_interval: float = 600.0
+    ):
+        self.pool = pool
+        self.ttl = ttl
+        self.key_builder = key_builder or DefaultKeyBuilder()
+        self.purge_interval = purge_interval
+        self._purger: Optional[asyncio.Task] = None
+
+    def _expires(self) -> Optional[int]:
+        return int(time.time()) + self.ttl if self.ttl else None
+
+    def start_purger(self):
+        if self._purger is None:
+            self._purger = asyncio.create_task(self._purge_loop(), name="fsm-purge")
+
+    async def _purge_loop(self):
+        while True:
+            await asyncio.sleep(self.purge_interval)
+            try:
+                removed = await self.purge_expired()
+                if removed:
+                    log.info("FSM: удалено %d просроченных состояний", removed)
+            except Exception:
+                log.exception("FSM: не удалось вычистить просроченные состояния")
+
+    async def purge_expired(self) -> int:
+        async with self.pool.writer() as db:
+            cur = await db.execute(
+                "DELETE FROM fsm_state WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                (int(time.time()),)
+            )
+            await db.commit()
+            return cur.rowcount
+
+    async def _upsert(self, key: StorageKey, column: str, value: Optional[str]):
+        k = self.key_builder.build(key)
+        async with self.pool.writer() as db:
+            await db.execute(
+                f"INSERT INTO fsm_state (key, {column}, expires_at) VALUES (?,?,?) "
+                f"ON CONFLICT (key) DO UPDATE SET {column}=excluded.{column}, expires_at=excluded.expires_at",
+                (k, value, self._expires())
+            )
+            # Строка без состояния и данных больше не нужна
+            await db.execute("DELETE FROM fsm_state WHERE key=? AND state IS NULL AND data IS NULL", (k,))
+            await db.commit()
+
+    async def _select(self, key: StorageKey, column: str) -> Optional[str]:
+        async with self.pool.reader() as db:
+            async with db.execute(
+                    f"SELECT {column} FROM fsm_state WHERE key=? AND (expires_at IS NULL OR expires_at > ?)",
+                    (self.key_builder.build(key), int(time.time()))
+            ) as cur:
+                row = await cur.fetchone()
+        return row[0] if row else None
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._upsert(key, "state", state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return await self._select(key, "state")
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        await self._upsert(key, "data", _dumps(data))
+
+    async def get_data(self, key: StorageKey) -> dict:
+        raw = await self._select(key, "data")
+        return json.loads(raw) if raw else {}
+
+    async def close(self) -> None:
+        if self._purger is not None:
+            self._purger.cancel()
+            self._purger = None
@@ -0,0 +1,277 @@
+# importer.py — потоковый импорт истории тренировок из CSV/NDJSON (в т.ч. .gz)
+#
+# Понимает формат /export (колонка type: entry/body), а также простой CSV
+# из других приложений: ts, exercise, reps[, weight]. Файл читается построчно,
+# строки проверяются и копятся в пачки, каждая пачка пишется одним
+# executemany в одной транзакции. Строки, которые уже есть в истории
+# (повторный импорт своей же выгрузки), пропускаются.
+import asyncio
+import csv
+import gzip
+import io
+import json
+import logging
+import zlib
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Iterator, Optional
+
+from catalog import normalize_name
+from db import add_body_params_bulk, add_entries_bulk, existing_body_params, existing_entries, get_exercise_id
+from resolver import resolver
+
+log = logging.getLogger(__name__)
+
+MAX_REPS = 10_000
+MAX_WEIGHT = 1_000.0
+MAX_NAME_LEN = 64
+HEIGHT_RANGE = (50.0, 300.0)
+BODY_WEIGHT_RANGE = (20.0, 500.0)
+# Сколько ошибок показывать пользователю — остальные только считаются
+MAX_ERRORS_KEPT = 20
+
+
+class ImportFormatError(ValueError):
+    """Файл не удалось распознать как CSV/NDJSON."""
+
+
+class _RowError(ValueError):
+    pass
+
+
+# Чем может оборваться чтение файла: битый gzip, обрезанный архив, кодировка, CSV
+READ_ERRORS = (ImportFormatError, UnicodeDecodeError, OSError, EOFError, zlib.error, csv.Error)
+
+
+@dataclass
+class ImportReport:
+    dry_run: bool = False
+    lines: int = 0
+    entries: int = 0
+    body: int = 0
+    skipped: int = 0
+    duplicates: int = 0  # уже были в истории
+    errors: list = field(default_factory=list)  # (номер строки, текст)
+    new_exercises: set = field(default_factory=set)
+    aborted: Optional[str] = None  # почему импорт остановился на полпути
+
+    def add_error(self, line_no: int, text: str):
+        self.skipped += 1
+        if len(self.errors) < MAX_ERRORS_KEPT:
+            self.errors.append((line_no, text))
+
+
+# ===== Чтение файла =====
+
+def open_text(raw) -> io.TextIOBase:
+    """Текстовый поток поверх бинарного файла; gzip распознаётся по сигнатуре."""
+    buffered = io.BufferedReader(raw) if not hasattr(raw, "peek") else raw
+    if buffered.peek(2)[:2] == b"\x1f\x8b":
+        buffered = gzip.GzipFile(fileobj=buffered)
+    return io.TextIOWrapper(buffered, encoding="utf-8-sig", newline="")
+
+
+def iter_records(text: io.TextIOBase) -> Iterator[tuple]:
+    """(номер строки, dict или None при ошибке разбора) — по одной строке за раз."""
+    first = text.readline()
+    if not first.strip():
+        return
+    if first.lstrip().startswith("{"):
+        yield 1, _json_line(first)
+        for line_no, line in enumerate(text, 2):
+            if line.strip():
+                yield line_no, _json_line(line)
+        return
+
+    header = [h.strip().lower() for h in next(csv.reader([first]))]
+    if "ts" not in header or ("exercise" not in header and "type" not in header):
+        raise ImportFormatError("В заголовке CSV нужны колонки ts и exercise (или type)")
+    for line_no, values in enumerate(csv.reader(text), 2):
+        if not values or not any(v.strip() for v in values):
+            continue
+        yield line_no, dict(zip(header, values))
+
+
+def _json_line(line: str) -> Optional[dict]:
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) else None
+
+
+# ===== Проверка строк =====
+
+def _parse_ts(value) -> int:
+    if isinstance(value, (int, float)) or (isinstance(value, str) and value.strip().isdigit()):
+        return int(value)
+    try:
+        ts = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+    except ValueError:
+        raise _RowError(f"непонятная дата: {value!r}")
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return int(ts.timestamp())
+
+
+def _parse_number(value, name: str, low: float, high: float, required: bool = False) -> Optional[float]:
+    if value is None or (isinstance(value, str) and not value.strip()):
+        if required:
+            raise _RowError(f"нет поля {name}")
+        return None
+    try:
+        number = float(str(value).replace(",", "."))
+    except ValueError:
+        raise _RowError(f"{name} — не число: {value!r}")
+    if not low <= number <= high:
+        raise _RowError(f"{name} вне диапазона: {value}")
+    return number
+
+
+def parse_entry(user_id: int, record: dict) -> tuple:
+    """-> (каноническое упражнение, повторы, вес, ts)."""
+    name = " ".join(str(record.get("exercise") or "").split())
+    if not name:
+        raise _RowError("нет названия упражнения")
+    if len(name) > MAX_NAME_LEN:
+        raise _RowError("слишком длинное название упражнения")
+    reps = _parse_number(record.get("reps"), "reps", 1, MAX_REPS, required=True)
+    if reps != int(reps):
+        raise _RowError(f"reps — не целое: {record.get('reps')}")
+    weight = _parse_number(record.get("weight"), "weight", 0, MAX_WEIGHT)
+    # Только однозначные совпадения: похожее название — ещё не то же упражнение
+    exercise = resolver.resolve(user_id, name, fuzzy=False) or normalize_name(name)
+    return exercise, int(reps), weight, _parse_ts(record.get("ts"))
+
+
+def parse_body(record: dict) -> tuple:
+    """-> (рост, вес, ts); хотя бы одно из полей обязательно."""
+    height = _parse_number(record.get("height_cm"), "height_cm", *HEIGHT_RANGE)
+    weight = _parse_number(record.get("weight_kg"), "weight_kg", *BODY_WEIGHT_RANGE)
+    if height is None and weight is None:
+        raise _RowError("нет ни роста, ни веса")
+    return height, weight, _parse_ts(record.get("ts"))
+
+
+# ===== Импорт =====
+
+async def import_stream(
+        user_id: int,
+        text: io.TextIOBase,
+        dry_run: bool = False,
+        batch_size: int = 5000,
+        on_progress: Optional[Callable[[ImportReport], Awaitable[None]]] = None
+) -> ImportReport:
+    """Разобрать поток и записать подходы/замеры пачками по ``batch_size``.
+
+    В режиме ``dry_run`` всё проверяется, но ничего не пишется.
+    ``on_progress`` вызывается после каждой пачки. Если файл оборвался или
+    запись не удалась, исключение не летит наружу: в отчёте остаётся
+    ``aborted`` и сколько пачек уже записано.
+    """
+    report = ImportReport(dry_run=dry_run)
+    entries, body = [], []
+    known: dict = {}  # упражнение -> есть ли уже в справочнике
+    # Сколько раз ключ встретился в файле и сколько копий записал сам импорт
+    seen_entries, written_entries = Counter(), Counter()
+    seen_body, written_body = Counter(), Counter()
+
+    async def fresh(rows: list, fetch, key, seen: Counter, written: Counter) -> list:
+        if not rows:
+            return rows
+        stamps = [row[-1] for row in rows]
+        existing = await fetch(user_id, min(stamps), max(stamps))
+        out = []
+        for row in rows:
+            k = key(row)
+            # n-я копия строки в файле — дубль, если в истории было хотя бы n таких до импорта
+            duplicate = seen[k] < existing[k] - written[k]
+            seen[k] += 1
+            if duplicate:
+                report.duplicates += 1
+            else:
+                out.append(row)
+                if not dry_run:
+                    written[k] += 1
+        return out
+
+    async def flush():
+        new_entries = await fresh(entries, existing_entries, _entry_key, seen_entries, written_entries)
+        new_body = await fresh(body, existing_body_params, _body_key, seen_body, written_body)
+        if dry_run:
+            report.entries += len(new_entries)
+            report.body += len(new_body)
+        else:
+            report.entries += await add_entries_bulk(user_id, new_entries, invalidate=True)
+            report.body += await add_body_params_bulk(user_id, new_body)
+        entries.clear()
+        body.clear()
+        if on_progress is not None:
+            await on_progress(report)
+
+    try:
+        for line_no, record in iter_records(text):
+            report.lines += 1
+            if record is None:
+                report.add_error(line_no, "строка не разбирается")
+                continue
+            try:
+                if (record.get("type") or "entry") == "body":
+                    body.append(parse_body(record))
+                else:
+                    row = parse_entry(user_id, record)
+                    entries.append(row)
+                    if row[0] not in known:
+                        known[row[0]] = await get_exercise_id(row[0]) is not None
+                        if not known[row[0]]:
+                            report.new_exercises.add(row[0])
+            except _RowError as e:
+                report.add_error(line_no, str(e))
+                continue
+            if len(entries) + len(body) >= batch_size:
+                await flush()
+            elif report.lines % 1000 == 0:
+                # Разбор синхронный — даём поработать остальным обработчикам
+                await asyncio.sleep(0)
+        if entries or body:
+            await flush()
+    except READ_ERRORS as e:
+        report.aborted = f"не удалось прочитать файл: {e or type(e).__name__}"
+    except Exception:
+        log.exception("Импорт пользователя %s прерван", user_id)
+        report.aborted = "ошибка записи в базу"
+    return report
+
+
+def _entry_key(row: tuple) -> tuple:
+    exercise, reps, weight, ts = row
+    return exercise, ts, reps, weight
+
+
+def _body_key(row: tuple) -> tuple:
+    height, weight, ts = row
+    return ts, height, weight
+
+
+def format_report(report: ImportReport) -> str:
+    if report.aborted:
+        head = f"Проверка прервана — {report.aborted}. До ошибки" if report.dry_run else \
+            f"Импорт прерван — {report.aborted}. Записано до ошибки"
+    else:
+        head = "Проверка файла (ничего не записано)" if report.dry_run else "Импорт завершён"
+    lines = [
+        f"{head}:",
+        f"• подходов: {report.entries}",
+        f"• замеров тела: {report.body}",
+    ]
+    if report.new_exercises:
+        names = sorted(report.new_exercises)
+        shown = ", ".join(names[:10]) + (" …" if len(names) > 10 else "")
+        lines.append(f"• новых упражнений: {len(names)} ({shown})")
+    if report.duplicates:
+        lines.append(f"• уже были в истории, пропущено: {report.duplicates}")
+    if report.skipped:
+        lines.append(f"• пропущено строк с ошибками: {report.skipped}")
+        lines.extend(f"  строка {n}: {text}" for n, text in report.errors)
+    return "\n".join(lines)
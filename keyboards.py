@@ -0,0 +1,192 @@
+# keyboards.py — статические клавиатуры бота, собранные один раз
+#
+# Меню, категории и списки упражнений не зависят от пользователя, поэтому
+# собираются при старте и дальше отдаются одними и теми же объектами
+# (разметки aiogram неизменяемы — делить их между ответами безопасно).
+# MarkupJsonMiddleware в сессии бота подставляет вместо такой разметки её
+# заранее сериализованный JSON: строку aiogram отправляет как есть, без
+# model_dump и json.dumps на каждый ответ.
+from typing import Optional
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, KeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove
+
+from catalog import CATEGORIES, EXERCISES_BY_CAT
+
+
+def _pairs(buttons: list) -> list:
+    """Кнопки по две в ряд."""
+    return [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+
+
+def build_categories() -> InlineKeyboardMarkup:
+    # Кнопки категорий + «Другое»
+    rows = _pairs([InlineKeyboardButton(text=label, callback_data=f"cat:{cid}") for cid, label in CATEGORIES.items()])
+    rows.append([InlineKeyboardButton(text="✍️ Другое", callback_data="ex:other")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def build_exercises(cat_id: str) -> InlineKeyboardMarkup:
+    pairs = EXERCISES_BY_CAT.get(cat_id, [])
+    rows = _pairs([InlineKeyboardButton(text=title, callback_data=f"ex:{eid}") for eid, title in pairs])
+    rows.append([
+        InlineKeyboardButton(text="⬅️ Назад к категориям", callback_data="cat:back"),
+        InlineKeyboardButton(text="✍️ Другое", callback_data="ex:other"),
+    ])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def build_main_menu() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="➕ Добавить подход", callback_data="add")],
+        [InlineKeyboardButton(text="📈 Прогресс", callback_data="progress")],
+        [InlineKeyboardButton(text="🖼️ График", callback_data="chart")],
+        [InlineKeyboardButton(text="❓ Помощь", callback_data="help")],
+    ])
+
+
+def build_reply_main() -> ReplyKeyboardMarkup:
+    return ReplyKeyboardMarkup(
+        keyboard=[
+            [KeyboardButton(text="➕ Добавить подход")],
+            [KeyboardButton(text="📈 Прогресс"), KeyboardButton(text="🖼️ График")],
+            [KeyboardButton(text="📏 Параметры тела")],
+            [KeyboardButton(text="❓ Помощь"), KeyboardButton(text="🔽 Скрыть меню")],
+        ],
+        resize_keyboard=True,
+        input_field_placeholder="Выберите действие или введите команду…"
+    )
+
+
+def build_body_menu() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="📐 Рост/вес", callback_data="body:metrics")],
+        [InlineKeyboardButton(text="📊 Статистика", callback_data="body:stats")],
+    ])
+
+
+def build_suggest() -> InlineKeyboardMarkup:
+    # Ответ на «может, имелось в виду …?» для быстрого ввода
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="✅ Да, исправить", callback_data="suggest:yes")],
+        [InlineKeyboardButton(text="✍️ Нет, как написал", callback_data="suggest:no")],
+        [InlineKeyboardButton(text="❌ Отмена", callback_data="suggest:cancel")],
+    ])
+
+
+def build_suggest_step() -> InlineKeyboardMarkup:
+    # То же в пошаговом вводе: без нажатия остаётся название как написано
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="✅ Да, это оно", callback_data="suggest:step")],
+    ])
+
+
+class KeyboardRegistry:
+    """Готовые разметки по имени и их JSON (считается при первой отправке)."""
+
+    def __init__(self):
+        self._markups: dict = {}  # имя -> разметка
+        self._names: dict = {}  # id(разметки) -> имя
+        self._json: dict = {}  # имя -> JSON, как его отправила бы сессия
+        # Метрики
+        self.serialized = 0
+        self.reused = 0
+
+    def build(self):
+        """Собрать все клавиатуры; вызывается при старте, повторный вызов ничего не делает."""
+        if self._markups:
+            return
+        self._add("categories", build_categories())
+        for cat_id in CATEGORIES:
+            self._add(f"exercises:{cat_id}", build_exercises(cat_id))
+        self._add("main_menu", build_main_menu())
+        self._add("reply_main", build_reply_main())
+        self._add("body_menu", build_body_menu())
+        self._add("suggest", build_suggest())
+        self._add("suggest_step", build_suggest_step())
+        self._add("remove", ReplyKeyboardRemove())
+
+    def _add(self, name: str, markup):
+        self._markups[name] = markup
+        self._names[id(markup)] = name
+
+    def get(self, name: str):
+        if not self._markups:
+            self.build()
+        return self._markups[name]
+
+    @property
+    def categories(self) -> InlineKeyboardMarkup:
+        return self.get("categories")
+
+    def exercises(self, cat_id: str) -> InlineKeyboardMarkup:
+        if not self._markups:
+            self.build()
+        markup = self._markups.get(f"exercises:{cat_id}")
+        return markup if markup is not None else build_exercises(cat_id)
+
+    @property
+    def main_menu(self) -> InlineKeyboardMarkup:
+        return self.get("main_menu")
+
+    @property
+    def reply_main(self) -> ReplyKeyboardMarkup:
+        return self.get("reply_main")
+
+    @property
+    def body_menu(self) -> InlineKeyboardMarkup:
+        return self.get("body_menu")
+
+    @property
+    def suggest(self) -> InlineKeyboardMarkup:
+        return self.get("suggest")
+
+    @property
+    def suggest_step(self) -> InlineKeyboardMarkup:
+        return self.get("suggest_step")
+
+    @property
+    def remove(self) -> ReplyKeyboardRemove:
+        return self.get("remove")
+
+    def json_for(self, markup, bot) -> Optional[str]:
+        """JSON разметки из реестра; None — разметка собрана не реестром."""
+        name = self._names.get(id(markup))
+        if name is None or self._markups.get(name) is not markup:
+            return None
+        cached = self._json.get(name)
+        if cached is None:
+            # Ровно то, что сделала бы сессия: model_dump + prepare_value (без None, тем же json_dumps)
+            cached = self._json[name] = bot.session.prepare_value(
+                markup.model_dump(warnings=False), bot=bot, files={}
+            )
+            self.serialized += 1
+        else:
+            self.reused += 1
+        return cached
+
+    def stats(self) -> dict:
+        return {
+            "markups": len(self._markups),
+            "serialized": self.serialized,
+            "reused": self.reused,
+        }
+
+
+class MarkupJsonMiddleware(BaseRequestMiddleware):
+    """Middleware сессии: готовая клавиатура уходит заранее сериализованной строкой."""
+
+    def __init__(self, registry: KeyboardRegistry):
+        self.registry = registry
+
+    async def __call__(self, make_request, bot, method):
+        markup = getattr(method, "reply_markup", None)
+        if markup is not None and not isinstance(markup, str):
+            cached = self.registry.json_for(markup, bot)
+            if cached is not None:
+                # У методов нет validate_assignment: строка доходит до prepare_value как есть
+                method.reply_markup = cached
+        return await make_request(bot, method)
+
+
+keyboards = KeyboardRegistry()
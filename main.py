@@ -1,8 +1,17 @@
 # main.py
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
+import argparse
+import json
 import os
 import re
+import tempfile
 import asyncio
 import logging
+from datetime import date, datetime
+from typing import Optional
 from dotenv import load_dotenv
 from aiogram import Bot, Dispatcher, Router, F
 from aiogram.types import Message
@@ -10,101 +19,29 @@ from aiogram.types import CallbackQuery
 from aiogram.filters import Command, CommandStart
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.fsm.storage.memory import MemoryStorage
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.types import BotCommand, BotCommandScopeDefault
 from aiogram.filters import StateFilter
-# main.py (импортируй)
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
-
-import tempfile
-import matplotlib
-
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
-from aiogram.types import FSInputFile
-
-from db import init_db, add_entry, recent_summary, last_n_entries, timeseries_daily, add_body_params, last_n_body_params
-
-# --- Шаблонные категории и упражнения ---
-CATEGORIES = {
-    "arms": "💪 Руки",
-    "legs": "🦵 Ноги",
-    "core": "🧩 Пресс",
-    "backm": "🦴 Спина",
-    "cardio": "🏃 Кардио",
-}
-
-# Для компактного callback_data используем короткие ID
-# Для компактного callback_data используем короткие ID
-EXERCISES_BY_CAT = {
-    "legs": [
-        ("leg_press", "Жим ногами"),
-        ("abductor", "Сведение бедер"),
-        ("adductor", "Разведение бедер"),
-        ("leg_curl", "Сгибание ног"),
-        ("leg_ext", "Разгибание ног"),
-        ("multi_hip", "Отведение назад"),
-    ],
-    "arms": [
-        ("hammer_curl", "Молотковый подъём на бицепс"),
-        ("overhead_ext", "Разгибание рук из-за головы"),
-        ("db_press", "Жим гантелей стоя"),
-        ("db_fly", "Разведение гантелей"),
-        ("db_row", "Тяга гантели к поясу в наклоне"),
-    ],
-    "backm": [
-        ("gravitron", "Гравитрон"),
-        ("seated_row", "Горизонтальная тяга в рычажном тренажёре"),
-    ],
-    "cardio": [
-        ("run", "Бег"),
-        ("stair", "Лестница"),
-    ],
-    "core": [
-        ("crunch", "Скручивания"),
-        ("bicycle", "Велосипед"),
-        ("knee_crunch", "Скрутка к колену"),
-        ("russian_twist", "Русские скручивания"),
-    ],
-}
-
-# Быстрый индекс id -> название
-EX_INDEX = {eid: title for pairs in EXERCISES_BY_CAT.values() for eid, title in pairs}
-
-
-def kb_categories_inline() -> InlineKeyboardMarkup:
-    # Кнопки категорий + «Другое»
-    rows = []
-    row = []
-    for cid, label in CATEGORIES.items():
-        row.append(InlineKeyboardButton(text=label, callback_data=f"cat:{cid}"))
-        if len(row) == 2:
-            rows.append(row)
-            row = []
-    if row:
-        rows.append(row)
-    rows.append([InlineKeyboardButton(text="✍️ Другое", callback_data="ex:other")])
-    return InlineKeyboardMarkup(inline_keyboard=rows)
-
-
-def kb_exercises_inline(cat_id: str) -> InlineKeyboardMarkup:
-    pairs = EXERCISES_BY_CAT.get(cat_id, [])
-    rows = []
-    row = []
-    for eid, title in pairs:
-        row.append(InlineKeyboardButton(text=title, callback_data=f"ex:{eid}"))
-        if len(row) == 2:
-            rows.append(row)
-            row = []
-    if row:
-        rows.append(row)
-    rows.append([
-        InlineKeyboardButton(text="⬅️ Назад к категориям", callback_data="cat:back"),
-        InlineKeyboardButton(text="✍️ Другое", callback_data="ex:other"),
-    ])
-    return InlineKeyboardMarkup(inline_keyboard=rows)
 
+from aiogram.types import BufferedInputFile
+
+from catalog import CATEGORIES, EXERCISES_BY_CAT, EX_INDEX, category_by_name
+import export
+import importer
+import metrics
+from sender import scheduler as send_scheduler
+from stats_cache import since_day, stats_cache
+from keyboards import MarkupJsonMiddleware, keyboards
+from throttling import DEFAULT_LIMITS, Limit, ThrottlingMiddleware
+from chart_cache import chart_cache, CachedChart
+from charts import OVERLAYS, renderer, has_volume, ChartBusyError
+from fsm_storage import SQLiteStorage
+from sharding import run_sharded
+from webhook import WebhookConfig, run_webhook
+from parsing import Workout, format_sets, looks_like_sets, parse_workout
+from resolver import resolver
+from db import get_pool, pool_stats, write_stats, init_db, close_db, data_version, to_epoch, add_entry, add_entries_bulk, progress_snapshot, personal_records, rep_records, timeseries_daily, timeseries_compare, add_body_params, last_n_body_params
 
 class AddEntry(StatesGroup):
     waiting_for_exercise = State()
@@ -120,36 +57,36 @@ class ChartInput(StatesGroup):
     waiting = State()
 
 
+class ImportInput(StatesGroup):
+    waiting_file = State()
+
+
+class ConfirmExercise(StatesGroup):
+    waiting = State()
+
+
 router = Router()
+metrics.instrument_router(router)
 
 
-def main_menu():
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="➕ Добавить подход", callback_data="add")],
-        [InlineKeyboardButton(text="📈 Прогресс", callback_data="progress")],
-        [InlineKeyboardButton(text="🖼️ График", callback_data="chart")],
-        [InlineKeyboardButton(text="❓ Помощь", callback_data="help")],
-    ])
-
-
-def reply_main_kb() -> ReplyKeyboardMarkup:
-    return ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="➕ Добавить подход")],
-            [KeyboardButton(text="📈 Прогресс"), KeyboardButton(text="🖼️ График")],
-            [KeyboardButton(text="📏 Параметры тела")],  # ← новая кнопка
-            [KeyboardButton(text="❓ Помощь"), KeyboardButton(text="🔽 Скрыть меню")],
-        ],
-        resize_keyboard=True,
-        input_field_placeholder="Выберите действие или введите команду…"
-    )
+def canonical_exercise(user_id: int, text: str) -> str:
+    """Привести ввод к известному упражнению (опечатки, сокращения); иначе оставить как есть.
+
+    Для чтения (/progress, /chart): ошибка здесь покажет не тот график, но не испортит данные.
+    """
+    return resolver.resolve(user_id, text) or text.strip()
 
 
-def kb_body_menu() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📐 Рост/вес", callback_data="body:metrics")],
-        [InlineKeyboardButton(text="📊 Статистика", callback_data="body:stats")],
-    ])
+def exercise_for_write(user_id: int, text: str) -> tuple:
+    """(название для записи, похожее известное или None).
+
+    Записываем только однозначные совпадения; похожее по опечатке название
+    лишь предлагаем — пользователь подтверждает его кнопкой.
+    """
+    strict = resolver.resolve(user_id, text, fuzzy=False)
+    if strict is not None:
+        return strict, None
+    return " ".join(text.split()), resolver.suggest(user_id, text)
 
 
 class BodyInput(StatesGroup):
@@ -160,7 +97,7 @@ class BodyInput(StatesGroup):
 async def kb_body(message: Message):
     await message.answer(
         "Выбери действие:",
-        reply_markup=kb_body_menu()
+        reply_markup=keyboards.body_menu
     )
 
 
@@ -169,9 +106,10 @@ async def cb_body_stats(call: CallbackQuery):
     user_id = call.from_user.id
     rows = await last_n_body_params(user_id, n=10)
 
+    # Сначала снимаем «часики» с кнопки — ответ на callback идёт вне очереди чата
+    await call.answer()
     if not rows:
-        await call.message.answer("Замеров пока нет. Добавь через 📐 Рост/вес.", reply_markup=reply_main_kb())
-        await call.answer()
+        await call.message.answer("Замеров пока нет. Добавь через 📐 Рост/вес.", reply_markup=keyboards.reply_main)
         return
 
     lines = ["📊 История замеров (последние 10):"]
@@ -181,8 +119,7 @@ async def cb_body_stats(call: CallbackQuery):
         w_txt = f"{w:g} кг" if w is not None else "—"
         lines.append(f"• {when}: {h_txt}, {w_txt}")
 
-    await call.message.answer("\n".join(lines), reply_markup=reply_main_kb())
-    await call.answer()
+    await call.message.answer("\n".join(lines), reply_markup=keyboards.reply_main)
 
 
 @router.callback_query(F.data == "body:metrics")
@@ -224,7 +161,7 @@ async def body_metrics_input(message: Message, state: FSMContext):
 
     await add_body_params(message.from_user.id, height, weight)
     await state.clear()
-    await message.answer(f"Записал: рост {height:g} см, вес {weight:g} кг ✅", reply_markup=reply_main_kb())
+    await message.answer(f"Записал: рост {height:g} см, вес {weight:g} кг ✅", reply_markup=keyboards.reply_main)
 
 
 # main.py — где-нибудь рядом с main_menu()
@@ -236,6 +173,9 @@ async def setup_bot_commands(bot: Bot):
         BotCommand(command="add", description="Добавить подход"),
         BotCommand(command="progress", description="Сводка по прогрессу"),
         BotCommand(command="chart", description="График упражнения"),
+        BotCommand(command="records", description="Личные рекорды"),
+        BotCommand(command="export", description="Выгрузить всю историю"),
+        BotCommand(command="import", description="Загрузить историю из файла"),
         BotCommand(command="help", description="Подсказки по использованию"),
     ]
     await bot.set_my_commands(commands, scope=BotCommandScopeDefault())
@@ -245,15 +185,15 @@ async def setup_bot_commands(bot: Bot):
 async def cmd_start(message: Message):
     await message.answer(
         "Привет! Я бот для учёта тренировок.\nВыбери действие 👇",
-        reply_markup=reply_main_kb()  # показываем клавиатуру с кнопками
+        reply_markup=keyboards.reply_main  # показываем клавиатуру с кнопками
     )
     # при желании можно дополнительно прислать инлайн-меню:
-    await message.answer("Или воспользуйся инлайн-меню:", reply_markup=main_menu())
+    await message.answer("Или воспользуйся инлайн-меню:", reply_markup=keyboards.main_menu)
 
 
 @router.message(Command("menu"))
 async def cmd_menu(message: Message):
-    await message.answer("Меню открыто 👇", reply_markup=reply_main_kb())
+    await message.answer("Меню открыто 👇", reply_markup=keyboards.reply_main)
 
 
 @router.message(Command("faq"))
@@ -274,7 +214,7 @@ async def kb_progress(message: Message, state: FSMContext):
     await state.set_state(ProgressInput.waiting)
     await message.answer(
         "Введи: <упражнение> [дней]\nНапример: приседания 7\n(Напиши «отмена» чтобы выйти)",
-        reply_markup=reply_main_kb()
+        reply_markup=keyboards.reply_main
     )
 
 
@@ -284,117 +224,236 @@ async def kb_chart(message: Message, state: FSMContext):
     await state.set_state(ChartInput.waiting)
     await message.answer(
         "Введи: <упражнение> [дней]\nНапример: приседания 30\n(Напиши «отмена» чтобы выйти)",
-        reply_markup=reply_main_kb()
+        reply_markup=keyboards.reply_main
     )
 
 
+# Опции в конце запроса: «/progress жим 90 недели тренд», «/chart жим 60 среднее»
+PROGRESS_OPTIONS = {"недели": "week", "неделя": "week", "месяцы": "month", "месяц": "month",
+                    "среднее": "avg", "тренд": "trend"}
+CHART_OPTIONS = {"среднее": "avg", "тренд": "trend"}
+ANALYTICS_DAYS = 90  # окно по умолчанию, если запрошена аналитика
+
+
+def parse_query(text: str, options: dict) -> tuple:
+    """«<упражнение> [дней] [опции…]» -> (упражнение или None, дни или None, опции).
+
+    Число дней и опции снимаются с конца в любом порядке; опции — по алфавиту,
+    чтобы одинаковые запросы давали одинаковый ключ кэша.
+    """
+    words = text.split()
+    days, found = None, set()
+    while words:
+        word = words[-1].lower()
+        if word.isdigit() and days is None:
+            days = int(word)
+        elif word in options:
+            found.add(options[word])
+        else:
+            break
+        words.pop()
+    return " ".join(words) or None, days, tuple(sorted(found))
+
+
+def format_analytics(days: int, series_rows: list, options: tuple) -> str:
+    """Аналитика /progress по строкам timeseries_daily: недели/месяцы, среднее, тренд."""
+    import analytics  # numpy грузится при первом запросе аналитики, а не на старте бота
+
+    today = datetime.utcnow().date()
+    series = analytics.DailySeries.from_rows(series_rows, start=date.fromisoformat(since_day(days)), end=today)
+    metric, unit = ("volume", "кг") if series.has_volume else ("reps", "повт.")
+    lines = []
+    for period, header in (("week", "По неделям"), ("month", "По месяцам")):
+        if period not in options:
+            continue
+        lines.append(f"\n{header} ({'объём' if metric == 'volume' else 'повторы'}):")
+        for start, total, change, complete in analytics.volume_progression(series, period, metric):
+            delta = f", {change:+.0f}%" if change is not None else ""
+            lines.append(f"• с {start}: {total:g} {unit}{delta}" + ("" if complete else " (неполн.)"))
+    if "avg" in options:
+        lines.append("\nВ среднем в день:")
+        for window in (7, 28):
+            if window <= len(series):
+                reps = analytics.rolling_mean(series.reps, window)[-1]
+                text = f"• за {window} дн.: {reps:.1f} повт."
+                if series.has_volume:
+                    text += f", {analytics.rolling_mean(series.volume, window)[-1]:.0f} кг"
+                lines.append(text)
+    if "trend" in options:
+        fitted = analytics.trend(series, metric)
+        if fitted is None:
+            lines.append("\nТренд: нужно хотя бы две тренировки за период.")
+        else:
+            slope, _, r2 = fitted
+            lines.append(f"\nТренд: {slope * 7:+.1f} {unit} в неделю (R² {r2:.2f})")
+    return "\n".join(lines)
+
+
+async def progress_text(user_id: int, exercise: Optional[str], days: int, options: tuple) -> Optional[str]:
+    """Ответ /progress целиком; None — данных нет."""
+    rows, last = await progress_snapshot(user_id, exercise, days)
+    if not rows:
+        return None
+    text = format_progress(days, rows, last)
+    if options:
+        text += "\n" + format_analytics(days, await timeseries_daily(user_id, exercise, days), options)
+    return text
+
+
+def format_progress(days: int, rows: list, last: list) -> str:
+    """Текст /progress: итог по упражнениям и (если есть) последние подходы."""
+    lines = [f"Итог за {days} дн.:"]
+    for ex, total_reps, sets in rows:
+        lines.append(f"• {ex}: {total_reps} повторений в {sets} подходах")
+    if last:
+        lines.append("\nПоследние подходы:")
+        for ts, reps, weight in last:
+            when = ts.split('T')[0] + " " + ts.split('T')[1][:5]
+            wt = f", {weight} кг" if weight is not None else ""
+            lines.append(f"• {when}: {reps} повт{wt}")
+    return "\n".join(lines)
+
+
 # Пользователь отвечает после "📈 Прогресс"
 @router.message(ProgressInput.waiting)
 async def progress_input(message: Message, state: FSMContext):
     text = message.text.strip()
     if text.lower() in {"отмена", "cancel", "назад"}:
         await state.clear()
-        await message.answer("Окей, вышли из режима прогресса.", reply_markup=reply_main_kb())
+        await message.answer("Окей, вышли из режима прогресса.", reply_markup=keyboards.reply_main)
         return
 
-    # парсим "<упражнение> [дней]"
-    parts = text.split()
-    days = 7
-    if parts and parts[-1].isdigit():
-        days = int(parts[-1])
-        exercise = " ".join(parts[:-1]).strip() or None
-    else:
-        exercise = " ".join(parts).strip() or None
+    # парсим "<упражнение> [дней] [опции]"
+    exercise, days, options = parse_query(text, PROGRESS_OPTIONS)
+    if days is None:
+        days = ANALYTICS_DAYS if options else 7
+    if exercise:
+        exercise = canonical_exercise(message.from_user.id, exercise)
 
-    rows = await recent_summary(message.from_user.id, exercise, days)
+    answer = await progress_text(message.from_user.id, exercise, days, options)
     await state.clear()
 
-    if not rows:
+    if answer is None:
         await message.answer("Данных пока нет. Добавь подход через /add или кнопку «➕ Добавить подход».",
-                             reply_markup=reply_main_kb())
+                             reply_markup=keyboards.reply_main)
         return
+    await message.answer(answer, reply_markup=keyboards.reply_main)
+
+
+async def send_chart(message: Message, exercise: str, days: int, reply_markup=None, overlays: tuple = ()):
+    """Отправить график: из кэша (по file_id или PNG) или отрисовав в пуле процессов."""
+    user_id = message.from_user.id
+    key = chart_cache.make_key(user_id, exercise, days, data_version(user_id), overlays)
+    cached = chart_cache.get(key)
+    if cached is None:
+        rows = await timeseries_daily(user_id, exercise, days)
+        if not rows:
+            await message.answer("Данных пока нет для этого упражнения за выбранный период.",
+                                 reply_markup=reply_markup)
+            return
+        try:
+            png = await renderer.render(f"{exercise.title()}: прогресс за {days} дн.", rows, overlays)
+        except ChartBusyError:
+            await message.answer("Сейчас строится слишком много графиков, попробуй через минуту 🙏",
+                                 reply_markup=reply_markup)
+            return
+        cached = CachedChart(
+            png=png,
+            caption=f"{exercise.title()} — {days} дн.\n"
+                    f"Линия 1: повторы/день" + (", линия 2: объём (повт×вес)" if has_volume(rows) else "")
+                    + ("\nНаложения: " + ", ".join(OVERLAYS[o][0] for o in overlays) if overlays else ""),
+        )
+        chart_cache.put(key, cached)
+
+    # Повторная отправка по file_id не гоняет картинку в Telegram заново
+    photo = cached.file_id or BufferedInputFile(cached.png, filename="chart.png")
+    sent = await message.answer_photo(photo, caption=cached.caption, reply_markup=reply_markup)
+    if cached.file_id is None and sent.photo:
+        chart_cache.set_file_id(key, sent.photo[-1].file_id)
+
+
+MAX_COMPARE = 6  # линий на одном графике сравнения
+
+
+def chart_targets(user_id: int, text: str) -> tuple:
+    """Что рисовать в /chart: «жим, присед» или категория («ноги») -> (подпись, [упражнения])."""
+    cat_id = category_by_name(text)
+    if cat_id is not None:
+        # Эмодзи из названия категории нет в шрифте графиков
+        label = CATEGORIES[cat_id].split(maxsplit=1)[-1]
+        return label, [title for _, title in EXERCISES_BY_CAT.get(cat_id, [])]
+    names = [canonical_exercise(user_id, part) for part in text.split(",") if part.strip()]
+    names = list(dict.fromkeys(names))  # без повторов, порядок как в запросе
+    return ", ".join(names), names
+
+
+async def send_comparison_chart(message: Message, title: str, exercises: list, days: int, reply_markup=None,
+                                report_missing: bool = True, overlays: tuple = ()):
+    """Несколько упражнений одним графиком: один запрос к БД и один рендер.
+
+    report_missing — перечислить в подписи упражнения без данных (для категории не нужно).
+    """
+    user_id = message.from_user.id
+    exercises = exercises[:MAX_COMPARE]
+    key = chart_cache.make_key(user_id, " | ".join(exercises), days, data_version(user_id), ("compare", *overlays))
+    cached = chart_cache.get(key)
+    if cached is None:
+        series, body, missing = await timeseries_compare(user_id, exercises, days)
+        if not series:
+            await message.answer("Данных пока нет по этим упражнениям за выбранный период.",
+                                 reply_markup=reply_markup)
+            return
+        try:
+            png = await renderer.render_comparison(f"{title}: прогресс за {days} дн.", list(series.items()), body,
+                                                   overlays)
+        except ChartBusyError:
+            await message.answer("Сейчас строится слишком много графиков, попробуй через минуту 🙏",
+                                 reply_markup=reply_markup)
+            return
+        cached = CachedChart(
+            png=png,
+            caption=f"{title} — {days} дн.\n"
+                    "Сверху повторы/день" + (", снизу объём (повт×вес)" if any(map(has_volume, series.values())) else "")
+                    + (", серый пунктир — вес тела" if body else "")
+                    + ("\nНаложения: " + ", ".join(OVERLAYS[o][0] for o in overlays) if overlays else "")
+                    + (f"\nНет данных: {', '.join(missing)}" if missing and report_missing else ""),
+        )
+        chart_cache.put(key, cached)
 
-    lines = [f"Итог за {days} дн.:"]
-    for ex, total_reps, sets in rows:
-        lines.append(f"• {ex}: {total_reps} повторений в {sets} подходах")
+    photo = cached.file_id or BufferedInputFile(cached.png, filename="chart.png")
+    sent = await message.answer_photo(photo, caption=cached.caption, reply_markup=reply_markup)
+    if cached.file_id is None and sent.photo:
+        chart_cache.set_file_id(key, sent.photo[-1].file_id)
 
-    if exercise:
-        last = await last_n_entries(message.from_user.id, exercise, n=10)
-        if last:
-            lines.append("\nПоследние подходы:")
-            for ts, reps, weight in last:
-                when = ts.split('T')[0] + " " + ts.split('T')[1][:5]
-                wt = f", {weight} кг" if weight is not None else ""
-                lines.append(f"• {when}: {reps} повт{wt}")
 
-    await message.answer("\n".join(lines), reply_markup=reply_main_kb())
+async def send_chart_request(message: Message, text: str, days: int, overlays: tuple, reply_markup=None):
+    """Один или несколько графиков в зависимости от запроса."""
+    title, exercises = chart_targets(message.from_user.id, text)
+    is_category = category_by_name(text) is not None
+    if len(exercises) == 1 and not is_category:
+        await send_chart(message, exercises[0], days, reply_markup=reply_markup, overlays=overlays)
+    else:
+        await send_comparison_chart(message, title, exercises, days, reply_markup=reply_markup,
+                                    report_missing=not is_category, overlays=overlays)
 
 
 # Пользователь отвечает после "🖼️ График"
-@router.message(ChartInput.waiting)
+@router.message(ChartInput.waiting, flags={"throttle": "expensive"})
 async def chart_input(message: Message, state: FSMContext):
     text = message.text.strip()
     if text.lower() in {"отмена", "cancel", "назад"}:
         await state.clear()
-        await message.answer("Окей, вышли из режима графика.", reply_markup=reply_main_kb())
+        await message.answer("Окей, вышли из режима графика.", reply_markup=keyboards.reply_main)
         return
 
-    parts = text.split()
-    days = 30
-    if parts and parts[-1].isdigit():
-        days = int(parts[-1])
-        exercise = " ".join(parts[:-1]).strip()
-    else:
-        exercise = " ".join(parts).strip()
-
+    exercise, days, overlays = parse_query(text, CHART_OPTIONS)
     if not exercise:
         await message.answer("Нужно указать упражнение, например: приседания 30",
-                             reply_markup=reply_main_kb())
+                             reply_markup=keyboards.reply_main)
         return
 
-    rows = await timeseries_daily(message.from_user.id, exercise, days)
     await state.clear()
-
-    if not rows:
-        await message.answer("Данных пока нет для этого упражнения за выбранный период.",
-                             reply_markup=reply_main_kb())
-        return
-
-    # — ниже твоя же логика построения графика —
-    import tempfile, os
-    import matplotlib
-    matplotlib.use("Agg")
-    import matplotlib.pyplot as plt
-    from aiogram.types import FSInputFile
-
-    dates = [r[0] for r in rows]
-    reps = [int(r[1]) if r[1] is not None else 0 for r in rows]
-    volume = [float(r[2]) if r[2] is not None else 0.0 for r in rows]
-    has_volume = any(v > 0 for v in volume)
-
-    fig = plt.figure(figsize=(8, 4.5), dpi=150)
-    ax1 = plt.gca()
-    ax1.plot(dates, reps, marker="o", label="Повторы/день")
-    ax1.set_xlabel("Дата")
-    ax1.set_ylabel("Повторы")
-    if has_volume:
-        ax2 = ax1.twinx()
-        ax2.plot(dates, volume, marker="s", linestyle="--", label="Объём (повт×вес)")
-        ax2.set_ylabel("Объём")
-    plt.title(f"{exercise.title()}: прогресс за {days} дн.")
-    plt.xticks(rotation=45, ha="right")
-    plt.tight_layout()
-
-    tmp_path = os.path.join(tempfile.gettempdir(), f"chart_{message.from_user.id}.png")
-    plt.savefig(tmp_path)
-    plt.close(fig)
-
-    await message.answer_photo(
-        FSInputFile(tmp_path),
-        caption=f"{exercise.title()} — {days} дн.\n"
-                f"Линия 1: повторы/день" + (", линия 2: объём (повт×вес)" if has_volume else ""),
-        reply_markup=reply_main_kb()
-    )
+    await send_chart_request(message, exercise, days or 30, overlays, reply_markup=keyboards.reply_main)
 
 
 # Нажали "❓ Помощь"
@@ -406,7 +465,7 @@ async def kb_help(message: Message):
 # Скрыть клавиатуру
 @router.message(F.text == "🔽 Скрыть меню")
 async def kb_hide(message: Message):
-    await message.answer("Меню скрыто. Напиши /menu чтобы вернуть.", reply_markup=ReplyKeyboardRemove())
+    await message.answer("Меню скрыто. Напиши /menu чтобы вернуть.", reply_markup=keyboards.remove)
 
 
 @router.callback_query(F.data == "add")
@@ -414,7 +473,7 @@ async def cb_add(call: CallbackQuery, state: FSMContext):
     await state.set_state(AddEntry.waiting_for_exercise)
     await call.message.answer(
         "Выбери категорию упражнения или нажми «Другое» и введи название вручную:",
-        reply_markup=kb_categories_inline()
+        reply_markup=keyboards.categories
     )
     await call.answer()
 
@@ -428,7 +487,7 @@ async def cb_choose_category(call: CallbackQuery, state: FSMContext):
         # Вернуться к списку категорий
         await call.message.edit_text(
             "Выбери категорию упражнения или нажми «Другое»:",
-            reply_markup=kb_categories_inline()
+            reply_markup=keyboards.categories
         )
         await call.answer()
         return
@@ -440,7 +499,7 @@ async def cb_choose_category(call: CallbackQuery, state: FSMContext):
     # Показать упражнения выбранной категории
     await call.message.edit_text(
         f"Категория: {CATEGORIES[cat_id]}\nВыбери упражнение:",
-        reply_markup=kb_exercises_inline(cat_id)
+        reply_markup=keyboards.exercises(cat_id)
     )
     await call.answer()
 
@@ -452,8 +511,8 @@ async def cb_choose_exercise(call: CallbackQuery, state: FSMContext):
 
     if ex_id == "other":
         # Оставляем состояние ожидания упражнения — ждём текст от пользователя
-        await call.message.answer("Введи название упражнения текстом (например: отжимания).")
         await call.answer()
+        await call.message.answer("Введи название упражнения текстом (например: отжимания).")
         return
 
     title = EX_INDEX.get(ex_id)
@@ -464,8 +523,8 @@ async def cb_choose_exercise(call: CallbackQuery, state: FSMContext):
     # Сохраняем выбранное упражнение и переходим к повторам
     await state.update_data(exercise=title)
     await state.set_state(AddEntry.waiting_for_reps)
-    await call.message.answer(f"Выбрано упражнение: {title}\nСколько повторений? (целое число)")
     await call.answer()
+    await call.message.answer(f"Выбрано упражнение: {title}\nСколько повторений? (целое число)")
 
 
 @router.callback_query(F.data == "progress")
@@ -473,7 +532,7 @@ async def cb_progress(call: CallbackQuery, state: FSMContext):
     await state.set_state(ProgressInput.waiting)
     await call.message.answer(
         "Введи: <упражнение> [дней]\nНапример: приседания 7\n(Напиши «отмена» чтобы выйти)",
-        reply_markup=reply_main_kb()
+        reply_markup=keyboards.reply_main
     )
     await call.answer()
 
@@ -483,7 +542,7 @@ async def cb_chart(call: CallbackQuery, state: FSMContext):
     await state.set_state(ChartInput.waiting)
     await call.message.answer(
         "Введи: <упражнение> [дней]\nНапример: приседания 30\n(Напиши «отмена» чтобы выйти)",
-        reply_markup=reply_main_kb()
+        reply_markup=keyboards.reply_main
     )
     await call.answer()
 
@@ -500,8 +559,17 @@ async def cmd_help(message: Message):
         "Как пользоваться:\n"
         "• /add — пошагово: упражнение → повторы → (опц.) вес.\n"
         "• Быстрый ввод: отправь 'отжимания 15' или 'жим лёжа 8 40'.\n"
+        "• Сразу несколько подходов: 'жим 10x60, 8x65, 6x70' или '3x5x100', по строке на упражнение.\n"
         "• /progress [упражнение] [дней] — напр.: /progress отжимания 30.\n"
-        "• /chart <упражнение> [дней] — PNG-график повторов и объёма. Пример: /chart приседания 30."
+        "  Добавь «недели», «месяцы», «среднее» или «тренд» — разбивка по периодам, скользящее среднее, "
+        "тренд (по умолчанию за 90 дн.).\n"
+        "• /chart <упражнение> [дней] — PNG-график повторов и объёма. Пример: /chart приседания 30.\n"
+        "  «среднее» и «тренд» в конце добавят на график сглаживание и линию тренда.\n"
+        "• /chart жим ногами, сгибание ног 90 или /chart ноги — сравнение упражнений (или всей категории) "
+        "на одном графике с весом тела.\n"
+        "• /records [упражнение] — личные рекорды: макс. вес, расчётный 1ПМ, лучший день по объёму.\n"
+        "• /export [csv|json] — вся история подходов и замеров одним архивом.\n"
+        "• /import [проверка] — загрузить историю из CSV/NDJSON (можно .gz)."
     )
 
 
@@ -510,7 +578,7 @@ async def cmd_add(message: Message, state: FSMContext):
     await state.set_state(AddEntry.waiting_for_exercise)
     await message.answer(
         "Выбери категорию упражнения или нажми «Другое» и введи название вручную:",
-        reply_markup=kb_categories_inline()
+        reply_markup=keyboards.categories
     )
     # Можно дополнительно подсказать про быстрый ввод:
     await message.answer("Лайфхак: можно сразу прислать, например: «приседания 20 60» — я всё запишу.")
@@ -520,37 +588,46 @@ async def cmd_add(message: Message, state: FSMContext):
 async def add_exercise(message: Message, state: FSMContext):
     text = message.text.strip()
 
-    # Попробовать "быстрый ввод": "<exercise> <reps> [weight]"
-    m = re.match(r"^([^\d\n]+?)\s+(\d+)(?:\s+([\d.,]+))?$", text)
-    if m:
-        exercise = m.group(1).strip()
-        reps = int(m.group(2))
-        weight = None
-        if m.group(3):
-            try:
-                weight = float(m.group(3).replace(",", "."))
-            except ValueError:
-                weight = None
-
-        await add_entry(message.from_user.id, exercise, reps, weight)
+    # Попробовать "быстрый ввод": "<exercise> <reps> [weight]" или несколько подходов
+    workout = parse_workout(text)
+    if workout.lines or any(looks_like_sets(e) for e in workout.errors):
+        summary = await save_workout(message, workout, state)
+        if summary is None:
+            return
         await state.clear()
+        exercise = exercise_for_write(message.from_user.id, workout.lines[0].exercise)[0]
         await message.answer(
-            f"Записал как быстрый ввод ✅\n"
-            f"Посмотреть прогресс: /progress или /progress {exercise} 7",
-            reply_markup=reply_main_kb()
+            f"{summary}\nПосмотреть прогресс: /progress или /progress {exercise} 7",
+            reply_markup=keyboards.reply_main
         )
-
         return
 
     # Обычный пошаговый сценарий
     if len(text) < 2:
         await message.answer("Название слишком короткое. Попробуй ещё раз.")
         return
-    await state.update_data(exercise=text)
+    exercise, suggestion = exercise_for_write(message.from_user.id, text)
+    await state.update_data(exercise=exercise, suggestion=suggestion)
     await state.set_state(AddEntry.waiting_for_reps)
+    if suggestion:
+        await message.answer(
+            f"Упражнения «{exercise}» у тебя ещё нет. Может, «{suggestion}»?\n"
+            f"Нажми кнопку или сразу введи число повторений — запишу как «{exercise}».",
+            reply_markup=keyboards.suggest_step
+        )
+        return
     await message.answer("Сколько повторений? (целое число)")
 
 
+@router.callback_query(AddEntry.waiting_for_reps, F.data == "suggest:step")
+async def cb_suggest_step(call: CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    await call.answer()
+    if data.get("suggestion"):
+        await state.update_data(exercise=data["suggestion"], suggestion=None)
+        await call.message.answer(f"Ок, «{data['suggestion']}». Сколько повторений? (целое число)")
+
+
 @router.message(AddEntry.waiting_for_reps, F.text.regexp(r"^\d+$"))
 async def add_reps(message: Message, state: FSMContext):
     reps = int(message.text)
@@ -571,18 +648,12 @@ async def add_weight_skip_or_value(message: Message, state: FSMContext):
 
     # быстрые варианты пропуска
     if text in {"пропустить", "skip"}:
-        data = await state.get_data()
-        await add_entry(message.from_user.id, data["exercise"], data["reps"], None)
-        await state.clear()
-        await message.answer("Готово! Записал подход ✅", reply_markup=reply_main_kb())
+        await finish_entry(message, state, None)
         return
 
     # Разрешим «0» как валидный вес
     if text == "0":
-        data = await state.get_data()
-        await add_entry(message.from_user.id, data["exercise"], data["reps"], 0.0)
-        await state.clear()
-        await message.answer("Готово! Записал подход ✅", reply_markup=reply_main_kb())
+        await finish_entry(message, state, 0.0)
         return
 
     # Пытаемся вытащить первое число из строки: 7, 7.5, 7,5, "+7", "~7", "7 кг", "7 -", "7-10" и т.п.
@@ -597,134 +668,453 @@ async def add_weight_skip_or_value(message: Message, state: FSMContext):
         await message.answer("Вес должен быть числом (например 42.5) или напиши 'пропустить'.")
         return
 
+    await finish_entry(message, state, weight)
+
+
+async def finish_entry(message: Message, state: FSMContext, weight: Optional[float]):
+    """Последний шаг /add: записать подход и показать, под каким названием."""
     data = await state.get_data()
     await add_entry(message.from_user.id, data["exercise"], data["reps"], weight)
     await state.clear()
-    await message.answer("Готово! Записал подход ✅", reply_markup=reply_main_kb())
+    await message.answer(f"Готово! Записал: {data['exercise']} — {format_sets([(data['reps'], weight)])} ✅",
+                         reply_markup=keyboards.reply_main)
 
 
 @router.message(Command("progress"))
 async def cmd_progress(message: Message):
-    args = message.text.split()[1:]
-    exercise = None
-    days = 7
-    if args:
-        if args[-1].isdigit():
-            days = int(args[-1])
-            if len(args) > 1:
-                exercise = " ".join(args[:-1])
-        else:
-            exercise = " ".join(args)
-    rows = await recent_summary(message.from_user.id, exercise, days)
-    if not rows:
+    exercise, days, options = parse_query(" ".join(message.text.split()[1:]), PROGRESS_OPTIONS)
+    if days is None:
+        days = ANALYTICS_DAYS if options else 7
+    if exercise:
+        exercise = canonical_exercise(message.from_user.id, exercise)
+    answer = await progress_text(message.from_user.id, exercise, days, options)
+    if answer is None:
         await message.answer("Данных пока нет. Добавь подход через /add.")
         return
-    lines = [f"Итог за {days} дн.:"]
-    for ex, total_reps, sets in rows:
-        lines.append(f"• {ex}: {total_reps} повторений в {sets} подходах")
+    await message.answer(answer)
+
+
+def format_records(rows: list, reps_at: Optional[list] = None) -> str:
+    """Текст /records; reps_at — максимум повторов по весам (только для одного упражнения)."""
+    lines = ["🏆 Личные рекорды:"]
+    for ex, max_w, max_w_reps, max_w_day, e1rm, e1rm_w, e1rm_reps, best_day, best_volume, bw_reps in rows:
+        parts = []
+        if max_w is not None:
+            parts.append(f"макс. вес {max_w:g} кг × {max_w_reps} ({max_w_day})")
+        if e1rm is not None:
+            parts.append(f"1ПМ ≈ {e1rm:.1f} кг (по {e1rm_w:g}×{e1rm_reps})")
+        if best_day is not None:
+            parts.append(f"лучший день {best_day}: {best_volume:g} кг")
+        if bw_reps is not None:
+            parts.append(f"без веса {bw_reps} повт. подряд")
+        lines.append(f"• {ex}: " + "; ".join(parts))
+    if reps_at:
+        lines.append("\nБольше всего повторов на весе:")
+        for weight, reps, day in reps_at:
+            lines.append(f"• {weight:g} кг — {reps} ({day})")
+    return "\n".join(lines)
+
+
+@router.message(Command("records"))
+async def cmd_records(message: Message):
+    # Только предрасчитанные таблицы: история подходов не читается
+    exercise = " ".join(message.text.split()[1:]) or None
     if exercise:
-        last = await last_n_entries(message.from_user.id, exercise, n=10)
-        if last:
-            lines.append("\nПоследние подходы:")
-            for ts, reps, weight in last:
-                when = ts.split('T')[0] + " " + ts.split('T')[1][:5]
-                wt = f", {weight} кг" if weight is not None else ""
-                lines.append(f"• {when}: {reps} повт{wt}")
-    await message.answer("\n".join(lines))
+        exercise = canonical_exercise(message.from_user.id, exercise)
+    rows = await personal_records(message.from_user.id, exercise)
+    if not rows:
+        await message.answer("Рекордов пока нет. Добавь подход через /add.")
+        return
+    reps_at = await rep_records(message.from_user.id, exercise) if exercise else None
+    await message.answer(format_records(rows, reps_at))
 
 
-@router.message(Command("chart"))
+@router.message(Command("chart"), flags={"throttle": "expensive"})
 async def cmd_chart(message: Message):
-    # Разбор аргументов: /chart <упражнение> [дней]
+    # Разбор аргументов: /chart <упражнение[, упражнение…] или категория> [дней] [среднее] [тренд]
     args = message.text.split()[1:]
     if not args:
-        await message.answer("Использование: /chart <упражнение> [дней]\nНапример: /chart приседания 30")
+        await message.answer("Использование: /chart <упражнение> [дней] [среднее] [тренд]\n"
+                             "Например: /chart приседания 30 тренд, /chart жим ногами, сгибание ног 90 или /chart ноги")
         return
 
-    days = 30
-    if args[-1].isdigit():
-        days = int(args[-1])
-        exercise = " ".join(args[:-1]).strip()
-    else:
-        exercise = " ".join(args).strip()
-
+    exercise, days, overlays = parse_query(" ".join(args), CHART_OPTIONS)
     if not exercise:
         await message.answer("Нужно указать упражнение. Пример: /chart приседания 30")
         return
 
-    rows = await timeseries_daily(message.from_user.id, exercise, days)
-    if not rows:
-        await message.answer("Данных пока нет для этого упражнения за выбранный период.")
+    await send_chart_request(message, exercise, days or 30, overlays)
+
+
+# Пользователи, у которых выгрузка уже идёт: вторую параллельно не запускаем
+_exports_running: set = set()
+
+
+@router.message(Command("export"), flags={"throttle": "expensive"})
+async def cmd_export(message: Message):
+    args = message.text.split()[1:]
+    fmt = args[0].lower() if args else "csv"
+    if fmt == "json":
+        fmt = "ndjson"
+    if fmt not in export.FORMATS:
+        await message.answer("Использование: /export [csv|json]")
+        return
+    user_id = message.from_user.id
+    if user_id in _exports_running:
+        await message.answer("Выгрузка уже готовится, подожди немного.")
+        return
+    _exports_running.add(user_id)
+    try:
+        sent = 0
+        async for part in export.export_parts(user_id, fmt):
+            sent += 1
+            caption = f"Часть {sent}: {part.rows} строк"
+            if part.truncated:
+                caption += "\nИстория слишком большая — выгрузка обрезана."
+            await message.answer_document(BufferedInputFile(part.data, filename=part.filename), caption=caption)
+        if not sent:
+            await message.answer("Данных пока нет. Добавь подход через /add.")
+    finally:
+        _exports_running.discard(user_id)
+
+
+# Telegram отдаёт ботам файлы не больше 20 МБ
+IMPORT_MAX_BYTES = 20 * 1024 * 1024
+
+
+@router.message(Command("import"))
+async def cmd_import(message: Message, state: FSMContext):
+    args = [a.lower() for a in message.text.split()[1:]]
+    dry_run = bool(args) and args[0] in {"проверка", "dry", "dry-run"}
+    await state.set_state(ImportInput.waiting_file)
+    await state.update_data(dry_run=dry_run)
+    mode = "Только проверю файл, ничего не запишу.\n" if dry_run else ""
+    await message.answer(
+        f"{mode}Пришли файл CSV или NDJSON (можно .gz), например из /export.\n"
+        "Для CSV нужны колонки ts, exercise, reps и по желанию weight.\n"
+        "(Напиши «отмена» чтобы выйти)"
+    )
+
+
+@router.message(ImportInput.waiting_file, F.document, flags={"throttle": "expensive"})
+async def import_file(message: Message, state: FSMContext, bot: Bot):
+    doc = message.document
+    if doc.file_size and doc.file_size > IMPORT_MAX_BYTES:
+        await message.answer("Файл больше 20 МБ — раздели его на части.")
         return
+    dry_run = (await state.get_data()).get("dry_run", False)
+    await state.clear()
 
-    dates = [r[0] for r in rows]  # 'YYYY-MM-DD'
-    reps = [int(r[1]) if r[1] is not None else 0 for r in rows]
-    volume = [float(r[2]) if r[2] is not None else 0.0 for r in rows]
-    has_volume = any(v > 0 for v in volume)
-
-    # Рисуем график
-    fig = plt.figure(figsize=(8, 4.5), dpi=150)
-    ax1 = plt.gca()
-    ax1.plot(dates, reps, marker="o", label="Повторы/день")
-    ax1.set_xlabel("Дата")
-    ax1.set_ylabel("Повторы")
-
-    if has_volume:
-        ax2 = ax1.twinx()
-        ax2.plot(dates, volume, marker="s", linestyle="--", label="Объём (повт×вес)")
-        ax2.set_ylabel("Объём")
-
-    plt.title(f"{exercise.title()}: прогресс за {days} дн.")
-    plt.xticks(rotation=45, ha="right")
-    plt.tight_layout()
-
-    tmp_path = os.path.join(tempfile.gettempdir(), f"chart_{message.from_user.id}.png")
-    plt.savefig(tmp_path)
-    plt.close(fig)
-
-    await message.answer_photo(FSInputFile(tmp_path),
-                               caption=f"{exercise.title()} — {days} дн.\n"
-                                       f"Линия 1: повторы/день"
-                                       + (", линия 2: объём (повт×вес)" if has_volume else ""))
-
-
-@router.message(
-    StateFilter(None),  # ← быстрый ввод только когда нет активного состояния
-    F.text.regexp(r"^(?!/)([^\d\n]+?)\s+(\d+)(?:\s+([\d.,]+))?$")
-)
-async def quick_add(message: Message):
-    text = message.text.strip()
-    if text.startswith("/"):  # дополнительная страховка
+    progress = await message.answer("Читаю файл…")
+    last_edit = time.monotonic()
+
+    async def on_progress(report: importer.ImportReport):
+        nonlocal last_edit
+        # Не чаще раза в пару секунд — правка сообщения тоже запрос к API
+        if time.monotonic() - last_edit < 2:
+            return
+        last_edit = time.monotonic()
+        await progress.edit_text(f"Обработано строк: {report.lines}…")
+
+    # Скачиваем кусками во временный файл на диске, а не в память; разбор — потоком из него
+    with tempfile.TemporaryFile() as raw:
+        await bot.download(doc, destination=raw)
+        report = await importer.import_stream(
+            message.from_user.id, importer.open_text(raw), dry_run=dry_run, on_progress=on_progress
+        )
+    await progress.edit_text(importer.format_report(report))
+
+
+@router.message(ImportInput.waiting_file)
+async def import_waiting(message: Message, state: FSMContext):
+    if (message.text or "").strip().lower() in {"отмена", "cancel", "назад"}:
+        await state.clear()
+        await message.answer("Ок, отменил импорт.", reply_markup=keyboards.reply_main)
         return
+    await message.answer("Жду файл документом. Или напиши «отмена».")
 
-    m = re.match(r"^(?!/)([^\d\n]+?)\s+(\d+)(?:\s+([\d.,]+))?$", text)
-    exercise = m.group(1).strip()
-    reps = int(m.group(2))
-    weight = None
-    if m.group(3):
-        try:
-            weight = float(m.group(3).replace(",", "."))
-        except ValueError:
-            weight = None
-    await add_entry(message.from_user.id, exercise, reps, weight)
-    await message.answer("Записал! Используй /progress чтобы посмотреть динамику.", reply_markup=reply_main_kb())
+
+def quick_workout(message: Message):
+    """Фильтр быстрого ввода: подставляет в хэндлер разобранную тренировку ``workout``."""
+    if not message.text or message.text.startswith("/"):
+        return False
+    workout = parse_workout(message.text)
+    # Текст не по форме «название число…» — не быстрый ввод; а «жим 10x60,5» — ошибка, о которой скажем
+    if not workout.lines and not any(looks_like_sets(e) for e in workout.errors):
+        return False
+    return {"workout": workout}
+
+
+async def save_workout(message: Message, workout: Workout, state: FSMContext) -> Optional[str]:
+    """Записать все подходы одной транзакцией; вернуть текст подтверждения.
+
+    None — ничего не записано: показаны ошибки разбора или задан вопрос про
+    похожее название (ответ придёт кнопкой, см. cb_confirm_exercise).
+    """
+    if workout.errors:
+        await message.answer(
+            "Не понял строки:\n" + "\n".join(f"• {e}" for e in workout.errors[:10])
+            + "\nНичего не записал. Формат: «жим 10x60, 8x65» — по строке на упражнение, "
+              "дробный вес — через точку: 10x62.5."
+        )
+        return None
+    user_id = message.from_user.id
+    lines, suggestions = [], {}
+    for line in workout.lines:
+        exercise, suggestion = exercise_for_write(user_id, line.exercise)
+        # Списки, а не кортежи: данные лежат в FSM-хранилище как JSON
+        lines.append([exercise, [list(s) for s in line.sets]])
+        if suggestion:
+            suggestions[exercise] = suggestion
+    if suggestions:
+        await state.set_state(ConfirmExercise.waiting)
+        await state.set_data({"lines": lines, "suggestions": suggestions})
+        await message.answer(
+            "Таких упражнений у тебя ещё нет:\n"
+            + "\n".join(f"• «{typed}» — может, «{known}»?" for typed, known in suggestions.items())
+            + "\nИсправить на предложенные названия?",
+            reply_markup=keyboards.suggest
+        )
+        return None
+    return await write_workout(user_id, lines)
+
+
+async def write_workout(user_id: int, lines: list) -> str:
+    """lines: [название, [[повторы, вес], …]] -> одна транзакция и текст подтверждения."""
+    ts = to_epoch(datetime.utcnow())
+    rows = [(exercise, reps, weight, ts) for exercise, sets in lines for reps, weight in sets]
+    await add_entries_bulk(user_id, rows)
+    if len(rows) == 1:
+        exercise, sets = lines[0]
+        return f"Записал: {exercise} — {format_sets(sets)} ✅"
+    return f"Записал подходов: {len(rows)} ✅\n" + "\n".join(
+        f"• {exercise}: {format_sets(sets)}" for exercise, sets in lines
+    )
+
+
+@router.callback_query(ConfirmExercise.waiting, F.data.startswith("suggest:"))
+async def cb_confirm_exercise(call: CallbackQuery, state: FSMContext):
+    choice = call.data.split(":", 1)[1]
+    data = await state.get_data()
+    await state.clear()
+    await call.answer()
+    if choice not in {"yes", "no"}:
+        await call.message.answer("Ок, ничего не записал.", reply_markup=keyboards.reply_main)
+        return
+    lines = data.get("lines") or []
+    if choice == "yes":
+        suggestions = data.get("suggestions") or {}
+        lines = [[suggestions.get(exercise, exercise), sets] for exercise, sets in lines]
+    summary = await write_workout(call.from_user.id, lines)
+    await call.message.answer(summary, reply_markup=keyboards.reply_main)
+
+
+@router.callback_query(F.data.startswith("suggest:"))
+async def cb_suggest_stale(call: CallbackQuery):
+    # Кнопка от вопроса, на который уже ответили
+    await call.answer("Этот вопрос уже неактуален")
+
+
+@router.message(ConfirmExercise.waiting)
+async def confirm_exercise_text(message: Message, state: FSMContext):
+    if (message.text or "").strip().lower() in {"отмена", "cancel", "назад"}:
+        await state.clear()
+        await message.answer("Ок, ничего не записал.", reply_markup=keyboards.reply_main)
+        return
+    await message.answer("Ответь кнопкой под вопросом выше или напиши «отмена».")
+
+
+@router.message(StateFilter(None), quick_workout)  # ← быстрый ввод только когда нет активного состояния
+async def quick_add(message: Message, workout: Workout, state: FSMContext):
+    summary = await save_workout(message, workout, state)
+    if summary is None:
+        return
+    await message.answer(f"{summary}\nИспользуй /progress чтобы посмотреть динамику.",
+                         reply_markup=keyboards.reply_main)
+
+
+def build_storage() -> BaseStorage:
+    """FSM-хранилище по FSM_STORAGE: sqlite (по умолчанию), redis или memory."""
+    kind = os.getenv("FSM_STORAGE", "sqlite").lower()
+    ttl = int(os.getenv("FSM_TTL", str(24 * 3600)))
+    if kind == "memory":
+        return MemoryStorage()
+    if kind == "redis":
+        # Нужен пакет redis; подходит любой совместимый сервер
+        from aiogram.fsm.storage.redis import RedisStorage
+        return RedisStorage.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+                                     state_ttl=ttl, data_ttl=ttl)
+    if kind != "sqlite":
+        raise RuntimeError(f"Неизвестный FSM_STORAGE: {kind}")
+    storage = SQLiteStorage(get_pool(), ttl=ttl)
+    storage.start_purger()
+    return storage
+
+
+def build_throttling() -> ThrottlingMiddleware:
+    """Лимиты из окружения: THROTTLE_<CHEAP|EXPENSIVE>_RATE (в секунду) и _BURST."""
+    limits = {}
+    for kind, default in DEFAULT_LIMITS.items():
+        prefix = f"THROTTLE_{kind.upper()}"
+        limits[kind] = Limit(
+            rate=float(os.getenv(f"{prefix}_RATE", str(default.rate))),
+            burst=int(os.getenv(f"{prefix}_BURST", str(default.burst))),
+        )
+    return ThrottlingMiddleware(limits)
+
+
+def build_dispatcher() -> Dispatcher:
+    dp = Dispatcher(storage=build_storage())
+    throttling = build_throttling()
+    # Внутренний middleware Dispatcher'а действует на хэндлеры всех вложенных роутеров
+    dp.message.middleware(throttling)
+    dp.callback_query.middleware(throttling)
+    dp.include_router(router)
+    metrics.REGISTRY.gauge_func("bot_throttling", "Ограничение частоты: ведра и решения",
+                                lambda: _stat_samples(throttling.stats()), ("field", "role"))
+    return dp
+
+
+def build_bot(token: str) -> Bot:
+    bot = Bot(token=token)
+    # Порядок важен: очередь снаружи, замер времени внутри — метрика API без ожидания в очереди
+    bot.session.middleware(send_scheduler)
+    metrics.instrument_bot(bot)
+    # Самый внутренний: подменяет готовые клавиатуры их JSON непосредственно перед отправкой
+    bot.session.middleware(MarkupJsonMiddleware(keyboards))
+    return bot
+
+
+def _stat_samples(stats: dict) -> list:
+    """stats() подсистемы -> выборки для gauge: вложенные словари дают метку role."""
+    samples = []
+    for field, value in stats.items():
+        if isinstance(value, dict):
+            samples.extend(({"field": field, "role": role}, v) for role, v in value.items())
+        elif isinstance(value, (int, float)):
+            samples.append(({"field": field}, value))
+    return samples
+
+
+def register_gauges():
+    """Показатели подсистем для /metrics — снимаются в момент запроса."""
+    sources = {
+        "bot_db_pool": ("Пул соединений SQLite", pool_stats),
+        "bot_db_writes": ("Очередь отложенной записи", write_stats),
+        "bot_charts": ("Графики: очередь, отрисовано, отклонено", renderer.stats),
+        "bot_chart_cache": ("Кэш графиков: попадания, промахи, размер", chart_cache.stats),
+        "bot_resolver": ("Индекс названий упражнений", resolver.stats),
+        "bot_keyboards": ("Готовые клавиатуры: сериализовано, переиспользовано", keyboards.stats),
+        "bot_stats_cache": ("Кэш сводок /progress", stats_cache.stats),
+        "bot_send_queue": ("Очередь исходящих запросов к Telegram", send_scheduler.stats),
+    }
+    for name, (help_text, stats) in sources.items():
+        metrics.REGISTRY.gauge_func(name, help_text, lambda stats=stats: _stat_samples(stats()),
+                                    ("field", "role"))
+
+
+async def setup_services():
+    """Поднять БД и подсистему графиков с настройками из окружения."""
+    await init_db(
+        readers=int(os.getenv("DB_POOL_SIZE", "4")),
+        timeout=float(os.getenv("DB_POOL_TIMEOUT", "5")),
+        batch_size=int(os.getenv("DB_WRITE_BATCH", "200")),
+        batch_delay=float(os.getenv("DB_WRITE_DELAY_MS", "50")) / 1000,
+    )
+    renderer.workers = int(os.getenv("CHART_WORKERS", "2"))
+    renderer.max_pending = int(os.getenv("CHART_QUEUE", "8"))
+    renderer.png_mode = os.getenv("CHART_PNG_MODE", "optimized")
+    # Бот не ждёт пул графиков: процессы с matplotlib прогреваются в фоне
+    renderer.start_warm_up()
+    chart_cache.max_entries = int(os.getenv("CHART_CACHE_ENTRIES", "512"))
+    chart_cache.max_bytes = int(os.getenv("CHART_CACHE_MB", "64")) * 1024 * 1024
+    keyboards.build()
+    stats_cache.max_users = int(os.getenv("STATS_CACHE_USERS", "2048"))
+    stats_cache.ttl = float(os.getenv("STATS_CACHE_TTL", "600"))
+    export.PART_BYTES = int(os.getenv("EXPORT_PART_MB", "20")) * 1024 * 1024
+    export.MAX_PARTS = int(os.getenv("EXPORT_MAX_PARTS", "5"))
+    send_scheduler.global_limit = Limit(float(os.getenv("SEND_GLOBAL_RATE", "30")),
+                                        int(os.getenv("SEND_GLOBAL_BURST", "30")))
+    send_scheduler.chat_limit = Limit(float(os.getenv("SEND_CHAT_RATE", "1")),
+                                      int(os.getenv("SEND_CHAT_BURST", "3")))
+    register_gauges()
+
+
+async def shutdown_services():
+    await send_scheduler.close()
+    # Дописываем отложенные подходы до закрытия соединений
+    await close_db()
+    renderer.shutdown()
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Workout Tracker Bot")
+    parser.add_argument("--mode", choices=("polling", "webhook"),
+                        default=os.getenv("BOT_MODE", "polling"),
+                        help="как получать обновления (по умолчанию BOT_MODE или polling)")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("BOT_WORKERS", "1")),
+                        help="число процессов-обработчиков; >1 — шардирование по user_id")
+    parser.add_argument("--startup-time", action="store_true",
+                        help="замерить этапы холодного старта, вывести JSON и выйти")
+    return parser.parse_args(argv)
+
+
+async def measure_startup() -> dict:
+    """Время этапов старта: импорты, БД, готовность к обновлениям, графики."""
+    timings = {"imports_s": time.perf_counter() - _IMPORT_STARTED}
+    started = time.perf_counter()
+    await setup_services()
+    timings["services_s"] = time.perf_counter() - started
+    dp = build_dispatcher()
+    # С этого момента бот уже мог бы принимать обновления
+    timings["ready_for_updates_s"] = time.perf_counter() - _IMPORT_STARTED
+    try:
+        await renderer.start_warm_up()
+        timings["charts_ready_s"] = time.perf_counter() - _IMPORT_STARTED
+        started = time.perf_counter()
+        await renderer.render("startup", [("2024-01-01", 10, 600.0, 1), ("2024-01-02", 12, 720.0, 2)])
+        timings["first_chart_s"] = time.perf_counter() - started
+    finally:
+        await dp.storage.close()
+        await shutdown_services()
+    return {k: round(v, 3) for k, v in timings.items()}
 
 
 async def main():
     load_dotenv()
+    args = parse_args()
+    if args.startup_time:
+        print(json.dumps(await measure_startup(), indent=2))
+        return
     token = os.getenv("BOT_TOKEN")
     if not token:
         raise RuntimeError("BOT_TOKEN не найден в .env")
     logging.basicConfig(level=logging.INFO)
-    await init_db()
-    bot = Bot(token=token)
-    dp = Dispatcher(storage=MemoryStorage())
-    dp.include_router(router)
-
-    # <— ВАЖНО: регистрируем команды
-    await setup_bot_commands(bot)
+    if args.workers > 1:
+        await run_sharded(args.mode, args.workers, token)
+        return
+    await setup_services()
+    bot = build_bot(token)
+    dp = build_dispatcher()
+    metrics_runner = None
 
-    await dp.start_polling(bot)
+    try:
+        # <— ВАЖНО: регистрируем команды
+        await setup_bot_commands(bot)
+
+        # Метрики — всегда отдельным сервером (по умолчанию только localhost), не на публичном webhook
+        if os.getenv("METRICS_PORT"):
+            metrics_runner = await metrics.start_server(
+                os.getenv("METRICS_HOST", "127.0.0.1"), int(os.getenv("METRICS_PORT")))
+        if args.mode == "webhook":
+            await run_webhook(dp, bot, WebhookConfig.from_env())
+        else:
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await shutdown_services()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,104 @@
+# manage.py — служебные команды для обслуживания workout.db
+import argparse
+import asyncio
+import sys
+
+import db
+
+
+async def cmd_rollup_backfill(args) -> int:
+    count = await db.backfill_rollup()
+    print(f"daily_rollup пересчитан: {count} строк")
+    return 0
+
+
+async def cmd_rollup_check(args) -> int:
+    problems = await db.check_rollup(limit=args.limit)
+    if not problems:
+        print("daily_rollup совпадает с entries ✅")
+        return 0
+    print(f"Найдены расхождения (первые {len(problems)}):")
+    for source, row in problems:
+        print(f"  [{source}] {row}")
+    print("Исправить: python manage.py rollup-backfill")
+    return 1
+
+
+async def cmd_records_backfill(args) -> int:
+    count = await db.backfill_records(batch_size=args.batch)
+    print(f"Личные рекорды пересчитаны: {count} упражнений")
+    return 0
+
+
+async def cmd_import(args) -> int:
+    import importer
+
+    async def on_progress(report):
+        print(f"  обработано строк: {report.lines}", file=sys.stderr)
+
+    try:
+        raw = open(args.file, "rb")
+    except OSError as e:
+        print(f"Не удалось открыть файл: {e}")
+        return 1
+    with raw:
+        # Ошибки чтения (битый gzip, кодировка, CSV) import_stream сам кладёт в отчёт
+        report = await importer.import_stream(
+            args.user, importer.open_text(raw), dry_run=args.dry_run,
+            batch_size=args.batch, on_progress=on_progress
+        )
+    print(importer.format_report(report))
+    return 1 if report.aborted else 0
+
+
+async def cmd_schema(args) -> int:
+    from migrations import MIGRATIONS, current_version
+
+    async with db.get_pool().writer() as conn:
+        version = await current_version(conn)
+    for number, name, _ in MIGRATIONS:
+        mark = "✅" if number <= version else "⏳"
+        print(f"{mark} {number:03d} {name}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Обслуживание базы workout-бота")
+    parser.add_argument("--db", default=db.DB_PATH, help="путь к файлу БД")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("rollup-backfill", help="пересчитать daily_rollup по entries")
+    p.set_defaults(func=cmd_rollup_backfill)
+
+    p = sub.add_parser("rollup-check", help="сверить daily_rollup с entries")
+    p.add_argument("--limit", type=int, default=20, help="сколько расхождений показать")
+    p.set_defaults(func=cmd_rollup_check)
+
+    p = sub.add_parser("records-backfill", help="пересчитать личные рекорды по entries за один проход")
+    p.add_argument("--batch", type=int, default=5000, help="строк в одной пачке записи")
+    p.set_defaults(func=cmd_records_backfill)
+
+    p = sub.add_parser("import", help="загрузить историю пользователя из CSV/NDJSON (.gz)")
+    p.add_argument("file", help="путь к файлу")
+    p.add_argument("--user", type=int, required=True, help="Telegram user_id владельца записей")
+    p.add_argument("--dry-run", action="store_true", help="только проверить, ничего не записывать")
+    p.add_argument("--batch", type=int, default=20000, help="строк в одной транзакции")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("schema", help="показать применённые миграции схемы")
+    p.set_defaults(func=cmd_schema)
+
+    return parser
+
+
+async def run(args) -> int:
+    db.DB_PATH = args.db
+    await db.init_db()
+    try:
+        return await args.func(args)
+    finally:
+        await db.close_db()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run(build_parser().parse_args())))
@@ -0,0 +1,214 @@
+# metrics.py — счётчики/гистограммы в формате Prometheus и эндпоинт /metrics
+import functools
+import logging
+import time
+from bisect import bisect_left
+from typing import Callable
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiohttp import web
+
+log = logging.getLogger(__name__)
+
+# Границы корзин в секундах: от долей миллисекунды (SQLite) до секунд (графики)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _fmt_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{v}"' for n, v in zip(names, values) if v != ""]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name, self.help, self.labels = name, help_text, labels
+        self._values: dict = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in self._values.items():
+            lines.append(f"{self.name}{_fmt_labels(self.labels, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name, self.help, self.labels = name, help_text, labels
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict = {}  # labels -> [счётчики по корзинам, сумма, количество]
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+        i = bisect_left(self.buckets, value)
+        if i < len(self.buckets):
+            series[0][i] += 1
+        series[1] += value
+        series[2] += 1
+
+    def time(self, **labels):
+        """Контекстный менеджер: with hist.time(label=...): ..."""
+        return _Timer(self, labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = 'le="%g"' % bound
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, le)} {cumulative}")
+            inf = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, inf)} {count}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labels, key)} {total:.6f}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labels, key)} {count}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, hist: Histogram, labels: dict):
+        self.hist, self.labels = hist, labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class GaugeFunc:
+    """Значения снимаются в момент запроса /metrics: fn() -> [(labels, value), ...]."""
+
+    def __init__(self, name: str, help_text: str, labels: tuple, fn: Callable[[], list]):
+        self.name, self.help, self.labels, self.fn = name, help_text, labels, fn
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            samples = self.fn()
+        except Exception:
+            log.exception("Не удалось снять метрику %s", self.name)
+            return lines
+        for labels, value in samples:
+            key = tuple(labels.get(n, "") for n in self.labels)
+            lines.append(f"{self.name}{_fmt_labels(self.labels, key)} {float(value):g}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict = {}
+
+    def _add(self, metric):
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, labels: tuple = ()) -> Counter:
+        return self._add(Counter(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def gauge_func(self, name: str, help_text: str, fn: Callable[[], list], labels: tuple = ()) -> GaugeFunc:
+        metric = GaugeFunc(name, help_text, labels, fn)
+        self._metrics[name] = metric  # повторная регистрация заменяет источник
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+DB_QUERY_SECONDS = REGISTRY.histogram("bot_db_query_seconds", "Время запроса к SQLite", ("query",))
+HANDLER_SECONDS = REGISTRY.histogram("bot_handler_seconds", "Время работы хэндлера", ("handler", "state"))
+HANDLER_ERRORS = REGISTRY.counter("bot_handler_errors_total", "Исключения в хэндлерах", ("handler",))
+API_SECONDS = REGISTRY.histogram("bot_telegram_api_seconds", "Время вызова Telegram Bot API", ("method",))
+CHART_RENDER_SECONDS = REGISTRY.histogram("bot_chart_render_seconds", "Отрисовка графика в пуле процессов")
+THROTTLED = REGISTRY.counter("bot_throttled_total", "Запросы, отклонённые ограничением частоты", ("kind",))
+
+
+def timed_query(fn):
+    """Декоратор для функций db.py: время каждого вызова в bot_db_query_seconds."""
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - started, query=name)
+
+    return wrapper
+
+
+# ===== aiogram =====
+
+class HandlerTimingMiddleware(BaseMiddleware):
+    """Внутренний middleware роутера: время хэндлера с именем и состоянием FSM."""
+
+    async def __call__(self, handler, event, data):
+        handler_obj = data.get("handler")
+        name = getattr(getattr(handler_obj, "callback", None), "__name__", "unknown")
+        state = data.get("raw_state") or "none"
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(handler=name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, handler=name, state=state)
+
+
+class ApiTimingMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: время каждого вызова Bot API по имени метода."""
+
+    async def __call__(self, make_request, bot, method):
+        with API_SECONDS.time(method=type(method).__name__):
+            return await make_request(bot, method)
+
+
+def instrument_router(router):
+    middleware = HandlerTimingMiddleware()
+    router.message.middleware(middleware)
+    router.callback_query.middleware(middleware)
+
+
+def instrument_bot(bot):
+    bot.session.middleware(ApiTimingMiddleware())
+
+
+# ===== HTTP =====
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=REGISTRY.render(), content_type="text/plain", charset="utf-8")
+
+
+def add_routes(app: web.Application, path: str = "/metrics"):
+    app.router.add_get(path, metrics_handler)
+
+
+async def start_server(host: str, port: int) -> web.AppRunner:
+    """Отдельный HTTP-сервер только для /metrics: не на публичном порту webhook."""
+    app = web.Application()
+    add_routes(app)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    log.info("Метрики: http://%s:%d/metrics", host, port)
+    return runner
@@ -0,0 +1,373 @@
+# migrations.py — версионированные миграции схемы workout.db
+#
+# Каждая миграция — пара (версия, описание, функция). Функции выполняются по
+# порядку внутри отдельной транзакции и никогда не меняются после релиза:
+# SQL в них — снимок схемы на момент миграции, а не текущая схема.
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+
+async def _m001_base(db):
+    """Исходная схема: entries + body_params (ts — ISO-строка)."""
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS entries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        exercise TEXT NOT NULL,
+        reps INTEGER NOT NULL,
+        weight REAL,
+        ts TEXT NOT NULL
+    );
+    """)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_entries_user_ts ON entries(user_id, ts);")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_entries_exercise_ts ON entries(exercise, ts);")
+
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS body_params (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        height_cm REAL,
+        weight_kg REAL,
+        ts TEXT NOT NULL
+    );
+    """)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_body_user_ts ON body_params(user_id, ts);")
+
+
+async def _m002_daily_rollup(db):
+    """Дневные агрегаты daily_rollup, поддерживаемые триггером."""
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS daily_rollup (
+        user_id INTEGER NOT NULL,
+        exercise TEXT NOT NULL,
+        day TEXT NOT NULL,
+        total_reps INTEGER NOT NULL DEFAULT 0,
+        total_volume REAL NOT NULL DEFAULT 0,
+        sets INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, exercise, day)
+    ) WITHOUT ROWID;
+    """)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_rollup_user_day ON daily_rollup(user_id, day);")
+    await db.execute("DROP TRIGGER IF EXISTS trg_entries_rollup;")
+    await db.execute("""
+    CREATE TRIGGER trg_entries_rollup AFTER INSERT ON entries
+    BEGIN
+        INSERT INTO daily_rollup (user_id, exercise, day, total_reps, total_volume, sets)
+        VALUES (NEW.user_id, NEW.exercise, substr(NEW.ts, 1, 10), NEW.reps,
+                CASE WHEN NEW.weight IS NOT NULL THEN NEW.reps * NEW.weight ELSE 0 END, 1)
+        ON CONFLICT (user_id, exercise, day) DO UPDATE SET
+            total_reps = total_reps + excluded.total_reps,
+            total_volume = total_volume + excluded.total_volume,
+            sets = sets + 1;
+    END;
+    """)
+    await db.execute("DELETE FROM daily_rollup;")
+    await db.execute("""
+    INSERT INTO daily_rollup (user_id, exercise, day, total_reps, total_volume, sets)
+    SELECT user_id, exercise, substr(ts, 1, 10),
+           SUM(reps), SUM(CASE WHEN weight IS NOT NULL THEN reps*weight ELSE 0 END), COUNT(*)
+    FROM entries
+    GROUP BY user_id, exercise, substr(ts, 1, 10);
+    """)
+
+
+async def _m003_epoch_ts(db):
+    """ts в entries/body_params: ISO-строка → целые секунды эпохи (UTC)."""
+    # strftime('%s') понимает и дробные секунды, и суффикс часового пояса
+    await db.execute("""
+    CREATE TABLE entries_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        exercise TEXT NOT NULL,
+        reps INTEGER NOT NULL,
+        weight REAL,
+        ts INTEGER NOT NULL
+    );
+    """)
+    await db.execute("""
+    INSERT INTO entries_new (id, user_id, exercise, reps, weight, ts)
+    SELECT id, user_id, exercise, reps, weight, CAST(strftime('%s', ts) AS INTEGER) FROM entries;
+    """)
+    await db.execute("DROP TABLE entries;")  # вместе с индексами и триггером
+    await db.execute("ALTER TABLE entries_new RENAME TO entries;")
+    await db.execute("CREATE INDEX idx_entries_user_ts ON entries(user_id, ts);")
+    await db.execute("CREATE INDEX idx_entries_user_exercise_ts ON entries(user_id, exercise, ts);")
+    await db.execute("""
+    CREATE TRIGGER trg_entries_rollup AFTER INSERT ON entries
+    BEGIN
+        INSERT INTO daily_rollup (user_id, exercise, day, total_reps, total_volume, sets)
+        VALUES (NEW.user_id, NEW.exercise, date(NEW.ts, 'unixepoch'), NEW.reps,
+                CASE WHEN NEW.weight IS NOT NULL THEN NEW.reps * NEW.weight ELSE 0 END, 1)
+        ON CONFLICT (user_id, exercise, day) DO UPDATE SET
+            total_reps = total_reps + excluded.total_reps,
+            total_volume = total_volume + excluded.total_volume,
+            sets = sets + 1;
+    END;
+    """)
+
+    await db.execute("""
+    CREATE TABLE body_params_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        height_cm REAL,
+        weight_kg REAL,
+        ts INTEGER NOT NULL
+    );
+    """)
+    await db.execute("""
+    INSERT INTO body_params_new (id, user_id, height_cm, weight_kg, ts)
+    SELECT id, user_id, height_cm, weight_kg, CAST(strftime('%s', ts) AS INTEGER) FROM body_params;
+    """)
+    await db.execute("DROP TABLE body_params;")
+    await db.execute("ALTER TABLE body_params_new RENAME TO body_params;")
+    await db.execute("CREATE INDEX idx_body_user_ts ON body_params(user_id, ts);")
+
+
+async def _m004_exercise_ids(db):
+    """Справочник exercises; entries и daily_rollup ссылаются на него по целому id."""
+    await db.execute("""
+    CREATE TABLE exercises (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE,
+        code TEXT UNIQUE,
+        category TEXT,
+        aliases TEXT NOT NULL DEFAULT ''
+    );
+    """)
+    # Каталог досеивается при старте (db.sync_catalog), здесь — только то, что уже есть в данных
+    await db.execute("INSERT OR IGNORE INTO exercises (name) SELECT DISTINCT exercise FROM entries;")
+
+    await db.execute("""
+    CREATE TABLE entries_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        exercise_id INTEGER NOT NULL REFERENCES exercises(id),
+        reps INTEGER NOT NULL,
+        weight REAL,
+        ts INTEGER NOT NULL
+    );
+    """)
+    await db.execute("""
+    INSERT INTO entries_new (id, user_id, exercise_id, reps, weight, ts)
+    SELECT e.id, e.user_id, x.id, e.reps, e.weight, e.ts
+    FROM entries e JOIN exercises x ON x.name = e.exercise;
+    """)
+    await db.execute("DROP TABLE entries;")
+    await db.execute("ALTER TABLE entries_new RENAME TO entries;")
+    await db.execute("CREATE INDEX idx_entries_user_ts ON entries(user_id, ts);")
+    await db.execute("CREATE INDEX idx_entries_user_exercise_ts ON entries(user_id, exercise_id, ts);")
+
+    await db.execute("""
+    CREATE TABLE daily_rollup_new (
+        user_id INTEGER NOT NULL,
+        exercise_id INTEGER NOT NULL,
+        day TEXT NOT NULL,
+        total_reps INTEGER NOT NULL DEFAULT 0,
+        total_volume REAL NOT NULL DEFAULT 0,
+        sets INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, exercise_id, day)
+    ) WITHOUT ROWID;
+    """)
+    await db.execute("""
+    INSERT INTO daily_rollup_new (user_id, exercise_id, day, total_reps, total_volume, sets)
+    SELECT r.user_id, x.id, r.day, r.total_reps, r.total_volume, r.sets
+    FROM daily_rollup r JOIN exercises x ON x.name = r.exercise;
+    """)
+    await db.execute("DROP TABLE daily_rollup;")
+    await db.execute("ALTER TABLE daily_rollup_new RENAME TO daily_rollup;")
+    await db.execute("CREATE INDEX idx_rollup_user_day ON daily_rollup(user_id, day);")
+    await db.execute("""
+    CREATE TRIGGER trg_entries_rollup AFTER INSERT ON entries
+    BEGIN
+        INSERT INTO daily_rollup (user_id, exercise_id, day, total_reps, total_volume, sets)
+        VALUES (NEW.user_id, NEW.exercise_id, date(NEW.ts, 'unixepoch'), NEW.reps,
+                CASE WHEN NEW.weight IS NOT NULL THEN NEW.reps * NEW.weight ELSE 0 END, 1)
+        ON CONFLICT (user_id, exercise_id, day) DO UPDATE SET
+            total_reps = total_reps + excluded.total_reps,
+            total_volume = total_volume + excluded.total_volume,
+            sets = sets + 1;
+    END;
+    """)
+
+
+async def _m005_fsm_state(db):
+    """Состояния FSM aiogram (переживают рестарт и общие для нескольких процессов)."""
+    await db.execute("""
+    CREATE TABLE fsm_state (
+        key TEXT PRIMARY KEY,
+        state TEXT,
+        data TEXT,
+        expires_at INTEGER
+    ) WITHOUT ROWID;
+    """)
+    await db.execute("CREATE INDEX idx_fsm_expires ON fsm_state(expires_at);")
+
+
+async def _m006_personal_records(db):
+    """Личные рекорды по упражнениям, поддерживаемые триггерами entries и daily_rollup."""
+    await db.execute("""
+    CREATE TABLE personal_records (
+        user_id INTEGER NOT NULL,
+        exercise_id INTEGER NOT NULL,
+        max_weight REAL,
+        max_weight_reps INTEGER,
+        max_weight_ts INTEGER,
+        e1rm REAL,
+        e1rm_weight REAL,
+        e1rm_reps INTEGER,
+        e1rm_ts INTEGER,
+        best_day TEXT,
+        best_day_volume REAL,
+        PRIMARY KEY (user_id, exercise_id)
+    ) WITHOUT ROWID;
+    """)
+    # Максимум повторов на каждом весе (0 — без веса)
+    await db.execute("""
+    CREATE TABLE rep_records (
+        user_id INTEGER NOT NULL,
+        exercise_id INTEGER NOT NULL,
+        weight REAL NOT NULL,
+        reps INTEGER NOT NULL,
+        ts INTEGER NOT NULL,
+        PRIMARY KEY (user_id, exercise_id, weight)
+    ) WITHOUT ROWID;
+    """)
+    # Ничьи: при равном результате рекордом остаётся более ранний подход/день.
+    # e1RM — формула Эпли, только для подходов до 12 повторов.
+    await db.execute("""
+    CREATE TRIGGER trg_entries_records AFTER INSERT ON entries
+    BEGIN
+        INSERT INTO personal_records (user_id, exercise_id) VALUES (NEW.user_id, NEW.exercise_id)
+        ON CONFLICT (user_id, exercise_id) DO NOTHING;
+
+        UPDATE personal_records
+        SET max_weight = NEW.weight, max_weight_reps = NEW.reps, max_weight_ts = NEW.ts
+        WHERE user_id = NEW.user_id AND exercise_id = NEW.exercise_id AND NEW.weight > 0
+          AND (max_weight IS NULL OR NEW.weight > max_weight
+               OR (NEW.weight = max_weight AND (NEW.reps > max_weight_reps
+                   OR (NEW.reps = max_weight_reps AND NEW.ts < max_weight_ts))));
+
+        UPDATE personal_records
+        SET e1rm = CASE WHEN NEW.reps = 1 THEN NEW.weight ELSE NEW.weight * (1 + NEW.reps / 30.0) END,
+            e1rm_weight = NEW.weight, e1rm_reps = NEW.reps, e1rm_ts = NEW.ts
+        WHERE user_id = NEW.user_id AND exercise_id = NEW.exercise_id
+          AND NEW.weight > 0 AND NEW.reps BETWEEN 1 AND 12
+          AND (e1rm IS NULL
+               OR CASE WHEN NEW.reps = 1 THEN NEW.weight ELSE NEW.weight * (1 + NEW.reps / 30.0) END > e1rm
+               OR (CASE WHEN NEW.reps = 1 THEN NEW.weight ELSE NEW.weight * (1 + NEW.reps / 30.0) END = e1rm
+                   AND NEW.ts < e1rm_ts));
+
+        INSERT INTO rep_records (user_id, exercise_id, weight, reps, ts)
+        VALUES (NEW.user_id, NEW.exercise_id, COALESCE(NEW.weight, 0), NEW.reps, NEW.ts)
+        ON CONFLICT (user_id, exercise_id, weight) DO UPDATE SET reps = excluded.reps, ts = excluded.ts
+        WHERE excluded.reps > rep_records.reps OR (excluded.reps = rep_records.reps AND excluded.ts < rep_records.ts);
+    END;
+    """)
+    # Лучший день по объёму — из дневного агрегата, при его вставке и обновлении
+    for event in ("INSERT", "UPDATE OF total_volume"):
+        name = "trg_rollup_records_" + event.split()[0].lower()
+        await db.execute(f"""
+        CREATE TRIGGER {name} AFTER {event} ON daily_rollup
+        WHEN NEW.total_volume > 0
+        BEGIN
+            INSERT INTO personal_records (user_id, exercise_id, best_day, best_day_volume)
+            VALUES (NEW.user_id, NEW.exercise_id, NEW.day, NEW.total_volume)
+            ON CONFLICT (user_id, exercise_id) DO UPDATE SET
+                best_day = excluded.best_day, best_day_volume = excluded.best_day_volume
+            WHERE best_day_volume IS NULL OR excluded.best_day_volume > best_day_volume
+               OR (excluded.best_day_volume = best_day_volume AND excluded.best_day < best_day);
+        END;
+        """)
+    # Существующая история: заполняем теми же правилами одним набором запросов
+    await db.execute("""
+    INSERT INTO personal_records (user_id, exercise_id)
+    SELECT DISTINCT user_id, exercise_id FROM entries;
+    """)
+    await db.execute("""
+    INSERT INTO rep_records (user_id, exercise_id, weight, reps, ts)
+    SELECT user_id, exercise_id, w, reps, ts FROM (
+        SELECT user_id, exercise_id, COALESCE(weight, 0) AS w, reps, ts,
+               ROW_NUMBER() OVER (PARTITION BY user_id, exercise_id, COALESCE(weight, 0)
+                                  ORDER BY reps DESC, ts, id) AS rn
+        FROM entries
+    ) WHERE rn = 1;
+    """)
+    await db.execute("""
+    UPDATE personal_records AS p SET max_weight = b.weight, max_weight_reps = b.reps, max_weight_ts = b.ts
+    FROM (
+        SELECT user_id, exercise_id, weight, reps, ts,
+               ROW_NUMBER() OVER (PARTITION BY user_id, exercise_id ORDER BY weight DESC, reps DESC, ts, id) AS rn
+        FROM entries WHERE weight > 0
+    ) AS b
+    WHERE b.rn = 1 AND p.user_id = b.user_id AND p.exercise_id = b.exercise_id;
+    """)
+    await db.execute("""
+    UPDATE personal_records AS p SET e1rm = b.e1rm, e1rm_weight = b.weight, e1rm_reps = b.reps, e1rm_ts = b.ts
+    FROM (
+        SELECT user_id, exercise_id, weight, reps, ts, e1rm,
+               ROW_NUMBER() OVER (PARTITION BY user_id, exercise_id ORDER BY e1rm DESC, ts, id) AS rn
+        FROM (
+            SELECT *, CASE WHEN reps = 1 THEN weight ELSE weight * (1 + reps / 30.0) END AS e1rm
+            FROM entries WHERE weight > 0 AND reps BETWEEN 1 AND 12
+        )
+    ) AS b
+    WHERE b.rn = 1 AND p.user_id = b.user_id AND p.exercise_id = b.exercise_id;
+    """)
+    await db.execute("""
+    UPDATE personal_records AS p SET best_day = b.day, best_day_volume = b.total_volume
+    FROM (
+        SELECT user_id, exercise_id, day, total_volume,
+               ROW_NUMBER() OVER (PARTITION BY user_id, exercise_id ORDER BY total_volume DESC, day) AS rn
+        FROM daily_rollup WHERE total_volume > 0
+    ) AS b
+    WHERE b.rn = 1 AND p.user_id = b.user_id AND p.exercise_id = b.exercise_id;
+    """)
+
+
+# Порядок важен: новые миграции только дописываются в конец
+MIGRATIONS = [
+    (1, "base schema", _m001_base),
+    (2, "daily rollup", _m002_daily_rollup),
+    (3, "epoch timestamps", _m003_epoch_ts),
+    (4, "exercise ids", _m004_exercise_ids),
+    (5, "fsm state", _m005_fsm_state),
+    (6, "personal records", _m006_personal_records),
+]
+
+
+async def current_version(db) -> int:
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at INTEGER NOT NULL
+    );
+    """)
+    async with db.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version") as cur:
+        (version,) = await cur.fetchone()
+    return version
+
+
+async def migrate(db) -> int:
+    """Применить все недостающие миграции. Возвращает итоговую версию схемы."""
+    version = await current_version(db)
+    for number, name, step in MIGRATIONS:
+        if number <= version:
+            continue
+        log.info("Миграция БД %d: %s", number, name)
+        # Явный BEGIN: иначе sqlite3 выполняет DDL вне транзакции
+        await db.execute("BEGIN;")
+        try:
+            await step(db)
+            await db.execute(
+                "INSERT INTO schema_version (version, name, applied_at) VALUES (?,?,?)",
+                (number, name, int(time.time()))
+            )
+            await db.commit()
+        except BaseException:
+            await db.rollback()
+            raise
+        version = number
+    return version
@@ -0,0 +1,133 @@
+# parsing.py — разбор быстрого ввода: один или несколько подходов в сообщении
+#
+# Поддерживаемые формы (по строке на упражнение, строки можно разделять «;»):
+#   отжимания 15                  — один подход, только повторы
+#   жим лёжа 8 40                 — повторы и вес через пробел (старый формат)
+#   жим 10x60, 8x65, 6x70         — подходы через запятую: повторы x вес
+#   присед 3x5x100                — 3 подхода по 5 повторов с весом 100
+#   подтягивания 10, 8, 6         — только повторы
+# Вместо «x» можно писать «х», «×» или «*», вес — с «кг». Десятичная запятая
+# только в старом формате («жим 8 42,5»): после «x» запятая — всегда разделитель
+# подходов, а «10x60,5» не угадываем (60.5 кг или ещё подход на 5?) и не принимаем.
+import re
+from dataclasses import dataclass, field
+from typing import Optional
+
+MAX_REPS = 10_000
+MAX_WEIGHT = 1_000.0
+MAX_SERIES = 20  # «3x5x100»: не больше 20 одинаковых подходов
+MAX_SETS = 100  # всего подходов в одном сообщении
+
+_X = r"\s*[xхXХ×*]\s*"
+_NUM = r"\d+(?:\.\d{1,2})?"
+_LEGACY_NUM = r"\d+(?:[.,]\d{1,2})?"
+LINE_RE = re.compile(r"^(?!/)(?P<name>[^\d\n,;]+?)\s+(?P<sets>\d.*?)$")
+LEGACY_RE = re.compile(r"^(?P<reps>\d+)\s+(?P<weight>" + _LEGACY_NUM + r")(?:\s*(?:кг|kg))?$", re.I)
+SET_RE = re.compile(
+    r"(?:(?P<series>\d+)" + _X + r"(?=\d+" + _X + r"))?"
+    r"(?P<reps>\d+)"
+    r"(?:" + _X + r"(?P<weight>" + _NUM + r"))?"
+    r"(?:\s*(?:кг|kg))?",
+    re.I,
+)
+SEP_RE = re.compile(r"\s*[,]\s*")
+# «10x60,5» / «10x60,12»: число сразу за весом через запятую без пробела и без «x»
+AMBIGUOUS_RE = re.compile(r",\d+(?!\d|" + _X + r")")
+LINE_SPLIT_RE = re.compile(r"[\n;]+")
+
+
+@dataclass
+class ParsedLine:
+    exercise: str
+    sets: list  # [(повторы, вес или None)]
+
+
+@dataclass
+class Workout:
+    lines: list = field(default_factory=list)  # ParsedLine
+    errors: list = field(default_factory=list)  # строки, которые не разобрались
+
+    @property
+    def total_sets(self) -> int:
+        return sum(len(line.sets) for line in self.lines)
+
+
+def _weight(text: Optional[str]) -> Optional[float]:
+    if text is None:
+        return None
+    weight = float(text.replace(",", "."))
+    if weight > MAX_WEIGHT:
+        raise ValueError
+    return weight
+
+
+def _reps(text: str) -> int:
+    reps = int(text)
+    if not 0 < reps <= MAX_REPS:
+        raise ValueError
+    return reps
+
+
+def parse_sets(text: str) -> Optional[list]:
+    """«10x60, 8x65» -> [(10, 60.0), (8, 65.0)]; None, если строка не по грамматике."""
+    text = text.strip()
+    legacy = LEGACY_RE.match(text)
+    try:
+        if legacy:
+            return [(_reps(legacy["reps"]), _weight(legacy["weight"]))]
+        sets, pos = [], 0
+        while True:
+            m = SET_RE.match(text, pos)
+            if not m:
+                return None
+            series = int(m["series"]) if m["series"] else 1
+            if not 0 < series <= MAX_SERIES:
+                return None
+            sets.extend([(_reps(m["reps"]), _weight(m["weight"]))] * series)
+            pos = m.end()
+            if m["weight"] and pos == m.end("weight") and AMBIGUOUS_RE.match(text, pos):
+                return None
+            if pos == len(text):
+                return sets
+            sep = SEP_RE.match(text, pos)
+            if not sep or sep.end() == len(text):
+                return None
+            pos = sep.end()
+    except ValueError:
+        return None
+
+
+def looks_like_sets(line: str) -> bool:
+    """Строка по форме быстрого ввода («название число…»), даже если числа не разобрались."""
+    return LINE_RE.match(line.strip()) is not None
+
+
+def parse_line(line: str) -> Optional[ParsedLine]:
+    m = LINE_RE.match(line.strip())
+    if not m:
+        return None
+    sets = parse_sets(m["sets"])
+    if not sets:
+        return None
+    return ParsedLine(" ".join(m["name"].split()), sets)
+
+
+def parse_workout(text: str) -> Workout:
+    """Разобрать всё сообщение; строки с ошибками попадают в ``errors``."""
+    workout = Workout()
+    for raw in LINE_SPLIT_RE.split(text or ""):
+        if not raw.strip():
+            continue
+        parsed = parse_line(raw)
+        if parsed is None:
+            workout.errors.append(raw.strip())
+        else:
+            workout.lines.append(parsed)
+    if workout.total_sets > MAX_SETS:
+        workout.errors.append(f"больше {MAX_SETS} подходов в одном сообщении")
+    return workout
+
+
+def format_sets(sets: list) -> str:
+    """[(10, 60.0), (8, None)] -> «10×60, 8»."""
+    return ", ".join(f"{reps}×{weight:g}" if weight is not None else str(reps) for reps, weight in sets)
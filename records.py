@@ -0,0 +1,66 @@
+# records.py — личные рекорды: правила подсчёта для пересчёта по истории
+#
+# В работе бота таблицы personal_records и rep_records ведут триггеры
+# (миграция 6), каждый новый подход обновляет их в той же транзакции.
+# Здесь — те же правила на Python для db.backfill_records, который пересчитывает
+# всё за один проход по entries, упорядоченным по (user_id, exercise_id, ts, id).
+# При равном результате рекордом остаётся более ранний подход (и более ранний день).
+from typing import Optional
+
+E1RM_MAX_REPS = 12  # дальше формула Эпли слишком сильно врёт
+
+
+def estimate_1rm(weight: Optional[float], reps: int) -> Optional[float]:
+    """Расчётный разовый максимум по Эпли; None — подход без веса или слишком длинный."""
+    if not weight or weight <= 0 or not 1 <= reps <= E1RM_MAX_REPS:
+        return None
+    return weight if reps == 1 else weight * (1 + reps / 30.0)
+
+
+class ExerciseRecords:
+    """Рекорды одного упражнения одного пользователя, накапливаемые по подходам."""
+
+    __slots__ = ("user_id", "exercise_id", "max_weight", "e1rm", "reps_at", "_day", "_day_volume", "best_day")
+
+    def __init__(self, user_id: int, exercise_id: int):
+        self.user_id = user_id
+        self.exercise_id = exercise_id
+        self.max_weight = None  # (вес, повторы, ts)
+        self.e1rm = None  # (e1RM, вес, повторы, ts)
+        self.reps_at: dict = {}  # вес (0 — без веса) -> (повторы, ts)
+        self._day = None
+        self._day_volume = 0.0
+        self.best_day = None  # (день, объём)
+
+    def add(self, reps: int, weight: Optional[float], ts: int, day: str):
+        """Учесть подход; подходы должны приходить по возрастанию (ts, id)."""
+        if weight is not None and weight > 0:
+            if self.max_weight is None or (weight, reps) > self.max_weight[:2]:
+                self.max_weight = (weight, reps, ts)
+            e1rm = estimate_1rm(weight, reps)
+            if e1rm is not None and (self.e1rm is None or e1rm > self.e1rm[0]):
+                self.e1rm = (e1rm, weight, reps, ts)
+        key = weight if weight is not None else 0
+        best = self.reps_at.get(key)
+        if best is None or reps > best[0]:
+            self.reps_at[key] = (reps, ts)
+        if day != self._day:
+            self._close_day()
+            self._day = day
+        if weight is not None:
+            self._day_volume += reps * weight
+
+    def _close_day(self):
+        if self._day_volume > 0 and (self.best_day is None or self._day_volume > self.best_day[1]):
+            self.best_day = (self._day, self._day_volume)
+        self._day_volume = 0.0
+
+    def finish(self) -> tuple:
+        """Строки для вставки: (строка personal_records, [строки rep_records])."""
+        self._close_day()
+        mw = self.max_weight or (None, None, None)
+        e1 = self.e1rm or (None, None, None, None)
+        bd = self.best_day or (None, None)
+        record = (self.user_id, self.exercise_id, *mw, *e1, *bd)
+        reps = [(self.user_id, self.exercise_id, w, r, ts) for w, (r, ts) in self.reps_at.items()]
+        return record, reps
@@ -0,0 +1,168 @@
+# resolver.py — нечёткое сопоставление введённого названия с известным упражнением
+from bisect import bisect_left
+from collections import Counter
+from typing import Iterable, Optional
+
+from catalog import normalize_name
+
+# Порог похожести по триграммам (коэффициент Дайса) — для названия целиком
+MIN_SIMILARITY = 0.6
+# и для каждого слова: «сгибание рук» не должно стать «сгибанием ног»
+MIN_WORD_SIMILARITY = 0.5
+# Префикс засчитывается, если он не короче 4 букв и покрывает половину названия
+MIN_PREFIX_LEN = 4
+MIN_PREFIX_RATIO = 0.5
+
+
+def trigrams(text: str) -> set:
+    # «ё» и «е» для похожести одно и то же: «жим лежа» ≈ «жим лёжа»
+    padded = f"  {text.replace('ё', 'е')} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def dice(a: set, b: set) -> float:
+    return 2 * len(a & b) / (len(a) + len(b)) if a or b else 0.0
+
+
+def _word_matches(word: str, others: list) -> bool:
+    for other in others:
+        if word.replace("ё", "е") == other.replace("ё", "е"):
+            return True
+        short, long_ = sorted((word, other), key=len)
+        if len(short) >= MIN_PREFIX_LEN and long_.startswith(short):
+            return True
+        if dice(trigrams(word), trigrams(other)) >= MIN_WORD_SIMILARITY:
+            return True
+    return False
+
+
+def words_match(a: str, b: str) -> bool:
+    """Каждому слову одного названия нашлась пара в другом (точно, префиксом или с опечаткой)."""
+    wa, wb = a.split(), b.split()
+    return all(_word_matches(w, wb) for w in wa) and all(_word_matches(w, wa) for w in wb)
+
+
+class ExerciseResolver:
+    """Индекс названий упражнений: точное совпадение, префикс, триграммы.
+
+    Точное совпадение, синоним и единственный префикс однозначны — так
+    названия разрешаются и при записи. Похожесть по триграммам только
+    догадка: её используют чтения (/progress, /chart), а запись показывает
+    как подсказку, которую пользователь подтверждает.
+
+    Кандидаты для пользователя — каталог плюс названия, которые он сам уже
+    записывал. Индекс строится один раз при старте и дополняется по мере
+    появления новых названий, поэтому resolve() не ходит в БД.
+    """
+
+    def __init__(self):
+        self._canonical: dict = {}  # имя или синоним -> каноническое имя
+        self._catalog: set = set()
+        self._user_names: dict = {}  # user_id -> set(имён)
+        self._sorted: list = []  # все имена по алфавиту — для поиска по префиксу
+        self._grams: dict = {}  # триграмма -> set(имён)
+        self._gram_count: dict = {}  # имя -> число триграмм
+
+    def _index(self, name: str):
+        if name in self._gram_count:
+            return
+        grams = trigrams(name)
+        self._gram_count[name] = len(grams)
+        for g in grams:
+            self._grams.setdefault(g, set()).add(name)
+        self._sorted.insert(bisect_left(self._sorted, name), name)
+
+    def build(self, catalog: Iterable[tuple], usage: Iterable[tuple]):
+        """catalog: (имя, [синонимы]); usage: (user_id, имя)."""
+        self.__init__()
+        for name, aliases in catalog:
+            self._catalog.add(name)
+            self._canonical[name] = name
+            self._index(name)
+            for alias in aliases:
+                self._canonical.setdefault(alias, name)
+        for user_id, name in usage:
+            self.remember(user_id, name)
+
+    def remember(self, user_id: int, name: str):
+        """Запомнить название, которое пользователь записал (инкрементально)."""
+        name = normalize_name(name)
+        names = self._user_names.setdefault(user_id, set())
+        if name in names:
+            return
+        names.add(name)
+        self._canonical.setdefault(name, name)
+        self._index(name)
+
+    def _candidates(self, user_id: int) -> set:
+        return self._catalog | self._user_names.get(user_id, set())
+
+    def resolve(self, user_id: int, text: str, fuzzy: bool = True) -> Optional[str]:
+        """Каноническое имя для ввода пользователя или None, если похожего нет.
+
+        fuzzy=False — только однозначные совпадения (для записи подходов).
+        """
+        key = " ".join(normalize_name(text).split())
+        if not key:
+            return None
+        strict = self._resolve_strict(user_id, key)
+        if strict is not None or not fuzzy:
+            return strict
+        return self._similar(user_id, key)
+
+    def suggest(self, user_id: int, text: str) -> Optional[str]:
+        """Похожее известное название для ввода, которое не разрешилось однозначно."""
+        key = " ".join(normalize_name(text).split())
+        if not key or self._resolve_strict(user_id, key) is not None:
+            return None
+        return self._similar(user_id, key)
+
+    def _resolve_strict(self, user_id: int, key: str) -> Optional[str]:
+        allowed = self._candidates(user_id)
+        exact = self._canonical.get(key)
+        if exact is not None and exact in allowed:
+            return exact
+
+        # Префикс: «присед» -> «приседания», если вариант единственный
+        if len(key) >= MIN_PREFIX_LEN:
+            hits = []
+            i = bisect_left(self._sorted, key)
+            while i < len(self._sorted) and self._sorted[i].startswith(key):
+                name = self._sorted[i]
+                if name in allowed and len(key) >= MIN_PREFIX_RATIO * len(name):
+                    hits.append(name)
+                i += 1
+            if len(hits) == 1:
+                return hits[0]
+        return None
+
+    def _similar(self, user_id: int, key: str) -> Optional[str]:
+        # Триграммы: считаем общие у ввода и каждого кандидата
+        allowed = self._candidates(user_id)
+        grams = trigrams(key)
+        overlap = Counter()
+        for g in grams:
+            for name in self._grams.get(g, ()):
+                if name in allowed:
+                    overlap[name] += 1
+        scored = sorted(
+            ((2 * common / (len(grams) + self._gram_count[name]), name) for name, common in overlap.items()),
+            reverse=True,
+        )
+        for score, name in scored:
+            if score < MIN_SIMILARITY:
+                break
+            # Общие слова ещё не значат, что упражнение то же: сверяем слова попарно
+            if words_match(key, name):
+                return name
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "names": len(self._gram_count),
+            "catalog": len(self._catalog),
+            "users": len(self._user_names),
+        }
+
+
+resolver = ExerciseResolver()
@@ -0,0 +1,244 @@
+# sender.py — очередь исходящих запросов к Telegram с учётом лимитов
+#
+# Telegram ограничивает рассылку: порядка 30 сообщений в секунду на бота и
+# около одного в секунду в один чат (короткие всплески допускаются). При
+# превышении приходит 429 с retry_after. SendScheduler ставится middleware
+# в сессию бота и пропускает запросы так, чтобы в лимиты не упираться:
+#   • полоса 0 — ответы на callback/inline (пользователь ждёт «часики») и
+#     «печатает…» (sendChatAction): это не сообщения, початовый лимит не тратят;
+#   • полоса 1 — текст, правки сообщений;
+#   • полоса 2 — фото и документы (тяжёлые и не срочные).
+# Служебные методы (getUpdates, getFile, setWebhook…) идут мимо очереди.
+# В один чат одновременно летит не больше одного сообщения: следующее
+# уходит после ответа на предыдущее, так что повтор после 429 не обгоняют.
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Optional
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+from throttling import Limit, TokenBucket
+
+log = logging.getLogger(__name__)
+
+LANE_ANSWER, LANE_TEXT, LANE_MEDIA = 0, 1, 2
+LANE_NAMES = ("answer", "text", "media")
+
+_MEDIA = ("Photo", "Document", "MediaGroup", "Video", "Animation", "Audio", "Voice", "LivePhoto", "PaidMedia")
+# Сколько элементов полосы просматривать в поисках чата, которому уже можно слать
+SCAN_LIMIT = 64
+
+
+def lane_of(method) -> Optional[int]:
+    name = type(method).__name__
+    if name.startswith("Answer") or name == "SendChatAction":
+        return LANE_ANSWER
+    if not name.startswith(("Send", "Edit", "Copy", "Forward")):
+        return None
+    if name.endswith(_MEDIA):
+        return LANE_MEDIA
+    return LANE_TEXT
+
+
+class _Request:
+    __slots__ = ("lane", "chat_id", "make_request", "bot", "method", "future", "attempts", "queued_at")
+
+    def __init__(self, lane, chat_id, make_request, bot, method, future, now):
+        self.lane, self.chat_id = lane, chat_id
+        self.make_request, self.bot, self.method = make_request, bot, method
+        self.future = future
+        self.attempts = 0
+        self.queued_at = now
+
+
+class SendScheduler(BaseRequestMiddleware):
+    """Планировщик исходящих запросов: глобальный и початовый лимиты, приоритеты, 429.
+
+    Для вызывающего кода ничего не меняется: ``await bot.send_message(...)``
+    возвращает результат, когда запрос реально выполнен.
+    """
+
+    def __init__(
+            self,
+            global_limit: Limit = Limit(rate=30.0, burst=30),
+            chat_limit: Limit = Limit(rate=1.0, burst=3),
+            max_retries: int = 3
+    ):
+        self.global_limit = global_limit
+        self.chat_limit = chat_limit
+        self.max_retries = max_retries
+        self._lanes = [deque() for _ in LANE_NAMES]
+        self._global: Optional[TokenBucket] = None
+        self._chats: dict = {}  # chat_id -> TokenBucket
+        self._blocked: dict = {}  # chat_id (None — весь бот) -> monotonic до которого ждём после 429
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: set = set()
+        self._busy: set = set()  # чаты, сообщение в которые сейчас в полёте
+        # Метрики
+        self.sent = [0] * len(LANE_NAMES)
+        self.retried = 0
+        self.failed = 0
+        self.max_wait = 0.0
+
+    async def __call__(self, make_request, bot, method):
+        lane = lane_of(method)
+        if lane is None:
+            return await make_request(bot, method)
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run(), name="send-scheduler")
+        future = loop.create_future()
+        chat_id = getattr(method, "chat_id", None)
+        self._lanes[lane].append(_Request(lane, chat_id, make_request, bot, method, future, time.monotonic()))
+        self._wakeup.set()
+        return await future
+
+    # ===== Выбор следующего запроса =====
+
+    def _chat_bucket(self, chat_id, now: float) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 10_000:
+                # Забываем чаты, чьи вёдра давно наполнились
+                self._chats = {k: b for k, b in self._chats.items() if not b.idle_full(now)}
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_limit, now)
+        return bucket
+
+    @staticmethod
+    def _per_chat(req: _Request) -> bool:
+        # Ответы на callback и «печатает…» не считаются сообщениями в чат
+        return req.lane != LANE_ANSWER and req.chat_id is not None
+
+    def _chat_wait(self, req: _Request, now: float) -> float:
+        wait = max(self._blocked.get(req.chat_id, 0.0) - now, 0.0)
+        if not self._per_chat(req):
+            return wait
+        return max(wait, self._chat_bucket(req.chat_id, now).wait_time(now))
+
+    def _pick(self, now: float) -> tuple:
+        """(запрос или None, сколько ждать до следующей попытки)."""
+        wait = max(self._global.wait_time(now), self._blocked.get(None, 0.0) - now)
+        if wait > 0:
+            return None, wait
+        soonest = None
+        for lane in self._lanes:
+            i = 0
+            while i < min(len(lane), SCAN_LIMIT):
+                req = lane[i]
+                if req.future.done():  # вызывающий уже отменил ожидание
+                    del lane[i]
+                    continue
+                i += 1
+                if self._per_chat(req) and req.chat_id in self._busy:
+                    continue  # разбудит завершение текущего запроса в этот чат
+                chat_wait = self._chat_wait(req, now)
+                if chat_wait <= 0:
+                    del lane[i - 1]
+                    return req, 0.0
+                soonest = chat_wait if soonest is None else min(soonest, chat_wait)
+        return None, soonest
+
+    async def _run(self):
+        try:
+            await self._loop()
+        except Exception as e:
+            # Иначе ожидающие await bot.send_message(...) повисли бы навсегда;
+            # следующий запрос запустит цикл заново
+            log.exception("Планировщик отправки упал")
+            self._fail_queued(e)
+
+    def _fail_queued(self, exc: BaseException = None):
+        for lane in self._lanes:
+            while lane:
+                req = lane.popleft()
+                if req.future.done():
+                    continue
+                if exc is None:
+                    req.future.cancel()
+                else:
+                    req.future.set_exception(exc)
+
+    async def _loop(self):
+        self._global = self._global or TokenBucket(self.global_limit, time.monotonic())
+        while True:
+            now = time.monotonic()
+            req, wait = self._pick(now)
+            if req is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._global.take(now)
+            if self._per_chat(req):
+                self._chat_bucket(req.chat_id, now).take(now)
+                self._busy.add(req.chat_id)
+            self.max_wait = max(self.max_wait, now - req.queued_at)
+            task = asyncio.create_task(self._send(req))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _send(self, req: _Request):
+        try:
+            await self._attempt(req)
+        finally:
+            if self._per_chat(req):
+                self._busy.discard(req.chat_id)
+                self._wakeup.set()
+
+    async def _attempt(self, req: _Request):
+        try:
+            result = await req.make_request(req.bot, req.method)
+        except TelegramRetryAfter as e:
+            req.attempts += 1
+            self.retried += 1
+            if req.attempts > self.max_retries:
+                self.failed += 1
+                if not req.future.done():
+                    req.future.set_exception(e)
+                return
+            # 429 в чат — ждёт только этот чат; без чата — весь бот
+            now = time.monotonic()
+            until = now + e.retry_after
+            self._blocked = {k: v for k, v in self._blocked.items() if v > now}
+            self._blocked[req.chat_id] = max(self._blocked.get(req.chat_id, 0.0), until)
+            log.warning("429 на %s (чат %s): ждём %s с", type(req.method).__name__, req.chat_id, e.retry_after)
+            self._lanes[req.lane].appendleft(req)  # в начало полосы, чтобы не нарушить порядок чата
+            self._wakeup.set()
+            return
+        except BaseException as e:
+            self.failed += 1
+            if not req.future.done():
+                req.future.set_exception(e)
+            return
+        self.sent[req.lane] += 1
+        if not req.future.done():
+            req.future.set_result(result)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # Уже отправленные запросы дожидаемся, а не бросаем посреди сессии бота
+        await asyncio.gather(*self._inflight, return_exceptions=True)
+        self._fail_queued()
+
+    def stats(self) -> dict:
+        return {
+            "queued": {name: len(lane) for name, lane in zip(LANE_NAMES, self._lanes)},
+            "sent": dict(zip(LANE_NAMES, self.sent)),
+            "retried": self.retried,
+            "failed": self.failed,
+            "max_wait_s": self.max_wait,
+            "chats": len(self._chats),
+        }
+
+
+scheduler = SendScheduler()
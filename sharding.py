@@ -0,0 +1,192 @@
+# sharding.py — несколько процессов-обработчиков, обновления делятся по user_id
+#
+# Фронт-процесс получает обновления (polling или webhook) и отправляет каждое
+# в процесс-воркер с номером user_id % N. Все обновления одного пользователя
+# попадают в один воркер и обрабатываются там строго по очереди, поэтому
+# переходы FSM не перемешиваются. Общее состояние — в SQLite (WAL + FSM в БД).
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+from typing import Optional
+
+from aiogram import Bot
+from aiohttp import web
+
+import metrics
+from throttling import Limit
+
+log = logging.getLogger(__name__)
+
+# Какие поля Update несут пользователя — берём from.id, иначе chat.id
+_EVENT_KEYS = ("message", "edited_message", "callback_query", "inline_query",
+               "my_chat_member", "chat_member", "pre_checkout_query", "shipping_query")
+
+
+def shard_key(update: dict) -> int:
+    for key in _EVENT_KEYS:
+        event = update.get(key)
+        if event:
+            if event.get("from"):
+                return int(event["from"]["id"])
+            if event.get("chat"):
+                return int(event["chat"]["id"])
+    return 0
+
+
+def shard_of(update: dict, workers: int) -> int:
+    return shard_key(update) % workers
+
+
+# ===== Воркер =====
+
+def worker_main(index: int, queue, token: str, workers: int = 1):
+    """Точка входа процесса-воркера (spawn)."""
+    logging.basicConfig(level=logging.INFO, format=f"[w{index}] %(levelname)s:%(name)s:%(message)s")
+    asyncio.run(_worker(index, queue, token, workers))
+
+
+def share_limit(limit: Limit, workers: int) -> Limit:
+    """Доля общего лимита на один воркер: N воркеров вместе не превышают исходный."""
+    return Limit(rate=limit.rate / workers, burst=max(1, limit.burst // workers))
+
+
+async def _worker(index: int, queue, token: str, workers: int = 1):
+    import main  # router и настройка сервисов — как у обычного процесса бота
+
+    await main.setup_services()
+    # Лимит Telegram ~30 сообщений/с — на бота целиком, а очередь отправки у каждого
+    # процесса своя. Початовый лимит не делим: чат целиком живёт в одном воркере.
+    main.send_scheduler.global_limit = share_limit(main.send_scheduler.global_limit, workers)
+    bot = main.build_bot(token)
+    dp = main.build_dispatcher()
+    await dp.emit_startup(bot=bot)
+    metrics_runner = None
+    if os.getenv("METRICS_PORT"):
+        # У каждого воркера свои метрики: порт METRICS_PORT + 1 + номер воркера
+        metrics_runner = await metrics.start_server(
+            os.getenv("METRICS_HOST", "127.0.0.1"), int(os.getenv("METRICS_PORT")) + 1 + index)
+    loop = asyncio.get_running_loop()
+    tails: dict = {}  # user_id -> последняя задача этого пользователя
+
+    async def process(prev: Optional[asyncio.Task], update: dict):
+        if prev is not None:
+            # Порядок важнее ошибок: предыдущее обновление просто должно завершиться
+            await asyncio.gather(prev, return_exceptions=True)
+        try:
+            await dp.feed_raw_update(bot, update)
+        except Exception:
+            log.exception("Ошибка обработки update %s", update.get("update_id"))
+
+    try:
+        while True:
+            raw = await loop.run_in_executor(None, queue.get)
+            if raw is None:
+                break
+            update = json.loads(raw)
+            user = shard_key(update)
+            task = asyncio.create_task(process(tails.get(user), update))
+            tails[user] = task
+            task.add_done_callback(lambda t, u=user: tails.pop(u, None) if tails.get(u) is t else None)
+        if tails:
+            await asyncio.gather(*tails.values(), return_exceptions=True)
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await dp.emit_shutdown(bot=bot)
+        await bot.session.close()
+        await main.shutdown_services()
+        log.info("Воркер %d остановлен", index)
+
+
+# ===== Фронт =====
+
+class ShardRouter:
+    def __init__(self, workers: int, token: str):
+        ctx = multiprocessing.get_context("spawn")
+        self.queues = [ctx.Queue() for _ in range(workers)]
+        # daemon=False: у воркера будет свой пул процессов для графиков
+        self.processes = [
+            ctx.Process(target=worker_main, args=(i, q, token, workers), name=f"bot-worker-{i}", daemon=False)
+            for i, q in enumerate(self.queues)
+        ]
+        self.routed = [0] * workers
+
+    def start(self):
+        for p in self.processes:
+            p.start()
+
+    def route(self, update: dict):
+        i = shard_of(update, len(self.queues))
+        self.queues[i].put(json.dumps(update, ensure_ascii=False))
+        self.routed[i] += 1
+
+    def stop(self):
+        for q in self.queues:
+            q.put(None)
+        for p in self.processes:
+            p.join()
+
+
+async def _front_polling(bot: Bot, shards: ShardRouter):
+    await bot.delete_webhook()
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=30)
+        except Exception:
+            log.exception("getUpdates не удался, повтор через 5 с")
+            await asyncio.sleep(5)
+            continue
+        for update in updates:
+            shards.route(update.model_dump(mode="json", exclude_none=True, by_alias=True))
+            offset = update.update_id + 1
+
+
+async def _front_webhook(bot: Bot, shards: ShardRouter, config):
+    async def handle(request: web.Request) -> web.Response:
+        if config.secret and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != config.secret:
+            return web.Response(status=401)
+        shards.route(await request.json())
+        return web.Response()
+
+    if config.base_url:
+        await bot.set_webhook(config.base_url.rstrip("/") + config.path, secret_token=config.secret)
+    app = web.Application()
+    app.router.add_post(config.path, handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, config.host, config.port).start()
+    log.info("Webhook-фронт слушает http://%s:%d%s", config.host, config.port, config.path)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def run_sharded(mode: str, workers: int, token: str):
+    """Запустить фронт и ``workers`` процессов-обработчиков."""
+    import db
+    import main
+    from webhook import WebhookConfig
+
+    # Миграции применяем один раз во фронте, до старта воркеров
+    await db.init_db()
+    await db.close_db()
+
+    bot = Bot(token=token)
+    await main.setup_bot_commands(bot)
+    shards = ShardRouter(workers, token)
+    shards.start()
+    log.info("Запущено воркеров: %d (pid %s)", workers, [p.pid for p in shards.processes])
+    try:
+        if mode == "webhook":
+            await _front_webhook(bot, shards, WebhookConfig.from_env())
+        else:
+            await _front_polling(bot, shards)
+    finally:
+        # stop() блокирует — ждём воркеров вне event loop
+        await asyncio.get_running_loop().run_in_executor(None, shards.stop)
+        await bot.session.close()
+        log.info("Распределено обновлений по воркерам: %s", shards.routed)
@@ -0,0 +1,131 @@
+# stats_cache.py — кэш сводки /progress по пользователям
+import time
+from bisect import insort
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+
+def since_day(days: int) -> str:
+    """Первый день окна «последние ``days`` дней»: сегодня (UTC) и ещё days-1 дней до него.
+
+    Общая граница для db.recent_summary, графиков и этого кэша.
+    """
+    return (datetime.utcnow() - timedelta(days=max(days, 1) - 1)).date().isoformat()
+
+
+def _by_time(row: tuple) -> str:
+    return row[0]
+
+
+class UserStats:
+    """Агрегаты одного пользователя за окно: по дням и последние подходы."""
+
+    __slots__ = ("window_start", "days", "last", "loaded_at")
+
+    def __init__(self, window_start: str, loaded_at: float):
+        self.window_start = window_start
+        self.days: dict = {}  # упражнение -> {день: [повторы, подходы]}
+        self.last: dict = {}  # упражнение -> [(ISO-время, повторы, вес)] по возрастанию времени
+        self.loaded_at = loaded_at
+
+
+class StatsCache:
+    """Сводки /progress в памяти: LRU по пользователям с TTL.
+
+    Запись загружается из БД при первом /progress пользователя и дальше
+    обновляется на месте из add_entry, так что активный пользователь
+    получает сводку без обращения к SQLite. TTL страхует от изменений
+    в обход add_entry (импорт из CLI, другая копия бота).
+    """
+
+    def __init__(self, max_users: int = 2048, ttl: float = 600.0, window_days: int = 90, last_n: int = 10):
+        self.max_users = max_users
+        self.ttl = ttl
+        self.window_days = window_days
+        self.last_n = last_n
+        self._users: "OrderedDict[int, UserStats]" = OrderedDict()
+        # Метрики
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def covers(self, days: int) -> bool:
+        return 0 < days <= self.window_days
+
+    def get(self, user_id: int) -> Optional[UserStats]:
+        stats = self._users.get(user_id)
+        if stats is None or time.monotonic() - stats.loaded_at > self.ttl:
+            if stats is not None:
+                del self._users[user_id]
+            self.misses += 1
+            return None
+        self._users.move_to_end(user_id)
+        self.hits += 1
+        return stats
+
+    def build(self, rollup_rows, last_rows) -> UserStats:
+        """rollup_rows: (упражнение, день, повторы, подходы);
+        last_rows: (упражнение, ISO-время, повторы, вес) от старых к новым.
+        """
+        stats = UserStats(since_day(self.window_days), time.monotonic())
+        for name, day, reps, sets in rollup_rows:
+            stats.days.setdefault(name, {})[day] = [reps, sets]
+        for name, ts, reps, weight in last_rows:
+            insort(stats.last.setdefault(name, []), (ts, reps, weight), key=_by_time)
+        return stats
+
+    def put(self, user_id: int, stats: UserStats):
+        self._users[user_id] = stats
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, user_id: int):
+        self._users.pop(user_id, None)
+
+    def record(self, user_id: int, exercise: str, reps: int, weight: Optional[float], ts: str):
+        """Учесть новый подход (ts — ISO-строка UTC), если пользователь уже в кэше."""
+        stats = self._users.get(user_id)
+        if stats is None:
+            return
+        day = ts[:10]
+        if day >= stats.window_start:
+            agg = stats.days.setdefault(exercise, {}).setdefault(day, [0, 0])
+            agg[0] += reps
+            agg[1] += 1
+        last = stats.last.setdefault(exercise, [])
+        insort(last, (ts, reps, weight), key=_by_time)
+        del last[:-self.last_n]
+
+    def summary(self, stats: UserStats, exercise: Optional[str], days: int) -> list:
+        """То же, что db.recent_summary: [(упражнение, повторы, подходы)] по убыванию повторов."""
+        since = since_day(days)
+        names = [exercise] if exercise else list(stats.days)
+        rows = []
+        for name in names:
+            total_reps = total_sets = 0
+            for day, (reps, sets) in stats.days.get(name, {}).items():
+                if day >= since:
+                    total_reps += reps
+                    total_sets += sets
+            if total_sets:
+                rows.append((name, total_reps, total_sets))
+        rows.sort(key=lambda r: r[1], reverse=True)
+        return rows
+
+    def last_sets(self, stats: UserStats, exercise: str, n: int) -> list:
+        """То же, что db.last_n_entries: [(ISO-время, повторы, вес)], новые первыми."""
+        return stats.last.get(exercise, [])[::-1][:n]
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._users),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+stats_cache = StatsCache()
@@ -0,0 +1,60 @@
+# Разбор быстрого ввода: запятая — и разделитель подходов, и десятичная в старом формате
+import pytest
+
+from parsing import looks_like_sets, parse_line, parse_sets, parse_workout
+
+
+@pytest.mark.parametrize("text, sets", [
+    ("15", [(15, None)]),
+    ("8 40", [(8, 40.0)]),
+    ("8 42,5", [(8, 42.5)]),
+    ("8 42.5 кг", [(8, 42.5)]),
+    ("10x60, 8x65, 6x70", [(10, 60.0), (8, 65.0), (6, 70.0)]),
+    ("10x60,8x65", [(10, 60.0), (8, 65.0)]),
+    ("10x60, 8", [(10, 60.0), (8, None)]),
+    ("10x62.5, 8", [(10, 62.5), (8, None)]),
+    ("10х60кг,8", [(10, 60.0), (8, None)]),
+    ("3x5x100", [(5, 100.0)] * 3),
+    ("10, 8, 6", [(10, None), (8, None), (6, None)]),
+    ("10,8,6", [(10, None), (8, None), (6, None)]),
+])
+def test_parse_sets(text, sets):
+    assert parse_sets(text) == sets
+
+
+@pytest.mark.parametrize("text", [
+    "10x60,8",  # 60.8 кг или ещё подход на 8?
+    "10x60,12",
+    "10x60,5",
+    "10x60,5 кг",
+    "0",
+    "10x",
+    "10x60,",
+    "10x2000",
+])
+def test_parse_sets_rejects(text):
+    assert parse_sets(text) is None
+
+
+def test_parse_line_keeps_name():
+    line = parse_line("  жим   лёжа 10x60, 8x65 ")
+    assert line.exercise == "жим лёжа"
+    assert line.sets == [(10, 60.0), (8, 65.0)]
+
+
+def test_ambiguous_comma_is_reported_not_ignored():
+    workout = parse_workout("жим 10x60,8\nприсед 5x100")
+    assert [line.exercise for line in workout.lines] == ["присед"]
+    assert workout.errors == ["жим 10x60,8"]
+    assert looks_like_sets(workout.errors[0])
+
+
+def test_zero_reps_is_an_error():
+    workout = parse_workout("жим 0")
+    assert workout.lines == [] and workout.errors == ["жим 0"]
+
+
+def test_plain_text_is_not_quick_add():
+    workout = parse_workout("привет")
+    assert not workout.lines
+    assert not any(looks_like_sets(e) for e in workout.errors)
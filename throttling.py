@@ -0,0 +1,130 @@
+# throttling.py — ограничение частоты запросов пользователя (token bucket)
+#
+# У каждого пользователя по ведру на класс операций: дешёвые (быстрый ввод,
+# меню) и дорогие (графики, выгрузка, импорт). Класс хэндлера задаётся флагом
+# aiogram: @router.message(..., flags={"throttle": "expensive"}); без флага
+# хэндлер считается дешёвым.
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery, Message
+
+from metrics import THROTTLED
+
+
+@dataclass
+class Limit:
+    rate: float  # токенов в секунду
+    burst: int  # ёмкость ведра — сколько можно сделать подряд
+
+
+DEFAULT_LIMITS = {
+    "cheap": Limit(rate=2.0, burst=20),
+    "expensive": Limit(rate=0.1, burst=3),  # в среднем раз в 10 с, подряд не больше трёх
+}
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated", "warned")
+
+    def __init__(self, limit: Limit, now: float):
+        self.rate = limit.rate
+        self.capacity = float(limit.burst)
+        self.tokens = self.capacity
+        self.updated = now
+        self.warned = False  # уже сказали «помедленнее» в этот раз
+
+    def take(self, now: float, cost: float = 1.0) -> bool:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            self.warned = False
+            return True
+        return False
+
+    def retry_after(self, cost: float = 1.0) -> float:
+        return max(0.0, (cost - self.tokens) / self.rate) if self.rate > 0 else float("inf")
+
+    def wait_time(self, now: float, cost: float = 1.0) -> float:
+        """Через сколько секунд take() пройдёт; ведро при этом не трогается."""
+        tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        if tokens >= cost:
+            return 0.0
+        return (cost - tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def idle_full(self, now: float) -> bool:
+        """Ведро успело наполниться — хранить его незачем."""
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Внутренний middleware Dispatcher'а (наследуется всеми роутерами).
+
+    Превышение лимита не выполняет хэндлер, а отвечает пользователю один раз,
+    пока ведро снова не начнёт пропускать запросы.
+    """
+
+    def __init__(self, limits: dict = None, max_users: int = 100_000):
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self.max_users = max_users
+        self._buckets: OrderedDict = OrderedDict()  # (user_id, класс) -> TokenBucket
+        self.passed = 0
+        self.throttled = 0
+        self.evicted = 0
+
+    def _bucket(self, user_id: int, kind: str, now: float) -> TokenBucket:
+        key = (user_id, kind)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            self._evict(now)
+            bucket = self._buckets[key] = TokenBucket(self.limits[kind], now)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def _evict(self, now: float):
+        # Ведра упорядочены по последнему обращению: проверяем только самые старые
+        while self._buckets:
+            key, oldest = next(iter(self._buckets.items()))
+            if len(self._buckets) < self.max_users and not oldest.idle_full(now):
+                break
+            del self._buckets[key]
+            self.evicted += 1
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+        kind = get_flag(data, "throttle", default="cheap")
+        now = time.monotonic()
+        bucket = self._bucket(user.id, kind, now)
+        if bucket.take(now):
+            self.passed += 1
+            return await handler(event, data)
+
+        self.throttled += 1
+        THROTTLED.inc(kind=kind)
+        if not bucket.warned:
+            bucket.warned = True
+            await self._reply(event, bucket.retry_after())
+        elif isinstance(event, CallbackQuery):
+            await event.answer()  # иначе у кнопки так и крутятся часики
+        return None
+
+    @staticmethod
+    async def _reply(event, wait: float):
+        text = f"Слишком часто 🙂 Подожди {max(1, round(wait))} с и попробуй снова."
+        if isinstance(event, (CallbackQuery, Message)):
+            await event.answer(text)
+
+    def stats(self) -> dict:
+        return {
+            "buckets": len(self._buckets),
+            "passed": self.passed,
+            "throttled": self.throttled,
+            "evicted": self.evicted,
+        }
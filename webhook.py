@@ -0,0 +1,76 @@
+# webhook.py — приём обновлений через webhook (aiohttp) вместо long polling
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class WebhookConfig:
+    base_url: Optional[str]  # публичный адрес, который регистрируем в Telegram
+    path: str
+    secret: Optional[str]
+    host: str
+    port: int
+
+    @classmethod
+    def from_env(cls) -> "WebhookConfig":
+        return cls(
+            base_url=os.getenv("WEBHOOK_URL"),
+            path=os.getenv("WEBHOOK_PATH", "/webhook"),
+            secret=os.getenv("WEBHOOK_SECRET") or None,
+            host=os.getenv("WEBAPP_HOST", "0.0.0.0"),
+            port=int(os.getenv("WEBAPP_PORT", "8080")),
+        )
+
+
+def build_app(
+        dp: Dispatcher,
+        bot: Bot,
+        path: str = "/webhook",
+        secret: Optional[str] = None,
+        handle_in_background: bool = True
+) -> web.Application:
+    """aiohttp-приложение, передающее POST на ``path`` в тот же Dispatcher, что и polling."""
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=secret,
+        handle_in_background=handle_in_background,
+    ).register(app, path=path)
+    setup_application(app, dp, bot=bot)
+    # /metrics здесь не отдаём: этот порт смотрит в интернет, метрики — на METRICS_PORT
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, config: WebhookConfig):
+    """Поднять HTTP-сервер и (если задан WEBHOOK_URL) зарегистрировать webhook в Telegram."""
+    if config.base_url:
+        async def on_startup(bot: Bot):
+            await bot.set_webhook(
+                config.base_url.rstrip("/") + config.path,
+                secret_token=config.secret,
+                drop_pending_updates=False,
+            )
+
+        dp.startup.register(on_startup)
+
+    app = build_app(dp, bot, config.path, config.secret)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, config.host, config.port)
+    await site.start()
+    log.info("Webhook слушает http://%s:%d%s", config.host, config.port, config.path)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()